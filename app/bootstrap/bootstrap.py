@@ -1,5 +1,8 @@
 import argparse
+from app.dsp import DSPConfig
+from app.precision import Precision
 from app.tts import Device, Speaker, TTSConfig
+from app.warmup import WarmupConfig
 
 
 def __boolean_string(s: str) -> bool:
@@ -27,7 +30,27 @@ def _parse(args: list[str]) -> argparse.Namespace:
         '--writer',
         type=str,
         default='VBCableWriter',
-        choices=['VBCableWriter', 'SimpleWavWriter']
+        choices=['VBCableWriter', 'GenericWriter', 'SimpleWavWriter']
+    )
+    parser.add_argument(
+        '--latency_profile',
+        type=str,
+        default='balanced',
+        choices=['low', 'balanced', 'safe'],
+        help='frames per buffer of the audio devices: 256, 1024 or 4096',
+    )
+    parser.add_argument(
+        '--adaptive_buffer',
+        type=__boolean_string,
+        default=False,
+        help='grow the device buffers after repeated underruns, shrink them back once playback is stable',
+    )
+    parser.add_argument(
+        '--max_audio_backlog',
+        type=float,
+        default=30.,
+        help='VBCableWriter drops new utterances while more than this many seconds of audio wait to be played, '
+             '0 is unbounded',
     )
     parser.add_argument(
         '--models_dir',
@@ -45,10 +68,260 @@ def _parse(args: list[str]) -> argparse.Namespace:
         default='cuda',
         choices=['cpu', 'cuda']
     )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=4,
+        help='intra-op threads, unless tuned threads are saved for this host, model and precision',
+    )
+    parser.add_argument(
+        '--interop_threads',
+        type=int,
+        default=0,
+        help='inter-op threads, 0 keeps the torch default',
+    )
+    parser.add_argument(
+        '--tune_threads',
+        type=__boolean_string,
+        default=False,
+        help='benchmark thread counts first and save the fastest for this host and model, later boots reuse it',
+    )
+    parser.add_argument(
+        '--tuned_threads',
+        type=__boolean_string,
+        default=True,
+        help='use thread counts saved by --tune_threads',
+    )
+    parser.add_argument(
+        '--precision',
+        type=str,
+        default='fp32',
+        choices=['fp32', 'int8', 'bf16'],
+        help='CPU inference precision: dynamic int8 quantization or bfloat16 autocast, fp32 if unsupported',
+    )
+    parser.add_argument(
+        '--warmup',
+        type=__boolean_string,
+        default=True,
+        help='synthesize a corpus of speakers, lengths and prosody variants before the first request',
+    )
+    parser.add_argument(
+        '--warmup_background',
+        type=__boolean_string,
+        default=False,
+        help='report ready first and warm up in the background, requests take precedence',
+    )
+    parser.add_argument(
+        '--warmup_max_passes',
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        '--warmup_texts',
+        type=str,
+        default=None,
+        help='file with one warmup text per line, used instead of the generated lengths',
+    )
+    parser.add_argument(
+        '--model_cache',
+        type=__boolean_string,
+        default=False,
+        help='save a frozen, unpacked copy of the model next to it and boot from that copy',
+    )
+    parser.add_argument(
+        '--streaming',
+        type=__boolean_string,
+        default=False,
+        help='synthesize and play sentence by sentence',
+    )
+    parser.add_argument(
+        '--pipelined',
+        type=__boolean_string,
+        default=False,
+        help='run reading, synthesis and playback in separate threads',
+    )
+    parser.add_argument(
+        '--chunk_chars',
+        type=int,
+        default=0,
+        help='texts longer than this are synthesized in chunks split at sentence and clause boundaries, '
+             'in parallel with --replicas, 0 disables it',
+    )
+    parser.add_argument(
+        '--chunk_workers',
+        type=int,
+        default=2,
+        help='chunks synthesized at once, at least --replicas',
+    )
+    parser.add_argument(
+        '--crossfade_ms',
+        type=float,
+        default=10.,
+    )
+    parser.add_argument(
+        '--dsp',
+        type=__boolean_string,
+        default=False,
+        help='trim silence, fade the ends and normalize the loudness of the synthesized audio',
+    )
+    parser.add_argument(
+        '--dsp_target_db',
+        type=float,
+        default=-20.,
+        help='RMS of the speech, dBFS',
+    )
+    parser.add_argument(
+        '--dsp_silence_db',
+        type=float,
+        default=-50.,
+        help='quieter frames are silence, trimmed at the ends',
+    )
+    parser.add_argument(
+        '--dsp_fade_ms',
+        type=float,
+        default=5.,
+    )
+    parser.add_argument(
+        '--dsp_peak_db',
+        type=float,
+        default=-1.,
+        help='limiter ceiling, dBFS',
+    )
+    parser.add_argument(
+        '--replicas',
+        type=int,
+        default=0,
+        help='model replicas in worker processes sharing the free cores, more than 1 needs --pipelined to overlap requests',
+    )
+    parser.add_argument(
+        '--queue_size',
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        '--queue_report_interval',
+        type=float,
+        default=0.,
+        help='seconds between queue depth reports of the pipelined manager, 0 disables them',
+    )
+    parser.add_argument(
+        '--gui_queue_size',
+        type=int,
+        default=32,
+        help='requests the GUI keeps waiting for the tts process, more are dropped, 0 is unbounded',
+    )
+    parser.add_argument(
+        '--gui_coalesce',
+        type=__boolean_string,
+        default=True,
+        help='merge a GUI request into an identical one waiting right before it',
+    )
+    parser.add_argument(
+        '--gui_max_age',
+        type=float,
+        default=0.,
+        help='drop GUI requests waiting longer than this many seconds, 0 disables it',
+    )
+    parser.add_argument(
+        '--gui_keep_latest',
+        type=int,
+        default=0,
+        help='keep only the newest N waiting GUI requests, 0 keeps all of them',
+    )
+    parser.add_argument(
+        '--audio_cache_mb',
+        type=int,
+        default=0,
+        help='in-memory cache of synthesized audio, 0 disables it',
+    )
+    parser.add_argument(
+        '--audio_cache_dir',
+        type=str,
+        default=None,
+        help='directory of the persistent audio cache, disabled if not set',
+    )
+    parser.add_argument(
+        '--audio_cache_dir_mb',
+        type=int,
+        default=1024,
+    )
+    parser.add_argument(
+        '--frontend_cache_size',
+        type=int,
+        default=256,
+        help='number of parsed and normalized texts kept, 0 disables the front-end cache',
+    )
+    parser.add_argument(
+        '--frontend_workers',
+        type=int,
+        default=0,
+        help='parse SSML in this many worker processes, 0 parses in the inference process; '
+             'with --pipelined invalid SSML is rejected before synthesis',
+    )
+    parser.add_argument(
+        '--trace_dir',
+        type=str,
+        default=None,
+        help='record per-utterance stage timings and save a Chrome trace there on exit',
+    )
+    parser.add_argument(
+        '--metrics_port',
+        type=int,
+        default=0,
+        help='serve live metrics in Prometheus format on localhost:<port>/metrics, 0 disables it',
+    )
+    parser.add_argument(
+        '--metrics_json',
+        type=str,
+        default=None,
+        help='file rewritten with a JSON snapshot of the metrics every --metrics_interval seconds',
+    )
+    parser.add_argument(
+        '--metrics_interval',
+        type=float,
+        default=10.,
+    )
+    parser.add_argument(
+        '--profile_dir',
+        type=str,
+        default=None,
+        help='profile sampled model forward passes with torch.profiler, traces and summaries are saved there',
+    )
+    parser.add_argument(
+        '--profile_every',
+        type=int,
+        default=10,
+        help='profile every n-th forward pass, 1 profiles all of them',
+    )
+    parser.add_argument(
+        '--profile_min_ms',
+        type=float,
+        default=0.,
+        help='keep only profiles of forward passes slower than this, e.g. to catch stalls',
+    )
 
     return parser.parse_args(args=args)
 
 
+def _warmup_config(args: argparse.Namespace) -> WarmupConfig:
+    config = WarmupConfig(max_passes=args.warmup_max_passes)
+    if args.warmup_texts:
+        with open(args.warmup_texts, encoding='utf-8') as f:
+            config.texts = [line.strip() for line in f if line.strip()]
+    return config
+
+
+def _dsp_config(args: argparse.Namespace) -> DSPConfig | None:
+    if not args.dsp:
+        return None
+    return DSPConfig(
+        silence_db=args.dsp_silence_db,
+        fade_ms=args.dsp_fade_ms,
+        target_db=args.dsp_target_db,
+        peak_db=args.dsp_peak_db,
+    )
+
+
 def run_boot(sys_args: list[str]) -> None:
     args: argparse.Namespace = _parse(sys_args)
 
@@ -60,11 +333,40 @@ def run_boot(sys_args: list[str]) -> None:
         models_path=args.models_dir,
         model_name=args.model_name,
         download_model_if_not_exists=False,
+        threads=args.threads,
+        interop_threads=args.interop_threads,
+        tuned_threads=args.tuned_threads,
+        precision=Precision.from_string(args.precision),
+        warmup=args.warmup,
+        warmup_config=_warmup_config(args),
+        warmup_background=args.warmup_background,
+        model_cache=args.model_cache,
+        streaming=args.streaming,
+        audio_cache_bytes=args.audio_cache_mb * 1024 * 1024,
+        audio_cache_dir=args.audio_cache_dir,
+        audio_cache_dir_bytes=args.audio_cache_dir_mb * 1024 * 1024,
+        frontend_cache_size=args.frontend_cache_size,
+        frontend_workers=args.frontend_workers,
+        chunk_chars=args.chunk_chars,
+        chunk_workers=args.chunk_workers,
+        crossfade_ms=args.crossfade_ms,
+        dsp=_dsp_config(args),
+        trace_dir=args.trace_dir,
+        metrics_port=args.metrics_port,
+        metrics_json=args.metrics_json,
+        metrics_interval=args.metrics_interval,
+        profile_dir=args.profile_dir,
+        profile_every=args.profile_every,
+        profile_min_ms=args.profile_min_ms,
     )
 
+    if args.tune_threads:
+        from app import tuning
+        tuning.tune(tts_config, reserved_cores=tuning.AUDIO_WORKERS[args.writer])
+
     if args.gui:
         from app.bootstrap.pyside_boot import boot as pyside_boot
-        pyside_boot(tts_config)
+        pyside_boot(tts_config, args)
     else:
         from app.bootstrap.tui_boot import boot as tui_boot
         tui_boot(tts_config, args)
@@ -1,30 +1,52 @@
+from argparse import Namespace
 import sys
-from app.manager import TTSManager
+from app.io.latency import LatencyProfile
+from app.io.request_queue import RequestQueue
+from app.manager import make_manager
+from app.pool import TTSPool
+from app.metrics import metrics
 from app.tts import TTS, TTSConfig
+from app.tuning import AUDIO_WORKERS
 from app.ui.pyside_ui import TTSUI, PysideReader, PysideWriter
 from PySide6 import QtWidgets
 from multiprocessing import Process, Queue
 
 
-def _run_tts(q_reader, tts_config: TTSConfig) -> None:  # type: ignore
-    tts = TTS(tts_config)
+def _run_tts(q_reader, q_events, tts_config: TTSConfig, args: Namespace) -> None:  # type: ignore
+    tts: TTS | TTSPool = TTS(tts_config)
+    if args.replicas > 1:
+        tts = TTSPool(tts, args.replicas, reserved_cores=AUDIO_WORKERS.get(args.writer, 2))
 
-    r = PysideReader(q_reader)
-    w = PysideWriter()
+    requests = RequestQueue(
+        q_reader,
+        coalesce=args.gui_coalesce,
+        max_age=args.gui_max_age,
+        keep_latest=args.gui_keep_latest,
+        # the GUI shows what was dropped
+        on_shed=lambda reason, n: q_events.put((reason.value, n)),
+    )
+    r = PysideReader(requests)
+    metrics.gauge('gui_queue_depth', 'texts sent by the GUI, not read yet', fn=requests.qsize)
+    w = PysideWriter(LatencyProfile.from_string(args.latency_profile), args.adaptive_buffer, args.max_audio_backlog)
+    w.on_shed = lambda reason, n: q_events.put((reason, n))
 
-    ttsm = TTSManager(
+    ttsm = make_manager(
         tts,
         r,  # type: ignore
         w,  # type: ignore
+        pipelined=args.pipelined,
+        queue_size=args.queue_size,
+        report_interval=args.queue_report_interval,
     )
     ttsm.start()
 
 
-def _run_pyside(q_reader) -> None:   # type: ignore
+def _run_pyside(q_reader, q_events) -> None:   # type: ignore
     app = QtWidgets.QApplication([])
 
     widget = TTSUI(
         q_reader=q_reader,
+        q_events=q_events,
     )
     widget.resize(800, 600)
     widget.setWindowTitle('Voice Trigger')
@@ -33,13 +55,15 @@ def _run_pyside(q_reader) -> None:   # type: ignore
     sys.exit(app.exec())
 
 
-def boot(tts_config: TTSConfig) -> None:
-    q_reader: Queue[str] = Queue()
+def boot(tts_config: TTSConfig, args: Namespace) -> None:
+    q_reader: Queue[str] = Queue(maxsize=args.gui_queue_size)
+    # shed requests, from the tts process to the GUI
+    q_events: Queue[tuple[str, int]] = Queue()
 
-    p1 = Process(target=_run_pyside, args=(q_reader,), daemon=True)
+    p1 = Process(target=_run_pyside, args=(q_reader, q_events), daemon=True)
     p1.start()
 
-    p2 = Process(target=_run_tts, args=(q_reader, tts_config), daemon=False)
+    p2 = Process(target=_run_tts, args=(q_reader, q_events, tts_config, args), daemon=False)
     p2.start()
 
     p1.join()
@@ -1,11 +1,15 @@
 from argparse import Namespace
 from typing import Type
 from app.io.command_polling_reader import PollingCommandReader
+from app.io.generic_writer import GenericWriter
 from app.io.io import Reader, Writer
+from app.io.latency import LatencyProfile
 from app.io.simple import SimplePollingReader, SimpleWavWriter
 from app.io.vb_cable_writer import VBCableWriter
-from app.manager import TTSManager
+from app.manager import make_manager
+from app.pool import TTSPool
 from app.tts import TTS, TTSConfig
+from app.tuning import AUDIO_WORKERS
 
 
 def _match_io(io_str: str) -> Type[Reader] | Type[Writer]:
@@ -18,16 +22,39 @@ def _match_io(io_str: str) -> Type[Reader] | Type[Writer]:
             return SimpleWavWriter
         case 'VBCableWriter':
             return VBCableWriter
+        case 'GenericWriter':
+            return GenericWriter
         case _:
             raise Exception(f"Unknown IO {io_str}")
 
 
+def _make_writer(args: Namespace) -> Writer:
+    writer_class = _match_io(args.writer)
+    if writer_class is VBCableWriter:
+        return VBCableWriter(
+            latency=LatencyProfile.from_string(args.latency_profile),
+            adaptive_buffer=args.adaptive_buffer,
+            max_backlog=args.max_audio_backlog,
+        )
+    if writer_class is GenericWriter:
+        return GenericWriter(
+            latency=LatencyProfile.from_string(args.latency_profile),
+            adaptive_buffer=args.adaptive_buffer,
+        )
+    return writer_class()  # type: ignore
+
+
 def boot(tts_config: TTSConfig, args: Namespace) -> None:
-    tts = TTS(tts_config)
+    tts: TTS | TTSPool = TTS(tts_config)
+    if args.replicas > 1:
+        tts = TTSPool(tts, args.replicas, reserved_cores=AUDIO_WORKERS.get(args.writer, 2))
 
-    ttsm = TTSManager(
+    ttsm = make_manager(
         tts,
         _match_io(args.reader)(),  # type: ignore
-        _match_io(args.writer)(),  # type: ignore
+        _make_writer(args),
+        pipelined=args.pipelined,
+        queue_size=args.queue_size,
+        report_interval=args.queue_report_interval,
     )
     ttsm.start()
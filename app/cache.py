@@ -0,0 +1,264 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+import re
+import time
+from typing import Any, TypeAlias
+import numpy
+from numpy import ndarray
+
+
+CacheKey: TypeAlias = tuple[str, str, int]
+
+
+def normalize_ssml(sample: str) -> str:
+    # the same whitespace folding TTSModelMultiAcc_v3.process_ssml does,
+    # so samples which differ only in spacing share one entry
+    return re.sub(r'\s+', ' ', sample).strip()
+
+
+def make_key(sample: str, speaker: str, sample_rate: int) -> CacheKey:
+    # readers pass both Speaker members and plain speaker strings
+    speaker = speaker.value if isinstance(speaker, Enum) else speaker
+    return (normalize_ssml(sample), speaker, int(sample_rate))
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+    max_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def __str__(self) -> str:
+        return (
+            f'hits={self.hits} misses={self.misses} evictions={self.evictions} '
+            f'entries={self.entries} size={self.size_bytes}/{self.max_bytes} bytes '
+            f'hit_rate={self.hit_rate:.2f}'
+        )
+
+
+class AudioCache:
+    """
+    In-memory LRU cache of synthesized int16 PCM, bounded by a byte budget.
+    Cached arrays are shared with callers and must not be modified.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.stats = CacheStats(max_bytes=max_bytes)
+        self._entries: OrderedDict[CacheKey, ndarray] = OrderedDict()
+
+    def get(self, key: CacheKey) -> ndarray | None:
+        pcm = self._entries.get(key)
+        if pcm is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return pcm
+
+    def put(self, key: CacheKey, pcm: ndarray) -> None:
+        if pcm.nbytes > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.stats.size_bytes -= old.nbytes
+
+        self._entries[key] = pcm
+        self.stats.size_bytes += pcm.nbytes
+
+        while self.stats.size_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.stats.size_bytes -= evicted.nbytes
+            self.stats.evictions += 1
+
+        self.stats.entries = len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.stats.entries = 0
+        self.stats.size_bytes = 0
+
+    def __contains__(self, key: CacheKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+    pass
+
+
+class DiskAudioCache:
+    """
+    Persistent content-addressed store of int16 PCM blobs.
+
+    Blobs are named by the sha256 of their bytes, `index.json` maps cache keys
+    to blobs and keeps the LRU order. The whole store is dropped when the
+    namespace (model name and sample rate) changes. Hits are memory-mapped
+    copy-on-write, so reading them costs no copy.
+    """
+
+    index_name = 'index.json'
+    blob_suffix = '.pcm'
+
+    def __init__(self, path: str, max_bytes: int, namespace: str) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self.stats = CacheStats(max_bytes=max_bytes)
+        self._dirty = False
+
+        # key digest -> blob name
+        self._keys: dict[str, str] = {}
+        # blob name -> [size, last used], least recently used first
+        self._blobs: OrderedDict[str, list[Any]] = OrderedDict()
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def get(self, key: CacheKey) -> ndarray | None:
+        blob = self._keys.get(self._key_digest(key))
+        if blob is None or blob not in self._blobs:
+            self.stats.misses += 1
+            return None
+
+        try:
+            with open(self.path / blob, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError):
+            # blob removed behind our back
+            self._drop_blob(blob)
+            self.stats.misses += 1
+            return None
+
+        self._blobs[blob][1] = time.time()
+        self._blobs.move_to_end(blob)
+        self._dirty = True
+        self.stats.hits += 1
+        # the array keeps the mapping alive
+        return numpy.frombuffer(mm, dtype=numpy.int16)
+
+    def put(self, key: CacheKey, pcm: ndarray) -> None:
+        if pcm.nbytes == 0 or pcm.nbytes > self.max_bytes:
+            return
+
+        pcm = numpy.ascontiguousarray(pcm, dtype=numpy.int16)
+        blob = hashlib.sha256(memoryview(pcm).cast('B')).hexdigest() + self.blob_suffix
+
+        if blob not in self._blobs:
+            tmp = self.path / f'{blob}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(memoryview(pcm).cast('B'))
+            os.replace(tmp, self.path / blob)
+            self._blobs[blob] = [pcm.nbytes, time.time()]
+            self.stats.size_bytes += pcm.nbytes
+        else:
+            self._blobs[blob][1] = time.time()
+            self._blobs.move_to_end(blob)
+
+        self._keys[self._key_digest(key)] = blob
+        self._evict()
+        self.stats.entries = len(self._keys)
+        self._dirty = True
+        self.flush()
+
+    def flush(self) -> None:
+        if not self._dirty:
+            return
+        index = {
+            'namespace': self.namespace,
+            'keys': self._keys,
+            'blobs': self._blobs,
+        }
+        tmp = self.path / f'{self.index_name}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp, self.path / self.index_name)
+        self._dirty = False
+
+    def clear(self) -> None:
+        for blob in list(self._blobs):
+            self._drop_blob(blob)
+        self._keys.clear()
+        self.stats.entries = 0
+        self._dirty = True
+        self.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _evict(self) -> None:
+        while self.stats.size_bytes > self.max_bytes and self._blobs:
+            blob = next(iter(self._blobs))
+            self._drop_blob(blob)
+            self.stats.evictions += 1
+
+    def _drop_blob(self, blob: str) -> None:
+        entry = self._blobs.pop(blob, None)
+        if entry is not None:
+            self.stats.size_bytes -= entry[0]
+        for digest in [d for d, b in self._keys.items() if b == blob]:
+            del self._keys[digest]
+        self.stats.entries = len(self._keys)
+        self._dirty = True
+        try:
+            os.remove(self.path / blob)
+        except OSError:
+            # still mapped somewhere (Windows) or already gone,
+            # the orphan is swept on the next start
+            pass
+
+    def _load_index(self) -> None:
+        index_path = self.path / self.index_name
+        index: dict[str, Any] = {}
+        if index_path.exists():
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                print('audio disk cache: broken index, starting over')
+                index = {}
+
+        if index.get('namespace') == self.namespace:
+            self._keys = dict(index.get('keys', {}))
+            blobs = sorted(index.get('blobs', {}).items(), key=lambda b: b[1][1])
+            self._blobs = OrderedDict(
+                (b, e) for b, e in blobs if (self.path / b).exists()
+            )
+            self._keys = {d: b for d, b in self._keys.items() if b in self._blobs}
+        elif index:
+            print(f'audio disk cache: namespace changed to {self.namespace}, invalidating')
+
+        # sweep orphaned blobs and stale temp files
+        for f in self.path.iterdir():
+            if not f.name.endswith((self.blob_suffix, '.tmp')):
+                continue
+            if f.name not in self._blobs:
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+        self.stats.size_bytes = sum(e[0] for e in self._blobs.values())
+        self.stats.entries = len(self._keys)
+        self._evict()
+        self._dirty = True
+        self.flush()
+
+    @staticmethod
+    def _key_digest(key: CacheKey) -> str:
+        return hashlib.sha256(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()
+    pass
@@ -0,0 +1,108 @@
+"""
+Chunked synthesis of long texts.
+
+The model fails on long inputs, so the parsed SSML is cut into chunks the
+model can take: sentences longer than the limit are split on sentence, then
+clause, then word boundaries, and sentences are packed into chunks of at
+most max_chars. Every piece keeps the prosody of its SSML sentence and the
+last piece keeps its break, so the model renders the pauses as usual. The
+chunk audios are joined with a short crossfade against clicks.
+"""
+import re
+from typing import TYPE_CHECKING
+import torch
+from torch import Tensor
+
+if TYPE_CHECKING:
+    from app.tts import ModelInput
+
+
+# what TTSModelMultiAcc_v3.prepare_text_input keeps of a sentence for clean_sentence
+_NOT_CLEAN = re.compile(r'[^a-z1-9\- ]')
+
+_BOUNDARIES = [
+    re.compile(r'(?<=[.!?…])\s+'),
+    re.compile(r'(?<=[,;:–-])\s+'),
+    re.compile(r'\s+'),
+]
+
+
+def split_text(text: str, max_chars: int, level: int = 0) -> list[str]:
+    """
+    Pieces of at most max_chars, cut at the coarsest boundary that fits.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    if level == len(_BOUNDARIES):
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    pieces: list[str] = []
+    current = ''
+    for part in _BOUNDARIES[level].split(text):
+        if len(part) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.extend(split_text(part, max_chars, level + 1))
+        elif current and len(current) + 1 + len(part) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f'{current} {part}' if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_long(model_input: 'ModelInput', max_chars: int) -> 'ModelInput':
+    """
+    Splits the sentences longer than max_chars. Sentences are already
+    normalized, the clean sentence of a piece is recomputed from it.
+    """
+    fields: list[list] = [[] for _ in model_input]
+    for sentence, clean, break_len, rate, pitch in zip(*model_input):
+        if len(sentence) <= max_chars:
+            pieces = [(sentence, clean)]
+        else:
+            pieces = []
+            for piece in split_text(sentence, max_chars):
+                clean_piece = _NOT_CLEAN.sub('', piece)
+                if clean_piece.replace(' ', ''):
+                    pieces.append((piece, clean_piece))
+            if not pieces:
+                # nothing the model would speak, the sentence goes as it is and keeps its break
+                pieces = [(sentence, clean)]
+        for i, (text, clean_text) in enumerate(pieces):
+            last = i == len(pieces) - 1
+            for field, value in zip(fields, (text, clean_text, break_len if last else None, rate, pitch)):
+                field.append(value)
+    return type(model_input)(*fields)
+
+
+def chunks(model_input: 'ModelInput', max_chars: int) -> list['ModelInput']:
+    """
+    Consecutive sentences packed into inputs of at most max_chars.
+    """
+    result: list['ModelInput'] = []
+    start = 0
+    size = 0
+    for i, sentence in enumerate(model_input.sentences):
+        if i > start and size + len(sentence) > max_chars:
+            result.append(type(model_input)(*(field[start:i] for field in model_input)))
+            start, size = i, 0
+        size += len(sentence)
+    result.append(type(model_input)(*(field[start:] for field in model_input)))
+    return result
+
+
+def join(audios: list[Tensor], crossfade_frames: int) -> Tensor:
+    out = audios[0]
+    for audio in audios[1:]:
+        n = min(crossfade_frames, len(out), len(audio))
+        if n == 0:
+            out = torch.cat([out, audio])
+            continue
+        fade = torch.linspace(0., 1., n, dtype=out.dtype)
+        overlap = out[-n:] * (1 - fade) + audio[:n] * fade
+        out = torch.cat([out[:-n], overlap, audio[n:]])
+    return out
@@ -0,0 +1,134 @@
+"""
+Post-processing of the synthesized audio, before it is cached and played:
+silence trimmed at both ends, short fades, loudness normalized to a target
+with a peak limiter on top.
+
+Everything works in place on the float32 model output with vectorized
+numpy, the result is a view of it. Levels are measured on frames, the
+loudness is the RMS of the frames above the silence threshold, so pauses
+don't pull it down.
+"""
+from dataclasses import dataclass
+import math
+import numpy
+from numpy import ndarray
+from torch import Tensor
+
+from app.pcm import _as_array
+
+
+@dataclass
+class DSPConfig:
+    # frame RMS below this is silence, dBFS
+    silence_db: float = -50.
+    # silence kept before and after the speech
+    keep_ms: float = 30.
+    fade_ms: float = 5.
+    # RMS of the speech frames, dBFS
+    target_db: float = -20.
+    # quiet outputs are raised by this much at most
+    max_gain_db: float = 20.
+    # limiter ceiling, dBFS
+    peak_db: float = -1.
+    frame_ms: float = 10.
+
+    def cache_tag(self) -> str:
+        return (
+            f'dsp{self.silence_db:g}/{self.keep_ms:g}/{self.fade_ms:g}/'
+            f'{self.target_db:g}/{self.max_gain_db:g}/{self.peak_db:g}/{self.frame_ms:g}'
+        )
+    pass
+
+
+def _db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def frame_energy(audio: ndarray, frame: int) -> ndarray:
+    """
+    Mean square of every full frame, the tail shorter than a frame is left out.
+    """
+    n = len(audio) // frame
+    frames = audio[:n * frame].reshape(n, frame)
+    return numpy.einsum('ij,ij->i', frames, frames) / frame
+
+
+def process(
+    audio: Tensor | ndarray,
+    config: DSPConfig,
+    sample_rate: int,
+    trim_start: bool = True,
+    trim_end: bool = True,
+) -> ndarray:
+    """
+    Trims, normalizes, limits and fades audio in place and returns the
+    trimmed view. A stream chunk in the middle of an utterance keeps both
+    ends: trim_start only for the first chunk, trim_end only for the last.
+    Silent audio is returned as is.
+    """
+    src = _as_array(audio)
+    frame = max(1, int(sample_rate * config.frame_ms / 1000))
+    energy = frame_energy(src, frame)
+    active = energy > _db_to_gain(config.silence_db) ** 2
+    if not active.any():
+        return src
+
+    keep = int(sample_rate * config.keep_ms / 1000)
+    start, end = 0, len(src)
+    frames = numpy.flatnonzero(active)
+    if trim_start:
+        start = max(0, int(frames[0]) * frame - keep)
+    if trim_end:
+        end = min(len(src), (int(frames[-1]) + 1) * frame + keep)
+    out = src[start:end]
+
+    rms = math.sqrt(float(energy[active].mean()))
+    gain = min(_db_to_gain(config.target_db) / rms, _db_to_gain(config.max_gain_db))
+    numpy.multiply(out, gain, out=out, casting='same_kind')
+    limit(out, _db_to_gain(config.peak_db), frame)
+
+    fade = min(int(sample_rate * config.fade_ms / 1000), len(out) // 2)
+    if fade:
+        ramp = numpy.linspace(0., 1., fade, dtype=out.dtype)
+        if trim_start:
+            out[:fade] *= ramp
+        if trim_end:
+            out[-fade:] *= ramp[::-1]
+    return out
+
+
+def limit(audio: ndarray, ceiling: float, block: int) -> None:
+    """
+    Peak limiter in place. The gain of every block brings its peak under the
+    ceiling and takes the lowest of its neighbours, so it drops a block
+    before a peak and recovers a block after it. Gains are interpolated
+    between block centers, only around the blocks it turns down. Whatever
+    still overshoots is clipped.
+    """
+    n = len(audio)
+    full = n // block
+    blocks = full + (n % block > 0)
+    if blocks == 0:
+        return
+    peaks = numpy.empty(blocks, dtype=audio.dtype)
+    if full:
+        frames = audio[:full * block].reshape(full, block)
+        numpy.maximum(frames.max(axis=1), -frames.min(axis=1), out=peaks[:full])
+    if full < blocks:
+        tail = audio[full * block:]
+        peaks[-1] = max(tail.max(), -tail.min())
+    if peaks.max() <= ceiling:
+        return
+
+    gains = ceiling / numpy.maximum(peaks, ceiling)
+    gains[1:] = numpy.minimum(gains[1:], gains[:-1].copy())
+    gains[:-1] = numpy.minimum(gains[:-1], gains[1:].copy())
+    reduced = numpy.flatnonzero(gains < 1.)
+    # from the center of the block before to the center of the block after, the gain is 1 outside
+    lo = max(0, int(reduced[0]) * block - block // 2)
+    hi = min(n, (int(reduced[-1]) + 1) * block + block // 2 + 1)
+    centers = numpy.arange(blocks) * block + block / 2
+    envelope = numpy.interp(numpy.arange(lo, hi), centers, gains)
+    region = audio[lo:hi]
+    numpy.multiply(region, envelope, out=region, casting='same_kind')
+    numpy.clip(region, -ceiling, ceiling, out=region)
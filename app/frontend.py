@@ -0,0 +1,280 @@
+"""
+Text front-end of TTSModelMultiAcc_v3, rebuilt for speed.
+"""
+from collections import OrderedDict
+import codecs
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import os
+import re
+from threading import Lock
+import time
+from typing import Any, Callable, TypeAlias
+import numpy
+import torch
+
+from app import model_package
+from app.cache import CacheStats
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+
+
+_NOT_CLEAN = re.compile(r'[^a-z1-9\- ]')
+# codepoints with no table slot
+_UNDEFINED = 0xFF
+
+
+class TextNormalizer:
+    """
+    Drop-in for TTSModelMultiAcc_v3.prepare_text_input with byte-identical
+    output, same steps in the same order:
+
+    - dash folding with str.replace, the no-op en dash replace is dropped;
+    - the symbol filter compiled once instead of formatted on every call;
+    - whitespace collapsing and stripping as one split/join;
+    - the symbol-to-ASCII map as a lookup table over the codepoints, for
+      symbol sets of up to 255 characters with single character mappings,
+      str.translate otherwise;
+    - the clean sentence by deleting table slots instead of a regex.
+    """
+
+    def __init__(self, symbols: str, symb_ascii_dict: dict[str, str]) -> None:
+        self.symbols = symbols
+        self.symb_ascii_dict = symb_ascii_dict
+        # same pattern the model builds on every call
+        self._not_symbol = re.compile(r'[^{}]'.format(symbols[3:]))
+        # symb_to_ascii looks up single characters only
+        self._ascii_table = str.maketrans(
+            {k: v for k, v in symb_ascii_dict.items() if len(k) == 1}
+        )
+        self._build_lookup(symbols[3:] + ' ')
+
+    def __call__(self, text: str) -> tuple[str, str, bool]:
+        text = text.lower()
+        text = text.replace('—', '–').replace('‑', '-')
+        text = self._not_symbol.sub('', text)
+        # str.split() and the model's \s+ agree on what is whitespace
+        text = ' '.join(text.split())
+
+        encoded = self._lookup(text)
+        if encoded is None:
+            sentence = text.translate(self._ascii_table)
+            clean_sentence = _NOT_CLEAN.sub('', sentence)
+        else:
+            sentence = codecs.charmap_decode(encoded, 'strict', self._out_chars)[0]
+            clean_sentence = codecs.charmap_decode(
+                encoded.translate(None, self._not_clean_slots), 'strict', self._out_chars
+            )[0]
+
+        has_text = len(clean_sentence.replace(' ', '')) > 0
+        return sentence, clean_sentence, has_text
+
+    def _build_lookup(self, alphabet: str) -> None:
+        """
+        Maps every codepoint of the alphabet to the slot of its output
+        character; slots are decoded with a charmap table.
+        """
+        self._slots: numpy.ndarray | None = None
+        chars = list(dict.fromkeys(alphabet))
+        outputs = [self.symb_ascii_dict.get(c, c) for c in chars]
+        out_chars = list(dict.fromkeys(outputs))
+        if len(out_chars) >= _UNDEFINED or any(len(o) != 1 for o in outputs):
+            return
+
+        slots = numpy.full(max(map(ord, chars)) + 1, _UNDEFINED, dtype=numpy.uint8)
+        for c, o in zip(chars, outputs):
+            slots[ord(c)] = out_chars.index(o)
+        self._slots = slots
+        # charmap_decode fails on U+FFFE, undefined slots never reach it
+        self._out_chars = ''.join(out_chars).ljust(256, '￾')
+        self._not_clean_slots = bytes(i for i, o in enumerate(out_chars) if _NOT_CLEAN.match(o))
+
+    def _lookup(self, text: str) -> bytes | None:
+        if self._slots is None:
+            return None
+        codepoints = numpy.frombuffer(text.encode('utf-32-le'), dtype=numpy.uint32)
+        if len(codepoints) and codepoints.max() >= len(self._slots):
+            return None
+        encoded = self._slots[codepoints]
+        # characters the filter let through but the alphabet doesn't have,
+        # e.g. ranges in the symbol class
+        if (encoded == _UNDEFINED).any():
+            return None
+        return encoded.tobytes()
+    pass
+
+
+# sentences, clean sentences, break lengths, prosody rates, prosody pitches
+FrontendResult: TypeAlias = tuple[tuple[Any, ...], ...]
+
+
+class FrontendCache:
+    """
+    LRU cache of prepare_tts_model_input results by (text, ssml), apart from
+    the audio caches: an audio miss on a known text still skips SSML parsing
+    and normalization. SSML errors are cached as well and raised again.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: OrderedDict[tuple[str, bool], FrontendResult | Exception] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, text: str, ssml: bool) -> FrontendResult | Exception | None:
+        with self._lock:
+            result = self._entries.get((text, ssml))
+            if result is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end((text, ssml))
+            self.stats.hits += 1
+            return result
+
+    def put(self, text: str, ssml: bool, result: FrontendResult | Exception) -> None:
+        with self._lock:
+            self._entries[(text, ssml)] = result
+            self._entries.move_to_end((text, ssml))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+            self.stats.entries = len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats.entries = 0
+
+    def wrap(self, prepare: Callable[..., tuple]) -> Callable[..., tuple]:
+        """
+        Cached version of a model's prepare_tts_model_input.
+        """
+        def prepare_tts_model_input(text: str, ssml: bool, speaker_ids: list) -> tuple:
+            result = self.get(text, ssml)
+            if result is None:
+                try:
+                    # speaker ids are not part of the front-end work
+                    prepared = prepare(text, ssml=ssml, speaker_ids=[])
+                except (ValueError, AssertionError) as e:
+                    # without the traceback and the frames it holds
+                    self.put(text, ssml, type(e)(*e.args))
+                    raise
+                result = tuple(tuple(field) for field in prepared[:5])
+                self.put(text, ssml, result)
+
+            if isinstance(result, Exception):
+                # a fresh instance, a shared one would pile up tracebacks
+                raise type(result)(*result.args)
+            return (*(list(field) for field in result), torch.LongTensor(speaker_ids))
+
+        return prepare_tts_model_input
+    pass
+
+
+class FrontendPool:
+    """
+    SSML parsing and normalization in worker processes, off the GIL and the
+    cores of the inference process. prepare_tts_model_input is a drop-in for
+    the model's: the workers return the parsed fields and the speaker ids
+    tensor is built here. SSML errors are raised here as they would be by
+    the model.
+
+    The workers build the model object from its own class, taken from the
+    model package at model_path when they are spawned, without the weights.
+    on_parsed gets the characters and seconds of prepare_text_input of
+    every request parsed in a worker.
+    """
+
+    def __init__(
+        self,
+        model: TTSModelMultiAcc_v3,
+        workers: int,
+        start_method: str | None = None,
+        model_path: str | None = None,
+        on_parsed: Callable[[int, float], None] | None = None,
+    ) -> None:
+        self.workers = workers
+        self._on_parsed = on_parsed
+        # forked copies of this process, e.g. TTSPool replicas, parse themselves
+        self._local_prepare = model.prepare_tts_model_input
+        if start_method is None:
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._ctx = multiprocessing.get_context(start_method)
+        model_class: type | tuple[str | None, str, str, bool] = type(model)
+        if start_method != 'fork':
+            # spawned workers import it, a class from a package can't be pickled
+            model_class = (model_path, *model_package.class_location(model))
+        meta = {
+            'symbols': model.symbols,
+            'speaker_to_id': model.speaker_to_id,
+            'symb_ascii_dict': model.symb_ascii_dict,
+            'emb_dim': model.emb_dim,
+        }
+        self._worker_args = (model_class, meta)
+        self._executor: ProcessPoolExecutor | None = None
+        self._owner = os.getpid()
+
+    def start(self) -> None:
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=self._ctx, initializer=_init_worker, initargs=self._worker_args
+        )
+        # workers start on the first submit, not on the first request
+        for future in [self._executor.submit(_worker_prepare, '<speak>.</speak>', True) for _ in range(self.workers)]:
+            try:
+                future.result()
+            except (ValueError, AssertionError):
+                pass
+        print(f'front-end pool: {self.workers} workers ({self._ctx.get_start_method()})')
+
+    def submit(self, text: str, ssml: bool) -> 'Future[tuple[tuple[list, ...], int, float]]':
+        """
+        The parsed fields, with the characters and seconds of
+        prepare_text_input it took.
+        """
+        if self._executor is None:
+            raise Exception('front-end pool is not started')
+        return self._executor.submit(_worker_prepare, text, ssml)
+
+    def prepare_tts_model_input(self, text: str, ssml: bool, speaker_ids: list) -> tuple:
+        if os.getpid() != self._owner:
+            return self._local_prepare(text, ssml=ssml, speaker_ids=speaker_ids)
+        fields, chars, seconds = self.submit(text, ssml).result()
+        if self._on_parsed is not None:
+            self._on_parsed(chars, seconds)
+        return (*fields, torch.LongTensor(speaker_ids))
+
+    def close(self) -> None:
+        if self._executor is not None and os.getpid() == self._owner:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+    pass
+
+
+_worker_model: TTSModelMultiAcc_v3 | None = None
+# characters and seconds of prepare_text_input for the request being parsed
+_worker_stats = [0, 0.]
+
+
+def _init_worker(model_class: type | tuple[str | None, str, str, bool], meta: dict[str, Any]) -> None:
+    global _worker_model
+    if isinstance(model_class, tuple):
+        model_class = model_package.load_class(*model_class)
+    # the SSML code of the model without its weights
+    _worker_model = model_package.construct(model_class, None, meta, lambda model_path: None)
+    normalizer = TextNormalizer(meta['symbols'], meta['symb_ascii_dict'])
+
+    def counted(text: str) -> tuple[str, str, bool]:
+        start = time.perf_counter()
+        result = normalizer(text)
+        _worker_stats[0] += len(text)
+        _worker_stats[1] += time.perf_counter() - start
+        return result
+
+    # shadows the method on the instance, the model's ssml code calls it
+    _worker_model.prepare_text_input = counted  # type: ignore
+
+
+def _worker_prepare(text: str, ssml: bool) -> tuple[tuple[list, ...], int, float]:
+    assert _worker_model is not None
+    _worker_stats[:] = [0, 0.]
+    fields = tuple(_worker_model.prepare_tts_model_input(text, ssml=ssml, speaker_ids=[])[:5])
+    return fields, _worker_stats[0], _worker_stats[1]
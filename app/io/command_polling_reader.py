@@ -1,7 +1,10 @@
 from collections import deque
 from enum import Enum
 from typing import Callable, Generator, TypeAlias
+from app import priority, tracing
 from app.io.io import Reader
+from app.priority import Priority
+from app.tracing import tracer
 from app.tts import Speaker
 
 
@@ -54,13 +57,23 @@ class PollingCommandReader(Reader):
 
     def read(self) -> Generator[tuple[str, Speaker | None], None, None]:
 
-        print('\nPrint exit or stop for exit')
+        print('\nPrint exit or stop for exit, skip to cut the playback, !text to play text right away')
         while True:
             print()
             print('Print text for tts:')
             
             i = input().strip()
-            
+            parse_start = tracing.now()
+
+            if i == 'skip':
+                if self.on_interrupt is not None:
+                    self.on_interrupt()
+                continue
+
+            # barge-in
+            priority.set_current(Priority.high if i.startswith('!') else Priority.normal)
+            i = i.removeprefix('!').strip()
+
             sample = None
             do_continue = False
             for c in _commands:
@@ -83,6 +96,8 @@ class PollingCommandReader(Reader):
                 continue
 
             sample = f'<speak>{sample}</speak>'
+            tracer.begin_request()
+            tracer.complete('command_parsing', parse_start)
             yield sample, self.speaker
 
             pass
@@ -1,38 +1,81 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum, auto
-from io import BytesIO
-import time
+from threading import Lock
 from typing import Any
-import wave
+import numpy
 import pyaudio
+from torch import Tensor
 from app.io.io import Writer
+from app.io.latency import AdaptiveBuffer, LatencyProfile
+from app.metrics import metrics
+from app.pcm import PCMConverter
 from app.tts import SampleRate
 
 
+class AudioDevices(str, Enum):
+    DEFAULT = 'default'
+    VB_CABLE_INPUT = 'CABLE Input'
+
+
 @dataclass
 class WriterConfig:
     sample_rate: SampleRate
-    audio_device_names: list[str]
+    audio_device_names: list[str] = field(default_factory=lambda: [
+        AudioDevices.DEFAULT,
+        AudioDevices.VB_CABLE_INPUT,
+    ])
+    latency: LatencyProfile = LatencyProfile.BALANCED
+    adaptive_buffer: bool = False
 
 
 class GenericWriter(Writer):
-
-    def configure(self, config: WriterConfig) -> None:
+    """
+    Plays every utterance on all configured devices from a single process,
+    PortAudio pulls the audio through stream callbacks.
+    """
+
+    def __init__(
+        self,
+        audio_device_names: list[str] | None = None,
+        latency: LatencyProfile = LatencyProfile.BALANCED,
+        adaptive_buffer: bool = False,
+    ) -> None:
+        self.audio_device_names = audio_device_names
+        self.latency = latency
+        self.adaptive_buffer = adaptive_buffer
+        self.configured = False
+
+    def configure(self, sample_rate: SampleRate) -> None:
+        config = WriterConfig(sample_rate, latency=self.latency, adaptive_buffer=self.adaptive_buffer)
+        if self.audio_device_names is not None:
+            config.audio_device_names = self.audio_device_names
+
+        self.pcm = PCMConverter(sample_rate * 10)
         self.player = AudioPlayer(config)
-
-        ...
+        self.player.resume()
+        self.configured = True
+        print('GenericWriter ready')
 
     def close(self) -> None:
+        if not self.configured:
+            raise Exception("call Writer#configure() first!")
+
         self.player.close()
         del self.player
+        print('GenericWriter closed')
 
-    def run_process() -> None:
-        ...
+    def write(self, audio: Tensor) -> Any:
+        if not self.configured:
+            raise Exception("call Writer#configure() first!")
 
+        # the playback buffer copies the scratch view
+        self.player.play(self.pcm.convert(audio))
 
-class AudioDevices(str, Enum):
-    DEFAULT = 'default'
-    VB_CABLE_INPUT = 'CABLE Input'
+    def interrupt(self) -> None:
+        if not self.configured:
+            raise Exception("call Writer#configure() first!")
+
+        self.player.interrupt()
 
 
 class PlayerState(Enum):
@@ -40,13 +83,68 @@ class PlayerState(Enum):
     STOP = auto()
 
 
+class PlaybackBuffer:
+    """
+    int16 PCM shared by all streams. Each stream reads through its own cursor,
+    audio is dropped once every stream has played it.
+    """
+
+    sample_width = 2
+
+    def __init__(self, n_readers: int) -> None:
+        self._lock = Lock()
+        self._data = bytearray()
+        # absolute position of _data[0]
+        self._base = 0
+        self._cursors = [0] * n_readers
+
+    def append(self, pcm: bytes | memoryview) -> None:
+        with self._lock:
+            self._data += pcm
+
+    def read(self, reader: int, frame_count: int) -> bytes:
+        """
+        Always returns frame_count frames, padded with silence.
+        """
+        size = frame_count * self.sample_width
+        with self._lock:
+            start = self._cursors[reader] - self._base
+            chunk = bytes(self._data[start:start + size])
+            self._cursors[reader] += len(chunk)
+            self._compact()
+
+        if len(chunk) < size:
+            chunk += bytes(size - len(chunk))
+        return chunk
+
+    def pending(self, reader: int) -> int:
+        with self._lock:
+            return self._base + len(self._data) - self._cursors[reader]
+
+    def clear(self) -> None:
+        with self._lock:
+            end = self._base + len(self._data)
+            self._cursors = [end] * len(self._cursors)
+            self._compact()
+
+    def _compact(self) -> None:
+        played = min(self._cursors) - self._base
+        # trim in steps, so callbacks don't memmove on every call
+        if played and (played >= len(self._data) or played > 1024 * 1024):
+            del self._data[:played]
+            self._base += played
+
+
 class AudioPlayer:
 
     def __init__(self, config: WriterConfig) -> None:
         self.config = config
-        self.state: PlayerState = PlayerState.PLAY
+        self.state: PlayerState = PlayerState.STOP
         self.streams: list[pyaudio.Stream] = []
+        self.callbacks: list[AudioPlayer.CallbackHolder] = []
+        self.device_indexes: list[int | None] = []
         self.pa = pyaudio.PyAudio()
+        self.buffer = PlaybackBuffer(len(config.audio_device_names))
 
         self.__init_streams()
         pass
@@ -59,22 +157,39 @@ class AudioPlayer:
         self.pa.terminate()
 
     class CallbackHolder:
-        def __init__(self, device_name: str, data: wave.Wave_read) -> None:
+        def __init__(self, device_name: str, buffer: PlaybackBuffer, reader: int, frames: AdaptiveBuffer) -> None:
             self.device_name = device_name
-            self.data = data
+            self.buffer = buffer
+            self.reader = reader
+            self.frames = frames
+            labels = {'device': device_name.value if isinstance(device_name, Enum) else device_name}
+            self.underruns = metrics.counter(
+                'audio_output_underruns_total', 'device buffer ran dry while an utterance was playing', labels,
+            )
+            self.overruns = metrics.counter(
+                'audio_output_overruns_total', 'audio discarded by the device, the stream status flagged an overflow', labels,
+            )
+            self.frames_per_buffer = metrics.gauge('audio_frames_per_buffer', 'frames per buffer of the output stream', labels)
+            self.output_latency = metrics.gauge('audio_output_latency_seconds', 'output latency reported by the stream', labels)
             pass
 
-        def __call__(self, in_data: Any, frame_count: int, time_info: float, status: int) -> tuple[bytes, int]:
-            data = self.data.readframes(frame_count)
+        def __call__(self, in_data: Any, frame_count: int, time_info: dict, status: int) -> tuple[bytes, int]:
+            if status & pyaudio.paOutputUnderflow:
+                self.underruns.inc()
+                self.frames.underrun()
+            if status & pyaudio.paOutputOverflow:
+                self.overruns.inc()
+            data = self.buffer.read(self.reader, frame_count)
 
             return (data, pyaudio.paContinue)
 
     def __init_streams(self) -> None:
-        for device in self.config.audio_device_names:
+        for i, device in enumerate(self.config.audio_device_names):
             if device is None:
                 device = AudioDevices.DEFAULT
 
-            callback = self.CallbackHolder(device)
+            frames = AdaptiveBuffer(self.config.latency.frames_per_buffer, self.config.adaptive_buffer)
+            callback = self.CallbackHolder(device, self.buffer, i, frames)
 
             if device == AudioDevices.DEFAULT:
                 self.__add_stream(callback=callback)
@@ -88,17 +203,38 @@ class AudioPlayer:
                               device_index=info.get('index'))
 
     def __add_stream(self, callback: CallbackHolder, device_index: int | None = None) -> None:
+        self.callbacks.append(callback)
+        self.device_indexes.append(device_index)
+        self.streams.append(self.__open_stream(callback, device_index))
+
+    def __open_stream(self, callback: CallbackHolder, device_index: int | None) -> pyaudio.Stream:
+        frames = callback.frames.frames()
         stream = self.pa.open(
             stream_callback=callback,
             output=True,
             format=pyaudio.paInt16,
             channels=1,
             rate=self.config.sample_rate,
-            start=False,
-            # frames_per_buffer=CHUNK,
+            start=self.state is PlayerState.PLAY,
+            frames_per_buffer=frames,
             output_device_index=device_index,
         )
-        self.streams.append(stream)
+        latency = stream.get_output_latency()
+        print(f'{callback.device_name}: {frames} frames per buffer, output latency {latency * 1000:.1f} ms')
+        callback.frames_per_buffer.set(frames)
+        callback.output_latency.set(latency)
+        return stream
+
+    def __adapt_buffers(self) -> None:
+        """
+        Reopens the streams whose buffer size should change, only while
+        nothing is queued for them.
+        """
+        for i, callback in enumerate(self.callbacks):
+            if callback.frames.frames() == callback.frames_per_buffer.value or self.buffer.pending(i):
+                continue
+            self.streams[i].close()
+            self.streams[i] = self.__open_stream(callback, self.device_indexes[i])
 
     def get_device_info(self, device_name: str) -> dict | None:
         info = self.pa.get_host_api_info_by_index(0)
@@ -110,11 +246,21 @@ class AudioPlayer:
 
         return None
 
-    def play(self, data: bytes) -> None:
-        self.data = wave.open(BytesIO(data), 'rb')
-
-        for s in self.streams:
-            s.start_stream()
+    def play(self, pcm: numpy.ndarray | bytes) -> None:
+        """
+        Queues int16 PCM on every stream, streams keep running and play
+        silence while the buffer is empty.
+        """
+        self.__adapt_buffers()
+        self.buffer.append(memoryview(numpy.ascontiguousarray(pcm)).cast('B'))
+        self.resume()
+
+    def interrupt(self) -> None:
+        """
+        Drops the queued audio, the streams play silence from their next
+        callback on.
+        """
+        self.buffer.clear()
 
     def stop(self) -> None:
         if self.state is not PlayerState.STOP:
@@ -131,6 +277,9 @@ class AudioPlayer:
     def is_any_active(self) -> bool:
         return any([s.is_active() for s in self.streams])
 
+    def is_playing(self) -> bool:
+        return any(self.buffer.pending(i) > 0 for i in range(len(self.streams)))
+
     @staticmethod
     def get_device_names(pa: pyaudio.PyAudio | None = None) -> list[str]:
         no_pa = pa is None
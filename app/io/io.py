@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any, Generator
+from typing import Any, Callable, Generator
 
 from torch import Tensor
 
@@ -7,6 +7,9 @@ from app.tts import SampleRate, Speaker
 
 
 class Reader(ABC):
+    # set by the manager, a stop/skip control of the reader calls it
+    on_interrupt: Callable[[], None] | None = None
+
     @abstractmethod
     def configure(self) -> None:
         pass
@@ -33,4 +36,11 @@ class Writer(ABC):
     @abstractmethod
     def write(self, audio: Tensor) -> Any:
         pass
+
+    def interrupt(self) -> None:
+        """
+        Cuts the audio playing and the audio written but not played yet.
+        Writers which don't play anything have nothing to cut.
+        """
+        pass
     pass
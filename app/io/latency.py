@@ -0,0 +1,104 @@
+"""
+Output latency of the audio devices.
+
+A LatencyProfile sets the PortAudio frames per buffer of every output
+stream: smaller buffers start the audio sooner and cut it sooner on a
+barge-in, but run dry when the process doesn't keep up. PyAudio opens
+streams with the device's default low output latency and has no parameter
+for a suggested latency, so the buffer size is the knob; the latency the
+stream ends up with is reported by the writers.
+
+AdaptiveBuffer grows the buffer after repeated underruns and shrinks it
+back to the profile size once playback is stable. Streams can only change
+their buffer size when reopened, the writers do that between utterances.
+"""
+from enum import Enum
+from threading import Lock
+import time
+from typing import Callable
+
+
+class LatencyProfile(str, Enum):
+    LOW = 'low'
+    BALANCED = 'balanced'
+    SAFE = 'safe'
+
+    @property
+    def frames_per_buffer(self) -> int:
+        return _FRAMES[self]
+
+    @staticmethod
+    def from_string(s: str) -> 'LatencyProfile':
+        return LatencyProfile(s.lower())
+    pass
+
+
+_FRAMES = {
+    LatencyProfile.LOW: 256,
+    LatencyProfile.BALANCED: 1024,
+    LatencyProfile.SAFE: 4096,
+}
+
+
+class AdaptiveBuffer:
+    """
+    Frames per buffer of one stream. underrun() may be called from a stream
+    callback, frames() from the thread which reopens the stream.
+    """
+
+    def __init__(
+        self,
+        frames_per_buffer: int,
+        adaptive: bool = False,
+        max_frames: int = 8192,
+        grow_after: int = 3,
+        window: float = 10.,
+        stable_for: float = 30.,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_frames = frames_per_buffer
+        self.max_frames = max(max_frames, frames_per_buffer)
+        self.adaptive = adaptive
+        # underruns within window seconds before the buffer grows
+        self.grow_after = grow_after
+        self.window = window
+        # seconds without underruns before it shrinks a step
+        self.stable_for = stable_for
+        self.clock = clock
+        self._frames = frames_per_buffer
+        self._underruns: list[float] = []
+        self._changed_at = clock()
+        self._last_underrun = 0.
+        self._lock = Lock()
+
+    def underrun(self) -> None:
+        with self._lock:
+            self._last_underrun = self.clock()
+            self._underruns.append(self._last_underrun)
+
+    def frames(self) -> int:
+        """
+        The buffer size the stream should have now.
+        """
+        if not self.adaptive:
+            return self._frames
+        with self._lock:
+            now = self.clock()
+            self._underruns = [t for t in self._underruns if t > now - self.window]
+            if len(self._underruns) >= self.grow_after and self._frames < self.max_frames:
+                self._resize(min(self._frames * 2, self.max_frames), now)
+            elif (
+                not self._underruns
+                and self._frames > self.min_frames
+                and now - max(self._changed_at, self._last_underrun) >= self.stable_for
+            ):
+                self._resize(max(self._frames // 2, self.min_frames), now)
+            return self._frames
+
+    def _resize(self, frames: int, now: float) -> None:
+        print(f'audio buffer: {self._frames} -> {frames} frames')
+        self._frames = frames
+        self._changed_at = now
+        # underruns of the old size don't count against the new one
+        self._underruns.clear()
+    pass
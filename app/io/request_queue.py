@@ -0,0 +1,121 @@
+"""
+Load shedding for requests sent by the GUI.
+
+The GUI process puts requests on a multiprocessing queue bounded by
+max_size and drops what doesn't fit. RequestQueue takes them on the TTS
+process side: every get drains what is waiting and applies the policies to
+the backlog before handing out the oldest request left.
+
+- coalesce: an identical request right behind another one is merged into it;
+- max_age: requests waiting longer than this many seconds are dropped;
+- keep_latest: only the newest N waiting requests are kept.
+
+Shed requests are counted per reason and reported to on_shed. A stop/skip
+control (text None) drops the requests waiting before it, those are not
+counted as shed.
+"""
+from collections import deque
+from enum import Enum
+from queue import Empty
+from typing import Any, Callable, TypeAlias
+from app import tracing
+from app.metrics import metrics
+
+
+# request id, put timestamp (tracing.now), text or None for stop/skip, priority
+GuiRequest: TypeAlias = tuple[tracing.RequestId, int, str | None, int]
+
+
+class ShedReason(str, Enum):
+    coalesced = 'coalesced'
+    stale = 'stale'
+    superseded = 'superseded'
+    overflow = 'overflow'
+    pass
+
+
+_shed = {
+    reason: metrics.counter('gui_requests_shed_total', 'GUI requests dropped by the request queue', {'reason': reason.value})
+    for reason in ShedReason
+}
+
+
+class RequestQueue:
+
+    def __init__(
+        self,
+        source: Any,
+        coalesce: bool = False,
+        max_age: float = 0.,
+        keep_latest: int = 0,
+        on_shed: Callable[[ShedReason, int], None] | None = None,
+    ) -> None:
+        self.source = source
+        self.coalesce = coalesce
+        # seconds, 0 keeps requests however long they wait
+        self.max_age = max_age
+        # 0 keeps every waiting request
+        self.keep_latest = keep_latest
+        self.on_shed = on_shed
+        self.shed = {reason: 0 for reason in ShedReason}
+        self._pending: deque[GuiRequest] = deque()
+
+    def get(self) -> GuiRequest:
+        while True:
+            if not self._pending:
+                self._add(self.source.get())
+            self._drain()
+            if self._skip_to_control():
+                # never shed
+                return self._pending.popleft()
+            self._drop_stale()
+            if self.keep_latest and len(self._pending) > self.keep_latest:
+                superseded = len(self._pending) - self.keep_latest
+                for _ in range(superseded):
+                    self._pending.popleft()
+                self._count(ShedReason.superseded, superseded)
+            if self._pending:
+                return self._pending.popleft()
+
+    def qsize(self) -> int:
+        return len(self._pending) + self.source.qsize()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                self._add(self.source.get_nowait())
+            except Empty:
+                return
+
+    def _add(self, request: GuiRequest) -> None:
+        if self.coalesce and request[2] is not None and self._pending and self._pending[-1][2] == request[2]:
+            self._count(ShedReason.coalesced, 1)
+            return
+        self._pending.append(request)
+
+    def _skip_to_control(self) -> bool:
+        controls = [i for i, request in enumerate(self._pending) if request[2] is None]
+        if not controls:
+            return False
+        for _ in range(controls[-1]):
+            self._pending.popleft()
+        return True
+
+    def _drop_stale(self) -> None:
+        if not self.max_age:
+            return
+        deadline = tracing.now() - int(self.max_age * 1e9)
+        stale = 0
+        while self._pending and self._pending[0][1] < deadline:
+            self._pending.popleft()
+            stale += 1
+        if stale:
+            self._count(ShedReason.stale, stale)
+
+    def _count(self, reason: ShedReason, n: int) -> None:
+        self.shed[reason] += n
+        _shed[reason].inc(n)
+        if self.on_shed is not None:
+            self.on_shed(reason, n)
+    pass
+
@@ -0,0 +1,220 @@
+from dataclasses import dataclass
+from multiprocessing import Condition
+from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Condition as ConditionType
+import struct
+import time
+from typing import Any
+
+
+# write position, closed flag, then one read cursor per reader
+_HEADER = struct.Struct('<QQ')
+_CURSOR = struct.Struct('<Q')
+# payload length, opaque tag
+_RECORD = struct.Struct('<QQ')
+_WRAP = 0xFFFFFFFFFFFFFFFF
+_ALIGN = 8
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+@dataclass
+class RingHandle:
+    """
+    Everything a worker process needs to attach to a ring, picklable.
+    """
+    name: str
+    capacity: int
+    n_readers: int
+    cond: Any
+
+
+@dataclass
+class RingRecord:
+    data: memoryview
+    tag: int
+    _size: int
+
+
+class _Ring:
+
+    def __init__(self, shm: SharedMemory, capacity: int, n_readers: int, cond: ConditionType) -> None:
+        self.shm = shm
+        self.capacity = capacity
+        self.n_readers = n_readers
+        self.cond = cond
+        self._data_offset = _align(_HEADER.size + _CURSOR.size * n_readers)
+
+    def _write_pos(self) -> int:
+        return _HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def _closed(self) -> bool:
+        return bool(_HEADER.unpack_from(self.shm.buf, 0)[1])
+
+    def _set_header(self, write_pos: int, closed: bool) -> None:
+        _HEADER.pack_into(self.shm.buf, 0, write_pos, int(closed))
+
+    def _cursor(self, index: int) -> int:
+        return _CURSOR.unpack_from(self.shm.buf, _HEADER.size + _CURSOR.size * index)[0]
+
+    def _set_cursor(self, index: int, pos: int) -> None:
+        _CURSOR.pack_into(self.shm.buf, _HEADER.size + _CURSOR.size * index, pos)
+
+    def _offset(self, pos: int) -> int:
+        return self._data_offset + pos % self.capacity
+
+
+class SharedRingBuffer(_Ring):
+    """
+    Single writer, multi reader ring buffer over shared memory.
+
+    Every record is copied into shared memory once and read in place by each
+    reader through its own cursor, so every reader sees every record in
+    order. The writer blocks while the slowest reader has not freed enough
+    space.
+    """
+
+    def __init__(self, capacity: int, n_readers: int) -> None:
+        capacity = _align(capacity)
+        header_size = _align(_HEADER.size + _CURSOR.size * n_readers)
+        shm = SharedMemory(create=True, size=header_size + capacity)
+        super().__init__(shm, capacity, n_readers, Condition())
+
+        self._set_header(0, False)
+        for i in range(n_readers):
+            self._set_cursor(i, 0)
+
+    @property
+    def max_record_size(self) -> int:
+        # keeps room for a wrap marker and the next record
+        return self.capacity // 2 - _RECORD.size
+
+    def handle(self) -> RingHandle:
+        return RingHandle(self.shm.name, self.capacity, self.n_readers, self.cond)
+
+    def write(self, data: bytes | memoryview, tag: int = 0, timeout: float | None = None) -> bool:
+        """
+        Writes data as one or more records. Returns False if the readers did
+        not free enough space within timeout.
+        """
+        view = memoryview(data).cast('B')
+        for start in range(0, max(len(view), 1), self.max_record_size):
+            if not self._write_record(view[start:start + self.max_record_size], tag, timeout):
+                return False
+        return True
+
+    def _write_record(self, payload: memoryview, tag: int, timeout: float | None) -> bool:
+        record_size = _align(_RECORD.size + len(payload))
+
+        with self.cond:
+            pos = self._write_pos()
+            tail = self.capacity - pos % self.capacity
+            skip = tail if tail < record_size else 0
+            needed = skip + record_size
+
+            has_space = lambda: self.capacity - (pos - self._min_cursor()) >= needed  # noqa: E731
+            if not self.cond.wait_for(has_space, timeout):
+                return False
+
+        # the reserved region is not touched by readers until published
+        if skip:
+            if skip >= _RECORD.size:
+                _RECORD.pack_into(self.shm.buf, self._offset(pos), _WRAP, 0)
+            pos += skip
+        offset = self._offset(pos)
+        _RECORD.pack_into(self.shm.buf, offset, len(payload), tag)
+        start = offset + _RECORD.size
+        self.shm.buf[start:start + len(payload)] = payload
+
+        with self.cond:
+            self._set_header(pos + record_size, self._closed())
+            self.cond.notify_all()
+        return True
+
+    def fill_level(self) -> int:
+        with self.cond:
+            return self._write_pos() - self._min_cursor()
+
+    def write_position(self) -> int:
+        """
+        Position of the next record, records before it have a lower one.
+        """
+        with self.cond:
+            return self._write_pos()
+
+    def close(self) -> None:
+        with self.cond:
+            self._set_header(self._write_pos(), True)
+            self.cond.notify_all()
+
+    def release(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+    def _min_cursor(self) -> int:
+        return min(self._cursor(i) for i in range(self.n_readers))
+    pass
+
+
+class RingReader(_Ring):
+    """
+    Reader side, attached by a worker process with its own cursor index.
+    """
+
+    def __init__(self, handle: RingHandle, index: int) -> None:
+        super().__init__(
+            SharedMemory(name=handle.name), handle.capacity, handle.n_readers, handle.cond
+        )
+        self.index = index
+
+    def read(self, timeout: float | None = None) -> RingRecord | None:
+        """
+        Returns the next record in place, or None on timeout or once the ring
+        is closed. The record stays valid until advance() is called.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                pos = self._cursor(self.index)
+                if self._closed():
+                    return None
+                if self._write_pos() > pos:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+        tail = self.capacity - pos % self.capacity
+        skip = 0
+        if tail < _RECORD.size:
+            skip = tail
+        elif _RECORD.unpack_from(self.shm.buf, self._offset(pos))[0] == _WRAP:
+            skip = tail
+        pos += skip
+
+        offset = self._offset(pos)
+        length, tag = _RECORD.unpack_from(self.shm.buf, offset)
+        start = offset + _RECORD.size
+        view = self.shm.buf[start:start + length]
+        data = view.toreadonly()
+        view.release()
+        return RingRecord(data, tag, skip + _align(_RECORD.size + length))
+
+    def position(self) -> int:
+        """
+        Position of the record read last until it is advanced past.
+        """
+        return self._cursor(self.index)
+
+    def advance(self, record: RingRecord) -> None:
+        record.data.release()
+        with self.cond:
+            self._set_cursor(self.index, self._cursor(self.index) + record._size)
+            self.cond.notify_all()
+
+    def close(self) -> None:
+        self.shm.close()
+    pass
@@ -5,6 +5,8 @@ from typing import Any, Generator
 import wave
 from torch import Tensor
 from app.io.io import Reader, Writer
+from app.pcm import PCMConverter
+from app.tracing import tracer
 
 from app.tts import SampleRate, Speaker
 
@@ -37,6 +39,7 @@ class SimplePollingReader(Reader):
                 continue
 
             sample = f"<speak>{i}</speak>"
+            tracer.begin_request()
             yield sample, speaker
             pass
         print('exit')
@@ -52,6 +55,7 @@ class SimpleWavWriter(Writer):
 
     def configure(self, sample_rate: SampleRate) -> None:
         self.sample_rate = sample_rate
+        self.pcm = PCMConverter(sample_rate * 10)
 
     def close(self) -> None:
         return super().close()
@@ -60,7 +64,7 @@ class SimpleWavWriter(Writer):
         audio_name = int(time.time() * 1000)
         path = f'{self.save_dir}/{audio_name}.wav'
 
-        audio_wav = (audio * 32767).numpy().astype('int16')
+        audio_wav = self.pcm.convert(audio)
 
         with contextlib.closing(wave.open(path, 'wb')) as wf:
             wf.setnchannels(1)
@@ -1,26 +1,65 @@
-from multiprocessing import Process, Queue
-from typing import Any
-from numpy import ndarray
-import numpy
+from multiprocessing import Process, Queue, Value
+import queue
+from typing import Any, Callable
 import pyaudio
 from torch import Tensor
 
+from app import tracing
 from app.io.io import Writer
+from app.io.latency import AdaptiveBuffer, LatencyProfile
+from app.io.shm_ring import RingHandle, RingReader, SharedRingBuffer
+from app.metrics import metrics
+from app.pcm import PCMConverter
+from app.tracing import tracer
 from app.tts import SampleRate
 
 
+_shed = metrics.counter('audio_utterances_shed_total', 'utterances dropped while the playback backlog was full')
+
+
 class VBCableWriter(Writer):
     msg_ready = 'ready'
-    msg_close = 'close'
+
+    # ~3 min of 48 kHz int16 mono
+    ring_capacity = 16 * 1024 * 1024
+    write_timeout = 10.
+    device_names = ('default', 'vb_cable')
+
+    def __init__(
+        self,
+        latency: LatencyProfile = LatencyProfile.BALANCED,
+        adaptive_buffer: bool = False,
+        max_backlog: float = 0.,
+    ) -> None:
+        self.latency = latency
+        self.adaptive_buffer = adaptive_buffer
+        # seconds of audio waiting to be played, new utterances are dropped past it, 0 is unbounded
+        self.max_backlog = max_backlog
+        # called with the reason and count of dropped utterances
+        self.on_shed: Callable[[str, int], None] | None = None
+        self.configured = False
+        self._last_request_id: tracing.RequestId | None = None
 
     def configure(self, sample_rate: SampleRate) -> None:
         self.configured = True
         self.device_name = 'CABLE Input'
         self.sample_rate = sample_rate
         self.device_info = self._get_device_info()
-        self.q_data: Queue = Queue()
+        self.pcm = PCMConverter(sample_rate * 10)
+        # one reader cursor per device process
+        self.ring = SharedRingBuffer(self.ring_capacity, n_readers=2)
         self.q_signals: Queue = Queue()
+        # device processes send their trace events back through it
+        self.q_trace: Queue | None = Queue() if tracer.enabled else None
+        # output underruns counted by each device process
+        self.underruns = [Value('Q', 0), Value('Q', 0)]
+        # buffer size and output latency each device process runs with
+        self.buffer_frames = [Value('Q', 0), Value('Q', 0)]
+        self.output_latency = [Value('d', 0.), Value('d', 0.)]
+        # control channel: device processes skip the audio written before this ring position
+        self.flush_pos = Value('Q', 0)
         self.processes: list[Process] = self._run_processes()
+        self._register_metrics()
         print('VBCableWriter ready')
 
     def close(self) -> None:
@@ -29,15 +68,21 @@ class VBCableWriter(Writer):
 
         print('writer closing...')
 
-        self.q_data.put(VBCableWriter.msg_close)
+        self.ring.close()
 
         for p in self.processes:
+            # a worker doesn't exit while its trace events fill the pipe
+            self._collect_trace()
+            p.join(timeout=1)
             if p.is_alive():
                 p.terminate()
+                p.join()
 
-        for p in self.processes:
-            p.join()
-
+        self._collect_trace()
+        metrics.unregister('audio_ring_fill_bytes')
+        metrics.unregister('audio_frames_per_buffer')
+        metrics.unregister('audio_output_latency_seconds')
+        self.ring.release()
         print('writer closed')
         pass
 
@@ -45,30 +90,61 @@ class VBCableWriter(Writer):
         if not self.configured:
             raise Exception("call Writer#configure() first!")
 
-        audio_wav = self._tensor_to_wav_array(audio).tobytes()
-        self.q_data.put_nowait(audio_wav)
-        self.q_data.put_nowait(audio_wav)
+        request_id = tracing.current_request_id()
+        # write() doesn't wait for the devices, spammed requests would pile up here as audio;
+        # the stream chunks of an utterance already playing are kept
+        new_utterance = request_id is None or request_id != self._last_request_id
+        if new_utterance and self._backlog_full():
+            print('VBCableWriter: playback backlog is full, utterance dropped')
+            _shed.inc()
+            if self.on_shed is not None:
+                self.on_shed('backlog', 1)
+            return
+        self._last_request_id = request_id
+
+        # scratch view, the ring copies it
+        audio_wav = self.pcm.convert(audio)
+        tracer.begin('ipc', request_id)
+        # the only copy of the utterance, every device process reads it in place
+        if not self.ring.write(memoryview(audio_wav), tag=request_id or 0, timeout=self.write_timeout):
+            print('VBCableWriter: audio devices are stuck, utterance dropped')
 
         pass
 
+    def interrupt(self) -> None:
+        if not self.configured:
+            raise Exception("call Writer#configure() first!")
+
+        # device processes check it between buffers
+        self.flush_pos.value = self.ring.write_position()
+
+    def _backlog_full(self) -> bool:
+        if not self.max_backlog:
+            return False
+        # audio before an interrupt is skipped, it doesn't count even while the devices catch up
+        backlog = min(self.ring.fill_level(), self.ring.write_position() - self.flush_pos.value)
+        # int16 mono
+        return backlog > self.max_backlog * self.sample_rate * 2
+
     def _run_processes(self) -> list[Process]:
         processes = [
             Process(target=self._work, args=(
-                self.q_data,
-                self.q_signals,
-                self.sample_rate,
-                None,
-                "default stream"),
-                daemon=True,
-            ),
-            Process(target=self._work, args=(
-                self.q_data,
+                self.ring.handle(),
+                i,
                 self.q_signals,
                 self.sample_rate,
-                self.device_info.get('index'),
-                "vb_cable stream"),
+                device_index,
+                f"{name} stream",
+                self.q_trace,
+                self.underruns[i],
+                self.flush_pos,
+                self.latency.frames_per_buffer,
+                self.adaptive_buffer,
+                self.buffer_frames[i],
+                self.output_latency[i]),
                 daemon=True,
-            ),
+            )
+            for i, (name, device_index) in enumerate(zip(self.device_names, (None, self.device_info.get('index'))))
         ]
 
         for p in processes:
@@ -87,46 +163,117 @@ class VBCableWriter(Writer):
 
     @staticmethod
     def _work(
-        q_data: Queue,
+        ring_handle: RingHandle,
+        reader_index: int,
         q_signals: Queue,
         sample_rate: SampleRate,
         device_index: int | None = None,
-        process_name: str = 'process'
+        process_name: str = 'process',
+        q_trace: 'Queue | None' = None,
+        underruns: Any = None,
+        flush_pos: Any = None,
+        frames_per_buffer: int = LatencyProfile.BALANCED.frames_per_buffer,
+        adaptive_buffer: bool = False,
+        buffer_frames: Any = None,
+        output_latency: Any = None,
     ) -> None:
         print(f'{process_name}: configure...')
+        ring = RingReader(ring_handle, reader_index)
         p = pyaudio.PyAudio()
 
-        CHUNK = 1024
         channels = 1
+        buffer = AdaptiveBuffer(frames_per_buffer, adaptive_buffer)
+
+        def open_stream(frames: int) -> Any:
+            stream = p.open(
+                format=pyaudio.paInt16,
+                channels=channels,
+                rate=sample_rate,
+                frames_per_buffer=frames,
+                output=True,
+                output_device_index=device_index
+            )
+            latency = stream.get_output_latency()
+            print(f'{process_name}: {frames} frames per buffer, output latency {latency * 1000:.1f} ms')
+            if buffer_frames is not None:
+                buffer_frames.value = frames
+            if output_latency is not None:
+                output_latency.value = latency
+            return stream
 
-        stream = p.open(
-            format=pyaudio.paInt16,
-            channels=channels,
-            rate=sample_rate,
-            frames_per_buffer=CHUNK,
-            output=True,
-            output_device_index=device_index
-        )
+        frames = buffer.frames()
+        stream = open_stream(frames)
 
         # send ready
         q_signals.put(VBCableWriter.msg_ready)
 
         print(f'{process_name}: ready')
-        while True:
-            if not q_signals.empty() and q_signals.get_nowait() == VBCableWriter.msg_close:
-                break
+        # None once the writer closes the ring
+        last_tag = 0
+        while (record := ring.read()) is not None:
+            if record.tag != last_tag and buffer.frames() != frames:
+                # a new utterance, reopening doesn't cut one short
+                stream.close()
+                frames = buffer.frames()
+                stream = open_stream(frames)
+            chunk_size = frames * channels * 2
+            start = tracing.now()
+            # small writes, so underruns inside an utterance can be told apart
+            # and an interrupt cuts the playback within one buffer
+            for offset in range(0, len(record.data), chunk_size):
+                if flush_pos is not None and ring.position() < flush_pos.value:
+                    break
+                try:
+                    stream.write(record.data[offset:offset + chunk_size], exception_on_underflow=True)
+                except OSError as e:
+                    if e.errno != pyaudio.paOutputUnderflowed:
+                        raise
+                    # the device always runs dry between utterances
+                    if underruns is not None and (offset or (record.tag and record.tag == last_tag)):
+                        with underruns.get_lock():
+                            underruns.value += 1
+                        buffer.underrun()
+            ring.advance(record)
 
-            data = q_data.get()
-            stream.write(data)
+            if q_trace is not None and record.tag:
+                events = [tracing.event('X', process_name, record.tag, start, tracing.now())]
+                # long utterances span several records
+                if record.tag != last_tag:
+                    events.append(tracing.event('E', 'ipc', record.tag, start))
+                q_trace.put(events)
+            last_tag = record.tag
 
         stream.close()
         p.terminate()
+        ring.close()
         print(f'{process_name}: stopped')
         pass
 
-    @staticmethod
-    def _tensor_to_wav_array(tensor: Tensor) -> ndarray:
-        return (tensor * 32767).numpy().astype(numpy.int16)
+    def _register_metrics(self) -> None:
+        ring = self.ring
+        metrics.gauge('audio_ring_fill_bytes', 'audio written to the ring, not played by every device yet', fn=ring.fill_level)
+        for name, counter, frames, latency in zip(self.device_names, self.underruns, self.buffer_frames, self.output_latency):
+            metrics.gauge(
+                'audio_frames_per_buffer', 'frames per buffer of the output stream',
+                {'device': name}, fn=lambda v=frames: v.value,
+            )
+            metrics.gauge(
+                'audio_output_latency_seconds', 'output latency reported by the stream',
+                {'device': name}, fn=lambda v=latency: v.value,
+            )
+            metrics.counter(
+                'audio_output_underruns_total', 'device buffer ran dry while an utterance was playing',
+                {'device': name}, fn=lambda c=counter: c.value,
+            )
+
+    def _collect_trace(self) -> None:
+        if self.q_trace is None:
+            return
+        while True:
+            try:
+                tracer.add_events(self.q_trace.get_nowait())
+            except queue.Empty:
+                break
 
     def _get_device_info(self) -> dict:
         p = pyaudio.PyAudio()
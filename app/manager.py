@@ -1,47 +1,366 @@
+from concurrent.futures import Future
+from queue import Queue
+from threading import Thread
+from typing import Any, Generator, NamedTuple
+from torch import Tensor
+from app import priority, tracing
 from app.io.io import Reader, Writer
-from app.tts import TTS
+from app.metrics import metrics
+from app.pool import TTSPool
+from app.priority import PREEMPT, Priority
+from app.tracing import tracer
+from app.tts import TTS, ModelInput, Speaker
 
 
 class TTSManager():
-    def __init__(self, tts: TTS, inputer: Reader, outputer: Writer) -> None:
+    def __init__(self, tts: TTS | TTSPool, inputer: Reader, outputer: Writer) -> None:
         self.tts = tts
         self.inputer = inputer
         self.outputer = outputer
+        self.inputer.on_interrupt = self.interrupt
         pass
 
     def start(self) -> None:
+        self._configure()
+
+        try:
+            for sample, speaker in self.inputer.read():
+                # the reader tagged the request in this thread
+                with tracing.request(tracing.current_request_id()):
+                    self._process(sample, speaker, priority.current())
+        except KeyboardInterrupt:
+            print('Exit by KeyboardInterrupt')
+            pass
+
+        self._close()
+
+    def interrupt(self) -> None:
+        """
+        Stop/skip: cuts the playback, called by the reader.
+        """
+        print('playback interrupted')
+        self.outputer.interrupt()
+
+    def _configure(self) -> None:
+        if self.tts.config.trace_dir:
+            # before the writer starts its workers
+            tracer.enable()
+
         self.inputer.configure()
         self.outputer.configure(self.tts.config.sample_rate)
         self.tts.configure()
         print('All tts modules are ready')
 
+        if self.tts.config.metrics_port:
+            metrics.serve(self.tts.config.metrics_port)
+        if self.tts.config.metrics_json:
+            metrics.dump_every(self.tts.config.metrics_json, self.tts.config.metrics_interval)
+
+    def _close(self) -> None:
+        self._print_cache_stats()
+        self.tts.close()
+
+        self.inputer.close()
+        self.outputer.close()
+        metrics.stop()
+
+        if self.tts.config.trace_dir:
+            tracer.export(self.tts.config.trace_dir)
+
+    def _process(self, sample: str, speaker: Speaker | None, request_priority: Priority = Priority.normal) -> None:
+        # barge-in once the new audio is there, not while it is synthesized
+        preempt = request_priority >= PREEMPT
+        if self.tts.config.streaming:
+            for chunk in self._synthesize_stream(sample, speaker):
+                if preempt:
+                    self.outputer.interrupt()
+                    preempt = False
+                self._write(chunk)
+            return
+
+        audio = self._synthesize(sample, speaker)
+        if audio is None:
+            return
+
+        if preempt:
+            self.outputer.interrupt()
+        self._write(audio)
+
+    def _write(self, audio: Tensor) -> None:
+        with tracer.span('write'):
+            self.outputer.write(audio)
+
+    def _synthesize(
+        self, sample: str, speaker: Speaker | None, model_input: ModelInput | None = None
+    ) -> Tensor | None:
         try:
-            for sample, speaker in self.inputer.read():
-                try:
-                    audio = self.tts.do_tts(
-                        sample, speaker
-                    )
-                except ValueError as e:
-                    print('Wrong ssml syntax')
-                    continue
+            with tracer.span('synthesis'):
+                return self.tts.do_tts(
+                    sample, speaker, model_input
+                )
+        except (ValueError, AssertionError) as e:
+            self._report_error(e)
+            return None
 
-                except AssertionError as e:
-                    if "Invalid <prosody> tag" in str(e):
-                        print('Wrong ssml syntax: invalid prosody tag')
-                        continue
-                    if "Empty <prosody> tag" in str(e):
-                        print("Wrong ssml syntax: empty <prosody> tag")
-                        continue
-                    print('Unknown error')
-                    print(e)
-                    continue
-                    # raise e
+    def _synthesize_stream(
+        self, sample: str, speaker: Speaker | None, model_input: ModelInput | None = None
+    ) -> Generator[Tensor, None, None]:
+        try:
+            yield from self.tts.do_tts_stream(sample, speaker, model_input)
+        except (ValueError, AssertionError) as e:
+            self._report_error(e)
+
+    @staticmethod
+    def _report_error(e: Exception) -> None:
+        if isinstance(e, ValueError):
+            print('Wrong ssml syntax')
+            return
+
+        if "Invalid <prosody> tag" in str(e):
+            print('Wrong ssml syntax: invalid prosody tag')
+            return
+        if "Empty <prosody> tag" in str(e):
+            print("Wrong ssml syntax: empty <prosody> tag")
+            return
+        print('Unknown error')
+        print(e)
+        # raise e
+
+    def _print_cache_stats(self) -> None:
+        if self.tts.audio_cache is not None:
+            print(f'audio cache: {self.tts.audio_cache.stats}')
+        if self.tts.disk_cache is not None:
+            print(f'audio disk cache: {self.tts.disk_cache.stats}')
+        if self.tts.frontend_cache is not None:
+            print(f'front-end cache: {self.tts.frontend_cache.stats}')
+    pass
+
+
+class _Request(NamedTuple):
+    sample: str
+    speaker: Speaker | None
+    request_id: tracing.RequestId | None
+    # reading order
+    seq: int
+    priority: Priority
+    # parsed by the front-end stage
+    model_input: ModelInput | None = None
+
+
+_dropped = metrics.counter('pipeline_preempted_total', 'queued requests dropped by a stop/skip or a higher priority request')
+
+
+class PipelinedTTSManager(TTSManager):
+    """
+    Runs reading, synthesis and writing in a thread each, connected by bounded
+    queues, so the next utterance is synthesized while the current one plays.
+    Every stage is a single thread, which keeps the utterance order. With a
+    TTSPool up to queue_size utterances are synthesized at once and the writer
+    takes their futures in order. With a front-end pool a front-end stage
+    parses the SSML ahead of synthesis and drops invalid requests before they
+    reach the synthesizer queue.
 
-                self.outputer.write(audio)
+    A request of PREEMPT priority drops the requests of lower priority read
+    before it, wherever they are queued, and cuts the playback when its audio
+    gets to the writer. A stop/skip drops everything read so far.
+    """
+
+    _stop = object()
+
+    def __init__(
+        self,
+        tts: TTS | TTSPool,
+        inputer: Reader,
+        outputer: Writer,
+        queue_size: int = 4,
+        report_interval: float = 0.,
+    ) -> None:
+        super().__init__(tts, inputer, outputer)
+        self.report_interval = report_interval
+        self.q_frontend: Queue[Any] = Queue(maxsize=queue_size)
+        self.q_synth: Queue[Any] = Queue(maxsize=queue_size)
+        self.q_write: Queue[Any] = Queue(maxsize=queue_size)
+        # where the reader puts requests, set on start
+        self._q_read = self.q_synth
+        # requests up to this seq with a lower priority are dropped, see _is_cut
+        self._cut: tuple[int, int] = (-1, Priority.low)
+        self._last_seq = -1
+        # the preempting request which already cut the playback, its stream chunks don't cut each other
+        self._preempted_seq = -1
+        for stage, q in (('frontend', self.q_frontend), ('synthesizer', self.q_synth), ('writer', self.q_write)):
+            metrics.gauge('pipeline_queue_depth', 'items waiting for a pipeline stage', {'stage': stage}, fn=q.qsize)
+
+    def start(self) -> None:
+        self._configure()
+
+        # the reader may block on input forever, don't wait for it on exit
+        reader = Thread(target=self._read_stage, name='reader', daemon=True)
+        synth = Thread(target=self._synth_stage, name='synthesizer', daemon=True)
+        writer = Thread(target=self._write_stage, name='writer', daemon=True)
+        stages = [reader, synth, writer]
+        if self.tts.frontend_pool is not None:
+            self._q_read = self.q_frontend
+            stages.append(Thread(target=self._frontend_stage, name='frontend', daemon=True))
+        for t in stages:
+            t.start()
+
+        try:
+            timeout = self.report_interval or None
+            while writer.is_alive():
+                writer.join(timeout)
+                if self.report_interval and writer.is_alive():
+                    print(f'queue depths: {self.queue_depths()}')
         except KeyboardInterrupt:
             print('Exit by KeyboardInterrupt')
             pass
 
-        self.inputer.close()
-        self.outputer.close()
+        self._close()
+
+    def interrupt(self) -> None:
+        # everything read so far, whatever its priority
+        self._cut_before(self._last_seq, len(Priority))
+        super().interrupt()
+
+    def queue_depths(self) -> dict[str, int]:
+        return {
+            'frontend': self.q_frontend.qsize(),
+            'synthesizer': self.q_synth.qsize(),
+            'writer': self.q_write.qsize(),
+        }
+
+    def _read_stage(self) -> None:
+        try:
+            for seq, (sample, speaker) in enumerate(self.inputer.read()):
+                request = _Request(sample, speaker, tracing.current_request_id(), seq, priority.current())
+                self._last_seq = seq
+                if request.priority >= PREEMPT:
+                    self._cut_before(seq - 1, request.priority)
+                tracer.begin('synth_queue', request.request_id)
+                self._q_read.put(request)
+        finally:
+            self._q_read.put(self._stop)
+
+    def _is_cut(self, request: _Request) -> bool:
+        seq, cut_priority = self._cut
+        return request.seq <= seq and request.priority < cut_priority
+
+    def _cut_before(self, seq: int, cut_priority: int) -> None:
+        """
+        Drops the requests up to seq with a priority below cut_priority. The
+        queued ones are removed at once, so the next request doesn't wait for
+        a free slot, the stages skip the ones they hold.
+        """
+        self._cut = (seq, cut_priority)
+        for q in (self.q_frontend, self.q_synth, self.q_write):
+            with q.mutex:
+                dropped = [item for item in q.queue if item is not self._stop and self._is_cut(self._request_of(item))]
+                if not dropped:
+                    continue
+                kept = [item for item in q.queue if item is self._stop or not self._is_cut(self._request_of(item))]
+                q.queue.clear()
+                q.queue.extend(kept)
+                q.not_full.notify_all()
+            for item in dropped:
+                self._drop(item)
+
+    @staticmethod
+    def _request_of(item: Any) -> _Request:
+        # queued requests, or (audio, request) on the writer queue
+        return item if isinstance(item, _Request) else item[1]
+
+    @staticmethod
+    def _drop(item: Any) -> None:
+        _dropped.inc()
+        if isinstance(item, _Request):
+            tracer.end('synth_queue', item.request_id)
+            return
+        audio, request = item
+        if isinstance(audio, Future):
+            audio.cancel()
+        tracer.end('write_queue', request.request_id)
+
+    def _frontend_stage(self) -> None:
+        try:
+            while (request := self.q_frontend.get()) is not self._stop:
+                if self._is_cut(request):
+                    self._drop(request)
+                    continue
+                try:
+                    with tracing.request(request.request_id):
+                        # parsed in a front-end worker, synthesis takes it as it is
+                        model_input = self.tts.prepare(request.sample)
+                except (ValueError, AssertionError) as e:
+                    tracer.end('synth_queue', request.request_id)
+                    self._report_error(e)
+                    continue
+                self.q_synth.put(request._replace(model_input=model_input))
+        finally:
+            self.q_synth.put(self._stop)
+
+    def _synth_stage(self) -> None:
+        try:
+            while (request := self.q_synth.get()) is not self._stop:
+                if self._is_cut(request):
+                    self._drop(request)
+                    continue
+                sample, speaker, request_id, _, _, model_input = request
+                tracer.end('synth_queue', request_id)
+                if isinstance(self.tts, TTSPool) and not self.tts.config.streaming:
+                    # synthesized on a free replica, the writer waits for the futures in order
+                    self._enqueue_write(self.tts.submit(sample, speaker, request_id, model_input), request)
+                    continue
+
+                with tracing.request(request_id):
+                    if self.tts.config.streaming:
+                        for chunk in self._synthesize_stream(sample, speaker, model_input):
+                            if self._is_cut(request):
+                                break
+                            self._enqueue_write(chunk, request)
+                        continue
+
+                    audio = self._synthesize(sample, speaker, model_input)
+                if audio is not None:
+                    self._enqueue_write(audio, request)
+        finally:
+            self.q_write.put(self._stop)
+
+    def _enqueue_write(self, audio: 'Tensor | Future[Tensor]', request: _Request) -> None:
+        tracer.begin('write_queue', request.request_id)
+        self.q_write.put((audio, request))
+
+    def _write_stage(self) -> None:
+        while (item := self.q_write.get()) is not self._stop:
+            audio, request = item
+            if self._is_cut(request):
+                self._drop(item)
+                continue
+            if isinstance(audio, Future):
+                try:
+                    audio = audio.result()
+                except Exception as e:
+                    # a failed request or a lost replica, the next ones still get written
+                    self._report_error(e)
+                    continue
+            tracer.end('write_queue', request.request_id)
+            if request.priority >= PREEMPT and request.seq != self._preempted_seq:
+                # barge-in: the playback of the requests before it is cut
+                self._preempted_seq = request.seq
+                self.outputer.interrupt()
+            with tracing.request(request.request_id):
+                self._write(audio)
     pass
+
+
+def make_manager(
+    tts: TTS | TTSPool,
+    inputer: Reader,
+    outputer: Writer,
+    pipelined: bool = False,
+    queue_size: int = 4,
+    report_interval: float = 0.,
+) -> TTSManager:
+    if pipelined:
+        return PipelinedTTSManager(
+            tts, inputer, outputer, queue_size, report_interval
+        )
+    return TTSManager(tts, inputer, outputer)
@@ -0,0 +1,273 @@
+"""
+Live metrics of the running engine.
+
+Components register counters, gauges and histograms in the module registry,
+values are read while the engine runs: as Prometheus text from a localhost
+HTTP endpoint and as a JSON file rewritten periodically. Updates are a lock
+and an addition, cheap enough for every request.
+"""
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable
+
+
+Labels = tuple[tuple[str, str], ...]
+
+# seconds; real-time factors use the same scale
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)
+
+
+def _labels(labels: dict[str, str] | None) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: dict[str, str] | None = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic total. fn reads the value from elsewhere, e.g. a counter
+    shared with a worker process.
+    """
+    type = 'counter'
+
+    def __init__(self, fn: Callable[[], float] | None = None) -> None:
+        self._value = 0.
+        self._fn = fn
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        if self._fn is not None:
+            return float(self._fn())
+        return self._value
+    pass
+
+
+class Gauge:
+    """
+    Value which goes up and down, set directly or read from fn on collection.
+    """
+    type = 'gauge'
+
+    def __init__(self, fn: Callable[[], float] | None = None) -> None:
+        self._value = 0.
+        self._fn = fn
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        if self._fn is not None:
+            try:
+                return float(self._fn())
+            except (NotImplementedError, OSError, ValueError):
+                # e.g. Queue.qsize() on macOS, or a closed resource
+                return math.nan
+        return self._value
+    pass
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # the last slot counts values above every bucket
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        acc = 0
+        for c in counts[:-1]:
+            acc += c
+            cumulative.append(acc)
+        return {
+            'count': sum(counts),
+            'sum': total,
+            'buckets': dict(zip(self.buckets, cumulative)),
+        }
+    pass
+
+
+Metric = Counter | Gauge | Histogram
+
+
+class Registry:
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, tuple[str, dict[Labels, Metric]]] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._dump_stop: threading.Event | None = None
+        self._dump_thread: threading.Thread | None = None
+        self._dump_path: str | None = None
+
+    def counter(self, name: str, help: str = '', labels: dict[str, str] | None = None, fn: Callable[[], float] | None = None) -> Counter:
+        return self._get(name, help, labels, lambda: Counter(fn), fn is not None)  # type: ignore
+
+    def gauge(self, name: str, help: str = '', labels: dict[str, str] | None = None, fn: Callable[[], float] | None = None) -> Gauge:
+        return self._get(name, help, labels, lambda: Gauge(fn), fn is not None)  # type: ignore
+
+    def histogram(self, name: str, help: str = '', labels: dict[str, str] | None = None, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(name, help, labels, lambda: Histogram(buckets), False)  # type: ignore
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def prometheus(self) -> str:
+        """
+        Prometheus text exposition format 0.0.4.
+        """
+        lines = []
+        for name, (help, metric_type, series) in self._collect():
+            if help:
+                lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, metric in series:
+                if isinstance(metric, Histogram):
+                    snap = metric.snapshot()
+                    for bound, count in snap['buckets'].items():
+                        lines.append(f'{name}_bucket{_format_labels(labels, {"le": _format_value(bound)})} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(labels, {"le": "+Inf"})} {snap["count"]}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(snap["sum"])}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {snap["count"]}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(metric.value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Plain values for the JSON dump, series keyed by their label string.
+        """
+        result: dict[str, Any] = {'time': time.time()}
+        for name, (_, _, series) in self._collect():
+            values = {}
+            for labels, metric in series:
+                if isinstance(metric, Histogram):
+                    snap = metric.snapshot()
+                    snap['buckets'] = {str(k): v for k, v in snap['buckets'].items()}
+                    values[_format_labels(labels)] = snap
+                else:
+                    value = metric.value
+                    values[_format_labels(labels)] = None if math.isnan(value) else value
+            result[name] = values[''] if list(values) == [''] else values
+        return result
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> int:
+        """
+        Starts the /metrics endpoint in a daemon thread, returns the bound port
+        (port 0 picks a free one).
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        bound = self._server.server_address[1]
+        print(f'metrics: http://{host}:{bound}/metrics')
+        return bound
+
+    def dump_every(self, path: str, interval: float) -> None:
+        """
+        Rewrites path with snapshot() every interval seconds, and once more
+        on stop().
+        """
+        self._dump_path = path
+        self._dump_stop = threading.Event()
+
+        def loop(stop: threading.Event) -> None:
+            while not stop.wait(interval):
+                self.dump(path)
+
+        self._dump_thread = threading.Thread(target=loop, args=(self._dump_stop,), name='metrics-dump', daemon=True)
+        self._dump_thread.start()
+
+    def dump(self, path: str) -> None:
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        # readers never see a half written file
+        os.replace(tmp, p)
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()  # type: ignore
+            self.dump(self._dump_path)  # type: ignore
+            self._dump_stop = None
+
+    def _get(self, name: str, help: str, labels: dict[str, str] | None, factory: Callable[[], Metric], replace: bool) -> Metric:
+        key = _labels(labels)
+        with self._lock:
+            _, series = self._metrics.setdefault(name, (help, {}))
+            # collected metrics are rebound to the latest source, e.g. a new writer
+            if replace or key not in series:
+                series[key] = factory()
+            return series[key]
+
+    def _collect(self) -> list[tuple[str, tuple[str, str, list[tuple[Labels, Metric]]]]]:
+        with self._lock:
+            items = [(name, help, list(series.items())) for name, (help, series) in self._metrics.items()]
+        result = []
+        for name, help, series in items:
+            if series:
+                result.append((name, (help, series[0][1].type, series)))
+        return result
+    pass
+
+
+metrics = Registry()
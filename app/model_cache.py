@@ -0,0 +1,144 @@
+"""
+Frozen copy of the model package for fast startup.
+
+The first boot loads the torch.package as usual, restores the quantized
+accentor weights, freezes the TorchScript module for inference and saves it
+next to the package. Later boots load that file with torch.jit.load and
+only import the wrapper class from the package, skipping the unpickling of
+the package and the first-request unpacking. The cache key hashes the path,
+size and modification time of the package and the torch version, so a new
+model or torch build starts over without reading the package.
+"""
+from functools import partial
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable
+import torch
+
+from app import model_package
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+
+
+# TTSModelMultiAcc_v3 state besides the TorchScript module
+_META_ATTRS = ('symbols', 'speaker_to_id', 'symb_ascii_dict', 'emb_dim')
+
+
+def cache_key(model_path: str, device: torch.device) -> str:
+    stat = os.stat(model_path)
+    digest = hashlib.sha256()
+    digest.update(f'{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    digest.update(torch.__version__.encode())
+    # frozen constants live on the device they were saved from
+    digest.update(device.type.encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_paths(model_path: str, key: str) -> tuple[Path, Path]:
+    path = Path(model_path)
+    base = f'{path.stem}.{key}.frozen'
+    return path.with_name(f'{base}.pt'), path.with_name(f'{base}.json')
+
+
+def _load_module(device: torch.device, module_path: str) -> torch.jit.ScriptModule:
+    torch.set_grad_enabled(False)
+    model = torch.jit.load(module_path, map_location=device)
+    model.eval()
+    return model
+
+
+def _to(loaded: torch.device, device: torch.device) -> None:
+    if device != loaded:
+        raise Exception(f'model cache was loaded for {loaded}, not {device}')
+
+
+def _load_random_voice(voice_path: str | None = None) -> None:
+    raise Exception('random voices change speaker embeddings, which are frozen in the model cache; start without --model_cache')
+
+
+def load(model_path: str, device: torch.device) -> TTSModelMultiAcc_v3 | None:
+    """
+    The package's wrapper class around the frozen module, accentor already
+    unpacked, or None without a usable cache.
+    """
+    key = cache_key(model_path, device)
+    module_path, meta_path = cache_paths(model_path, key)
+    if not module_path.exists() or not meta_path.exists():
+        return None
+
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        cls = model_package.load_class(model_path, meta['module'], meta['class'], meta['packaged'])
+        model = model_package.construct(cls, str(module_path), meta, partial(_load_module, device))
+    except Exception as e:
+        print(f'model cache: {module_path.name} is unusable, loading the package ({e})')
+        return None
+    model.device = device
+    model.q_model_unpacked = True
+    # shadow the methods on the instance, the frozen module can't move or change speakers
+    model.to = partial(_to, device)  # type: ignore
+    model.load_random_voice = _load_random_voice  # type: ignore
+    print(f'model cache: loaded {module_path.name} ({meta["kind"]})')
+    return model
+
+
+def save(model_path: str, device: torch.device, model: TTSModelMultiAcc_v3, probe: Callable[[TTSModelMultiAcc_v3], Any]) -> Path | None:
+    """
+    Unpacks the accentor of model and saves the most optimized module
+    variant which still passes probe, called with the variant swapped in.
+    """
+    key = cache_key(model_path, device)
+    module_path, meta_path = cache_paths(model_path, key)
+
+    if not model.q_model_unpacked:
+        model.unpack_q_model()
+        model.q_model_unpacked = True
+
+    module = model.model
+    module.eval()
+    preserved = [a for a in ('set_accent',) if hasattr(module, a)]
+    variants: list[tuple[str, Callable[[], torch.jit.ScriptModule]]] = [
+        ('optimized', lambda: torch.jit.optimize_for_inference(torch.jit.freeze(module, preserved_attrs=preserved))),
+        ('frozen', lambda: torch.jit.freeze(module, preserved_attrs=preserved)),
+        ('unpacked', lambda: module),
+    ]
+
+    for kind, build in variants:
+        try:
+            candidate = build()
+            model.model = candidate
+            try:
+                probe(model)
+            finally:
+                model.model = module
+        except Exception as e:
+            print(f'model cache: {kind} variant failed ({type(e).__name__}: {e})')
+            continue
+
+        tmp = module_path.with_name(module_path.name + '.tmp')
+        torch.jit.save(candidate, str(tmp))
+        meta = {a: getattr(model, a, None) for a in _META_ATTRS}
+        meta.update(kind=kind, torch=torch.__version__, source=Path(model_path).name)
+        # the wrapper class is imported from the package on load
+        meta['module'], meta['class'], meta['packaged'] = model_package.class_location(model)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        # the module is published last, load() needs both files
+        os.replace(tmp, module_path)
+        _remove_stale(model_path, key)
+        print(f'model cache: saved {module_path.name} ({kind})')
+        return module_path
+
+    return None
+
+
+def _remove_stale(model_path: str, key: str) -> None:
+    path = Path(model_path)
+    for p in path.parent.glob(f'{path.stem}.*.frozen.*'):
+        if f'.{key}.' not in p.name:
+            try:
+                p.unlink()
+            except OSError:
+                pass
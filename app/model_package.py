@@ -0,0 +1,54 @@
+"""
+The Python class around the TorchScript module of the model package.
+
+The torch.package ships the module together with its wrapper class: SSML
+parsing, the text front-end, apply_tts. app.typing.multi_acc_v3_package is
+a copy of that class for type checking only. Code which needs a model
+object without unpickling the whole package, the model cache and the
+front-end workers, takes the class from the package file and builds the
+object with the class's own constructor.
+"""
+import importlib
+import re
+from typing import Any, Callable
+import torch
+
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+
+
+# modules imported from a package are prefixed with the importer's name
+_MANGLED = re.compile(r'^<torch_package_\d+>\.')
+
+
+def class_location(model: TTSModelMultiAcc_v3) -> tuple[str, str, bool]:
+    cls = type(model)
+    module, mangled = _MANGLED.subn('', cls.__module__)
+    return module, cls.__qualname__, bool(mangled)
+
+
+def load_class(model_path: str, module: str, name: str, packaged: bool) -> type:
+    if packaged:
+        # imports the class source only, the pickled model and its weights stay in the file
+        imported = torch.package.PackageImporter(model_path).import_module(module)
+    else:
+        imported = importlib.import_module(module)
+    return getattr(imported, name)
+
+
+def construct(
+    cls: type,
+    module_path: str | None,
+    meta: dict[str, Any],
+    init_jit_model: Callable[[str | None], Any],
+) -> TTSModelMultiAcc_v3:
+    """
+    An object of the wrapper class made by its own constructor, with the
+    TorchScript module loaded by init_jit_model instead.
+    """
+    model = cls.__new__(cls)
+    # shadows the method on the instance, the constructor calls it
+    model.init_jit_model = init_jit_model
+    cls.__init__(
+        model, module_path, meta['symbols'], meta['speaker_to_id'], meta['symb_ascii_dict'], meta.get('emb_dim') or 128
+    )
+    return model
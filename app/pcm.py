@@ -0,0 +1,81 @@
+import numpy
+from numpy import ndarray
+import torch
+from torch import Tensor
+
+
+PCM_SCALE = 32767
+PCM_MIN = -32768
+PCM_MAX = 32767
+
+
+def _as_array(audio: Tensor | ndarray) -> ndarray:
+    if isinstance(audio, Tensor):
+        # shares memory with cpu tensors
+        return audio.detach().cpu().numpy()
+    return audio
+
+
+def to_pcm16(audio: Tensor | ndarray, out: ndarray | None = None, scratch: ndarray | None = None, inplace: bool = False) -> ndarray:
+    """
+    Scales float audio in [-1, 1] to int16 PCM, clipping peaks instead of
+    letting them wrap around. int16 input is returned as is.
+
+    With inplace the input itself is scaled and clipped, otherwise a float32
+    scratch buffer is used. out and scratch are allocated if not given.
+    """
+    src = _as_array(audio)
+    if src.dtype == numpy.int16:
+        return src
+
+    n = len(src)
+    if inplace and src.dtype == numpy.float32 and src.flags.writeable:
+        work = src
+        numpy.multiply(src, PCM_SCALE, out=work)
+    else:
+        work = scratch[:n] if scratch is not None else numpy.empty(n, dtype=numpy.float32)
+        numpy.multiply(src, PCM_SCALE, out=work, casting='same_kind')
+    numpy.clip(work, PCM_MIN, PCM_MAX, out=work)
+
+    if out is None:
+        out = numpy.empty(n, dtype=numpy.int16)
+    else:
+        out = out[:n]
+    # truncates like astype, so in-range samples match the old conversion
+    numpy.copyto(out, work, casting='unsafe')
+    return out
+
+
+def from_pcm16(pcm: ndarray, out: ndarray | None = None) -> ndarray:
+    """
+    int16 PCM back to float32 audio, into out if given. The result never
+    shares memory with pcm, so cached PCM can be handed out this way.
+    """
+    if out is None:
+        out = numpy.empty(len(pcm), dtype=numpy.float32)
+    numpy.multiply(pcm, 1 / PCM_SCALE, out=out, casting='unsafe')
+    return out
+
+
+class PCMConverter:
+    """
+    to_pcm16 with output and scratch buffers kept between calls, they only
+    grow. The result is a view of the reusable buffer and is overwritten by
+    the next convert(), copy it if it has to outlive that.
+    """
+
+    def __init__(self, frames: int = 0) -> None:
+        self._out = numpy.empty(frames, dtype=numpy.int16)
+        self._scratch = numpy.empty(frames, dtype=numpy.float32)
+
+    def convert(self, audio: Tensor | ndarray, inplace: bool = False) -> ndarray:
+        if isinstance(audio, Tensor) and audio.dtype == torch.int16:
+            return audio.numpy()
+
+        n = len(audio)
+        if n > len(self._out):
+            self._out = numpy.empty(n, dtype=numpy.int16)
+            self._scratch = numpy.empty(n, dtype=numpy.float32)
+
+        return to_pcm16(audio, self._out, self._scratch, inplace)
+    pass
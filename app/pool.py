@@ -0,0 +1,257 @@
+"""
+Model replicas in worker processes.
+
+TTSPool keeps the front-end, caches and metrics of a TTS in this process
+and runs its model forward passes on N replica processes, each with its own
+share of the cores. Replicas run on the CPU only. With the fork start method
+the replicas are forked after the model is loaded, so they share its
+weights copy-on-write. Forking is only safe while this process hasn't run
+the model: OpenMP started before a fork hangs the child. Reduced precision
+and the model cache probe the model in configure(), so with them, and on
+Windows and macOS, replicas are spawned and every replica loads the model
+itself.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import copy
+import io
+import itertools
+import multiprocessing
+import os
+from queue import Empty
+import threading
+from typing import Any, Generator
+import numpy
+import torch
+from torch import Tensor
+
+from app import tracing
+from app.cache import AudioCache, DiskAudioCache
+from app.frontend import FrontendCache, FrontendPool
+from app.metrics import metrics
+from app.precision import Precision
+from app.tracing import tracer
+from app.tts import TTS, ModelInput, Speaker, TTSConfig
+
+
+class TTSPool:
+    """
+    Drop-in for TTS. do_tts and friends block like TTS does, submit returns
+    a future so callers can keep several requests in flight.
+    """
+
+    def __init__(
+        self,
+        tts: TTS,
+        replicas: int,
+        threads: int = 0,
+        reserved_cores: int = 2,
+        start_method: str | None = None,
+    ) -> None:
+        if tts.config.device.type != 'cpu':
+            raise Exception(f'tts pool replicas run on cpu, not {tts.config.device}')
+        self.tts = tts
+        self.config: TTSConfig = tts.config
+        # chunks of a long text go to all replicas at once
+        self.config.chunk_workers = max(self.config.chunk_workers, replicas)
+        self.replicas = replicas
+        # intra-op threads per replica, 0 splits the free cores between them
+        self.threads = threads or max(1, ((os.cpu_count() or 1) - reserved_cores) // replicas)
+        fork_safe = self.config.precision == Precision.FP32 and not self.config.model_cache
+        if start_method is None:
+            fork = fork_safe and 'fork' in multiprocessing.get_all_start_methods()
+            start_method = 'fork' if fork else 'spawn'
+        elif start_method == 'fork' and not fork_safe:
+            raise Exception('tts pool replicas can\'t be forked with reduced precision or the model cache, use spawn')
+        self._ctx = multiprocessing.get_context(start_method)
+
+        self._processes: list[Any] = []
+        self._requests: list[Any] = []
+        self._results: Any = None
+        self._jobs: dict[int, tuple[int, Future[tuple[Tensor, Tensor]]]] = {}
+        self._inflight = [0] * replicas
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count()
+        self._collector: threading.Thread | None = None
+        self._closed = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=replicas, thread_name_prefix='pool')
+        pass
+
+    @property
+    def audio_cache(self) -> AudioCache | None:
+        return self.tts.audio_cache
+
+    @property
+    def disk_cache(self) -> DiskAudioCache | None:
+        return self.tts.disk_cache
+
+    @property
+    def frontend_cache(self) -> FrontendCache | None:
+        return self.tts.frontend_cache
+
+    @property
+    def frontend_pool(self) -> FrontendPool | None:
+        return self.tts.frontend_pool
+
+    def configure(self) -> None:
+        if self._processes:
+            # managers configure what they are given, the pool may be configured already
+            return
+        # replicas warm up themselves, the model of this process only parses
+        warmup = self.config.warmup
+        self.config.warmup = False
+        self.tts.configure()
+        self.config.warmup = warmup
+
+        fork = self._ctx.get_start_method() == 'fork'
+        replica_config = copy(self.config)
+        # caches stay in this process
+        replica_config.audio_cache_bytes = 0
+        replica_config.audio_cache_dir = None
+        replica_config.threads = self.threads
+        replica_config.tuned_threads = False
+        # replicas get parsed input
+        replica_config.frontend_workers = 0
+
+        self._results = self._ctx.Queue()
+        for i in range(self.replicas):
+            requests = self._ctx.Queue()
+            p = self._ctx.Process(
+                target=_serve,
+                args=(self.tts if fork else None, type(self.tts), replica_config, requests, self._results),
+                name=f'tts-replica-{i}',
+                daemon=True,
+            )
+            p.start()
+            self._requests.append(requests)
+            self._processes.append(p)
+            metrics.gauge(
+                'pool_inflight', 'requests sent to a replica, not finished yet',
+                {'replica': str(i)}, fn=lambda i=i: self._inflight[i],
+            )
+
+        if not warmup or not self.config.warmup_background:
+            for _ in range(self.replicas):
+                self._results.get()
+        self._collector = threading.Thread(target=self._collect, name='pool-collector', daemon=True)
+        self._collector.start()
+
+        # shadows the method on the instance, every model call goes to a replica now
+        self.tts._forward_raw = self._dispatch  # type: ignore
+        print(f'tts pool: {self.replicas} replicas with {self.threads} threads each ({self._ctx.get_start_method()})')
+
+    def prepare(self, sample: str) -> ModelInput:
+        return self.tts.prepare(sample)
+
+    def do_tts(self, sample: str, speaker: Speaker | None = None, model_input: ModelInput | None = None) -> Tensor:
+        return self.tts.do_tts(sample, speaker, model_input)
+
+    def do_tts_stream(
+        self, sample: str, speaker: Speaker | None = None, model_input: ModelInput | None = None
+    ) -> Generator[Tensor, None, None]:
+        return self.tts.do_tts_stream(sample, speaker, model_input)
+
+    def submit(
+        self,
+        sample: str,
+        speaker: Speaker | None = None,
+        request_id: tracing.RequestId | None = None,
+        model_input: ModelInput | None = None,
+    ) -> 'Future[Tensor]':
+        def run() -> Tensor:
+            with tracing.request(request_id), tracer.span('synthesis'):
+                return self.tts.do_tts(sample, speaker, model_input)
+        return self._executor.submit(run)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        for requests in self._requests:
+            requests.put(None)
+        for p in self._processes:
+            p.join(5)
+            if p.is_alive():
+                p.terminate()
+        self._closed.set()
+        if self._collector is not None:
+            self._collector.join()
+        metrics.unregister('pool_inflight')
+        self.tts.close()
+
+    def _dispatch(self, model_input: ModelInput, speaker_ids: Tensor) -> tuple[Tensor, Tensor]:
+        if self._closed.is_set():
+            raise Exception('tts pool is closed')
+        future: Future[tuple[Tensor, Tensor]] = Future()
+        with self._lock:
+            # least loaded, the first one on a tie
+            replica = min(range(self.replicas), key=self._inflight.__getitem__)
+            self._inflight[replica] += 1
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = (replica, future)
+        # a random voice is generated by the model of this process, the replica gets a copy
+        random_emb = None
+        if self.tts.model.speaker_to_id.get('random') in speaker_ids.tolist():
+            random_emb = self.tts.model.random_emb
+        self._requests[replica].put((job_id, model_input, speaker_ids, random_emb))
+        return future.result()
+
+    def _collect(self) -> None:
+        while not self._closed.is_set():
+            try:
+                item = self._results.get(timeout=0.5)
+            except Empty:
+                self._fail_dead_replicas()
+                continue
+            if item is None:
+                # ready signal of a replica warming up in the background
+                continue
+            job_id, result, error = item
+            with self._lock:
+                replica, future = self._jobs.pop(job_id)
+                self._inflight[replica] -= 1
+            if error is not None:
+                future.set_exception(error)
+            else:
+                out, out_lens = result
+                future.set_result((torch.from_numpy(out), torch.from_numpy(out_lens)))
+
+    def _fail_dead_replicas(self) -> None:
+        with self._lock:
+            for job_id, (replica, future) in list(self._jobs.items()):
+                if not self._processes[replica].is_alive():
+                    del self._jobs[job_id]
+                    self._inflight[replica] -= 1
+                    future.set_exception(Exception(f'tts replica {replica} exited'))
+    pass
+
+
+def _serve(tts: TTS | None, tts_class: type[TTS], config: TTSConfig, requests: Any, results: Any) -> None:
+    torch.set_num_threads(config.threads)
+    if tts is None:
+        # warms up like any TTS, in the background after configure() with warmup_background
+        tts = tts_class(config)
+        tts.configure()
+    elif config.warmup and config.warmup_background:
+        tts._warmup_in_background()
+    elif config.warmup:
+        tts._warmup()
+    results.put(None)
+
+    while (item := requests.get()) is not None:
+        job_id, model_input, speaker_ids, random_emb = item
+        try:
+            if random_emb is not None:
+                _use_random_voice(tts, random_emb)
+            out, out_lens = tts._forward_raw(model_input, speaker_ids)
+            results.put((job_id, (numpy.ascontiguousarray(out.numpy()), out_lens.numpy()), None))
+        except Exception as e:
+            results.put((job_id, None, e))
+
+
+def _use_random_voice(tts: TTS, random_emb: Tensor) -> None:
+    model = tts.model
+    if model.random_emb is not None and torch.equal(model.random_emb, random_emb):
+        return
+    buffer = io.BytesIO()
+    torch.save(random_emb, buffer)
+    buffer.seek(0)
+    model.load_random_voice(buffer)
+    model.random_emb = random_emb
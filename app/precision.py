@@ -0,0 +1,110 @@
+"""
+Reduced-precision CPU inference.
+
+int8 quantizes the Linear layers of the TorchScript module dynamically:
+weights are stored as int8, activations are quantized per call. LSTMs are
+only quantized when the model is a plain nn.Module, graph mode quantization
+of scripted modules covers Linear only. bf16 runs the forward pass under
+autocast, which only pays off on CPUs with native bfloat16 (AVX512-BF16,
+AMX). Both fall back to fp32 when the model or the CPU can't run them.
+"""
+from contextlib import nullcontext
+from enum import Enum
+from typing import Any, Callable, ContextManager
+import warnings
+import torch
+
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+
+
+class Precision(str, Enum):
+    FP32 = 'fp32'
+    INT8 = 'int8'
+    BF16 = 'bf16'
+
+    @staticmethod
+    def from_string(precision: str) -> 'Precision':
+        for item in Precision:
+            if item.value == precision.lower():
+                return item
+        raise Exception(f"Unknown Precision {precision}")
+
+
+def bf16_supported() -> bool:
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def autocast(precision: Precision) -> ContextManager[Any]:
+    if precision == Precision.BF16:
+        return torch.autocast('cpu', dtype=torch.bfloat16)
+    return nullcontext()
+
+
+def quantize_int8(module: Any) -> Any:
+    with warnings.catch_warnings():
+        # torch.ao.quantization deprecation notices
+        warnings.simplefilter('ignore')
+        if not isinstance(module, torch.jit.ScriptModule):
+            return torch.ao.quantization.quantize_dynamic(
+                module, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}, dtype=torch.qint8
+            )
+
+        from torch.ao.quantization import convert_dynamic_jit, default_dynamic_qconfig, prepare_dynamic_jit
+
+        preserved = [a for a in ('set_accent',) if hasattr(module, a)]
+        prepared = prepare_dynamic_jit(module, {'': default_dynamic_qconfig})
+        return convert_dynamic_jit(prepared, preserved_attrs=preserved)
+
+
+def _quantized(module: Any) -> bool:
+    if isinstance(module, torch.jit.ScriptModule):
+        return 'quantized::' in str(module.inlined_graph)
+    return any('quantized' in type(m).__module__ for m in module.modules())
+
+
+def apply(
+    model: TTSModelMultiAcc_v3,
+    precision: Precision,
+    device: torch.device,
+    probe: Callable[[TTSModelMultiAcc_v3], Any],
+) -> Precision:
+    """
+    Converts model in place and returns the precision it runs with, fp32
+    if precision can't be used. probe is called under the new precision.
+    """
+    if precision == Precision.FP32:
+        return precision
+    if device.type != 'cpu':
+        print(f'precision {precision.value} is for CPU inference, running fp32')
+        return Precision.FP32
+
+    if precision == Precision.BF16:
+        if not bf16_supported():
+            print('this CPU has no native bfloat16, running fp32')
+            return Precision.FP32
+        try:
+            with autocast(precision):
+                probe(model)
+        except Exception as e:
+            print(f'bf16 autocast failed, running fp32 ({type(e).__name__}: {e})')
+            return Precision.FP32
+        return precision
+
+    if not model.q_model_unpacked:
+        model.unpack_q_model()
+        model.q_model_unpacked = True
+
+    module = model.model
+    try:
+        model.model = quantize_int8(module)
+        if not _quantized(model.model):
+            raise Exception('no Linear weights to quantize, a frozen module from --model_cache has none')
+        probe(model)
+    except Exception as e:
+        model.model = module
+        print(f'int8 quantization failed, running fp32 ({type(e).__name__}: {e})')
+        return Precision.FP32
+    return precision
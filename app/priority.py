@@ -0,0 +1,35 @@
+"""
+Request priorities for barge-in.
+
+A reader tags the request it reads with a priority in its own thread, like
+the request id (see tracing). A request of PREEMPT priority or above cuts
+the playback and drops the queued requests of lower priority, its own audio
+starts as soon as it is synthesized. Readers without priorities leave every
+request at Priority.normal.
+"""
+from enum import IntEnum
+import threading
+
+
+class Priority(IntEnum):
+    low = 0
+    normal = 1
+    high = 2
+
+    @staticmethod
+    def from_string(s: str) -> 'Priority':
+        return Priority[s.lower()]
+    pass
+
+
+PREEMPT = Priority.high
+
+_local = threading.local()
+
+
+def current() -> Priority:
+    return getattr(_local, 'priority', Priority.normal)
+
+
+def set_current(priority: Priority) -> None:
+    _local.priority = priority
@@ -0,0 +1,133 @@
+"""
+Opt-in torch.profiler around model inference, for attributing stalls.
+
+Every `every`-th forward pass is profiled; calls faster than min_ms are
+dropped, so profiling every call with a threshold keeps only the stalls.
+Each kept call is saved as a Chrome trace plus a text summary: operator
+table, CPU time per thread and time in TorchScript executor work.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Any, Generator
+import torch
+from torch.profiler import ProfilerActivity
+
+from app import tracing
+
+
+# events of the TorchScript profiling executor: guards, profiling nodes,
+# fusion groups and fallbacks which (re)compile on new input shapes
+JIT_EVENT = re.compile(
+    r'(?i)(profil|optimi[sz]|fuse|fusion|specializ|tensorexpr|bailout|fallback'
+    r'|prim::(TypeCheck|RequiresGradCheck|DifferentiableGraph|CudaFusionGroup))'
+)
+
+
+def jit_settings() -> dict[str, Any]:
+    """
+    TorchScript executor flags, see TTSConfig._jit_stuck_fix.
+    """
+    # the setters are the only accessors, they return the previous value
+    profiling_mode = torch._C._jit_set_profiling_mode(True)
+    torch._C._jit_set_profiling_mode(profiling_mode)
+    profiling_executor = torch._C._jit_set_profiling_executor(True)
+    torch._C._jit_set_profiling_executor(profiling_executor)
+    return {
+        'profiling_mode': profiling_mode,
+        'profiling_executor': profiling_executor,
+        'num_profiled_runs': torch._C._jit_get_num_profiled_runs(),
+        'graph_executor_optimize': torch._C._get_graph_executor_optimize(),
+    }
+
+
+class InferenceProfiler:
+
+    def __init__(self, profile_dir: str, every: int = 1, min_ms: float = 0., device: torch.device | None = None) -> None:
+        self.path = Path(profile_dir)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.every = max(every, 1)
+        self.min_ms = min_ms
+        self.activities = [ProfilerActivity.CPU]
+        if device is not None and device.type == 'cuda':
+            self.activities.append(ProfilerActivity.CUDA)
+        self.saved = 0
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, label: str = 'forward') -> Generator[None, None, None]:
+        with self._lock:
+            sampled = self._calls % self.every == 0
+            self._calls += 1
+        if not sampled:
+            yield
+            return
+
+        with torch.profiler.profile(activities=self.activities, record_shapes=True) as prof:
+            # profiler start and stop are not part of the call
+            start = time.perf_counter()
+            yield
+            wall_ms = (time.perf_counter() - start) * 1000
+
+        if wall_ms >= self.min_ms:
+            self._save(prof, label, wall_ms)
+
+    def _save(self, prof: torch.profiler.profile, label: str, wall_ms: float) -> None:
+        request_id = tracing.current_request_id()
+        name = f'{label}-{time.strftime("%Y%m%d-%H%M%S")}-{self.saved:04d}'
+        self.saved += 1
+
+        prof.export_chrome_trace(str(self.path / f'{name}.json'))
+        with open(self.path / f'{name}.txt', 'w', encoding='utf-8') as f:
+            f.write(self.summary(prof, wall_ms, request_id))
+        print(f'profiler: {label} took {wall_ms:.1f} ms, saved {self.path / name}.json')
+
+    @staticmethod
+    def summary(prof: torch.profiler.profile, wall_ms: float, request_id: tracing.RequestId | None = None) -> str:
+        events = prof.events()
+        # time covered by any operator on any thread
+        covered_us = 0
+        end = None
+        for e in sorted((e for e in events if e.cpu_parent is None), key=lambda e: e.time_range.start):
+            start = e.time_range.start if end is None else max(e.time_range.start, end)
+            if e.time_range.end > start:
+                covered_us += e.time_range.end - start
+            end = e.time_range.end if end is None else max(end, e.time_range.end)
+        top_level_ms = covered_us / 1000
+
+        threads: dict[int, list[float]] = {}
+        jit: dict[str, list[float]] = {}
+        for e in events:
+            row = threads.setdefault(e.thread, [0, 0.])
+            row[0] += 1
+            row[1] += e.self_cpu_time_total / 1000
+            if JIT_EVENT.search(e.name):
+                row = jit.setdefault(e.name, [0, 0.])
+                row[0] += 1
+                row[1] += e.self_cpu_time_total / 1000
+
+        lines = [
+            f'request: {request_id}',
+            f'wall: {wall_ms:.1f} ms',
+            f'operators: {top_level_ms:.1f} ms, outside operators: {wall_ms - top_level_ms:.1f} ms '
+            '(graph compilation, python, waiting)',
+            f'torch threads: intra-op={torch.get_num_threads()} inter-op={torch.get_num_interop_threads()}',
+            'jit: ' + ' '.join(f'{k}={v}' for k, v in jit_settings().items()),
+            '',
+            f'cpu threads used: {len(threads)}',
+        ]
+        for tid, (n, ms) in sorted(threads.items(), key=lambda t: -t[1][1]):
+            lines.append(f'  thread {tid}: {n} events, {ms:.1f} ms self cpu')
+
+        lines.append('')
+        lines.append(f'TorchScript executor events: {sum(ms for _, ms in jit.values()):.1f} ms self cpu')
+        for event_name, (n, ms) in sorted(jit.items(), key=lambda t: -t[1][1]):
+            lines.append(f'  {event_name}: {ms:.1f} ms (x{n})')
+
+        lines.append('')
+        lines.append(prof.key_averages().table(sort_by='self_cpu_time_total', row_limit=40))
+        return '\n'.join(lines) + '\n'
+    pass
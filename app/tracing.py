@@ -0,0 +1,208 @@
+"""
+Per-utterance stage timing.
+
+Every request gets an id where it enters (GUI proxy, command reader). The id
+of the request a thread is working on is kept thread-local, so readers,
+TTS and writers can record stages without passing it around. Timestamps are
+time.perf_counter_ns(), which is system wide on Windows and Linux, so events
+from the GUI and audio worker processes line up with the TTS process.
+"""
+from contextlib import contextmanager
+import itertools
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Generator, TypeAlias
+
+
+RequestId: TypeAlias = int
+# (phase, stage, request id, timestamp ns, end timestamp ns, pid, thread name)
+Event: TypeAlias = tuple[str, str, RequestId, int, int, int, str]
+
+_ids = itertools.count(1)
+_local = threading.local()
+
+
+def now() -> int:
+    return time.perf_counter_ns()
+
+
+def new_request_id() -> RequestId:
+    # unique between the GUI and TTS processes, non-zero for ring buffer tags
+    return (os.getpid() % 0xFFFF) << 32 | next(_ids)
+
+
+def current_request_id() -> RequestId | None:
+    return getattr(_local, 'request_id', None)
+
+
+def set_current_request_id(request_id: RequestId | None) -> None:
+    _local.request_id = request_id
+
+
+def event(phase: str, stage: str, request_id: RequestId | None, ts: int, end: int = 0) -> Event:
+    """
+    Raw event, for processes which hand their events to the tracer owner.
+    """
+    return (phase, stage, request_id, ts, end, os.getpid(), threading.current_thread().name)  # type: ignore
+
+
+@contextmanager
+def request(request_id: RequestId | None) -> Generator[None, None, None]:
+    previous = current_request_id()
+    set_current_request_id(request_id)
+    try:
+        yield
+    finally:
+        set_current_request_id(previous)
+
+
+class Tracer:
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._events: list[Event] = []
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def begin_request(self) -> RequestId:
+        """
+        New request entering this thread, becomes the current one.
+        """
+        request_id = new_request_id()
+        set_current_request_id(request_id)
+        self.instant('received', request_id)
+        return request_id
+
+    def instant(self, stage: str, request_id: RequestId | None = None, ts: int | None = None) -> None:
+        self._add('i', stage, request_id, ts or now(), 0)
+
+    def complete(self, stage: str, start: int, end: int | None = None, request_id: RequestId | None = None) -> None:
+        self._add('X', stage, request_id, start, end or now())
+
+    def begin(self, stage: str, request_id: RequestId | None = None, ts: int | None = None) -> None:
+        """
+        Start of a stage which ends in another thread or process, see end().
+        """
+        self._add('B', stage, request_id, ts or now(), 0)
+
+    def end(self, stage: str, request_id: RequestId | None = None, ts: int | None = None) -> None:
+        self._add('E', stage, request_id, ts or now(), 0)
+
+    @contextmanager
+    def span(self, stage: str) -> Generator[None, None, None]:
+        if not self.enabled:
+            yield
+            return
+        start = now()
+        try:
+            yield
+        finally:
+            self.complete(stage, start)
+
+    def add_events(self, events: list[Event]) -> None:
+        """
+        Events recorded by another process, e.g. an audio worker.
+        """
+        with self._lock:
+            self._events.extend(events)
+
+    def spans(self) -> list[dict[str, Any]]:
+        """
+        All stages as complete spans, begin/end pairs are matched by request
+        id and stage. One begin may have several ends, one per audio device.
+        """
+        with self._lock:
+            events = list(self._events)
+
+        begins: dict[tuple[str, RequestId | None], int] = {}
+        for phase, stage, rid, ts, _, _, _ in events:
+            if phase == 'B':
+                begins[(stage, rid)] = ts
+
+        spans = []
+        for phase, stage, rid, ts, end, pid, thread in events:
+            if phase == 'X':
+                spans.append(dict(stage=stage, rid=rid, start=ts, end=end, pid=pid, thread=thread))
+            elif phase == 'E' and (stage, rid) in begins:
+                spans.append(dict(stage=stage, rid=rid, start=begins[(stage, rid)], end=ts, pid=pid, thread=thread))
+            elif phase == 'i':
+                spans.append(dict(stage=stage, rid=rid, start=ts, end=None, pid=pid, thread=thread))
+        return spans
+
+    def percentiles(self, points: tuple[int, ...] = (50, 90, 99)) -> dict[str, dict[str, float]]:
+        durations: dict[str, list[float]] = {}
+        for s in self.spans():
+            if s['end'] is not None:
+                durations.setdefault(s['stage'], []).append((s['end'] - s['start']) / 1e6)
+
+        result = {}
+        for stage, values in durations.items():
+            values.sort()
+            row = {'n': len(values), 'max_ms': values[-1]}
+            for p in points:
+                row[f'p{p}_ms'] = values[min(len(values) - 1, len(values) * p // 100)]
+            result[stage] = row
+        return result
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """
+        Chrome trace event format, loads in chrome://tracing and Perfetto.
+        """
+        trace_events = []
+        threads: dict[tuple[int, str], int] = {}
+        for s in self.spans():
+            tid = threads.setdefault((s['pid'], s['thread']), len(threads) + 1)
+            event = {
+                'name': s['stage'],
+                'cat': 'tts',
+                'pid': s['pid'],
+                'tid': tid,
+                'ts': s['start'] / 1000,
+                'args': {'request_id': s['rid']},
+            }
+            if s['end'] is None:
+                event.update(ph='i', s='t')
+            else:
+                event.update(ph='X', dur=(s['end'] - s['start']) / 1000)
+            trace_events.append(event)
+
+        for (pid, thread), tid in threads.items():
+            trace_events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                'args': {'name': thread},
+            })
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export(self, trace_dir: str) -> None:
+        path = Path(trace_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+
+        with open(path / f'trace-{stamp}.json', 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+        percentiles = self.percentiles()
+        with open(path / f'stages-{stamp}.json', 'w', encoding='utf-8') as f:
+            json.dump(percentiles, f, indent=2)
+
+        print(f'trace saved to {path.resolve()}')
+        for stage, row in percentiles.items():
+            cells = ' '.join(f'{k}={v:.1f}' if k != 'n' else f'n={v}' for k, v in row.items())
+            print(f'  {stage:>14}: {cells}')
+
+    def _add(self, phase: str, stage: str, request_id: RequestId | None, ts: int, end: int) -> None:
+        if not self.enabled:
+            return
+        if request_id is None:
+            request_id = current_request_id()
+        with self._lock:
+            self._events.append(event(phase, stage, request_id, ts, end))
+    pass
+
+
+tracer = Tracer()
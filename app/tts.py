@@ -1,13 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
 import os
 from pathlib import Path
-from typing import TypeAlias
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Generator, NamedTuple, TypeAlias
+import numpy
 from torch import Tensor
 import torch
 from torch.package.package_importer import PackageImporter
 
+from app import chunking, dsp, model_cache, precision, tracing, tuning
+from app.cache import AudioCache, CacheKey, DiskAudioCache, make_key
+from app.dsp import DSPConfig
+from app.frontend import FrontendCache, FrontendPool, TextNormalizer
+from app.metrics import metrics
+from app.pcm import from_pcm16, to_pcm16
+from app.precision import Precision
+from app.profiling import InferenceProfiler
+from app.tracing import tracer
 from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
 
+if TYPE_CHECKING:
+    from app.warmup import WarmupConfig
+
 
 class Device(str, Enum):
     CPU = 'cpu'
@@ -51,8 +68,31 @@ class TTSConfig():
         models_path: str = '.',
         download_model_if_not_exists: bool = True,
         threads: int = 4,
+        interop_threads: int = 0,
+        tuned_threads: bool = False,
+        precision: Precision = Precision.FP32,
         url_base_models_download: str = 'https://models.silero.ai/models/tts/ru/{}',
         warmup: bool = True,
+        warmup_config: 'WarmupConfig | None' = None,
+        warmup_background: bool = False,
+        model_cache: bool = False,
+        trace_dir: str | None = None,
+        metrics_port: int = 0,
+        metrics_json: str | None = None,
+        metrics_interval: float = 10.,
+        profile_dir: str | None = None,
+        profile_every: int = 10,
+        profile_min_ms: float = 0.,
+        streaming: bool = False,
+        audio_cache_bytes: int = 0,
+        audio_cache_dir: str | None = None,
+        audio_cache_dir_bytes: int = 1024 * 1024 * 1024,
+        frontend_cache_size: int = 256,
+        frontend_workers: int = 0,
+        chunk_chars: int = 0,
+        chunk_workers: int = 2,
+        crossfade_ms: float = 10.,
+        dsp: DSPConfig | None = None,
         _jit_stuck_fix: bool = True,
     ) -> None:
         self.sample_rate = sample_rate
@@ -61,9 +101,38 @@ class TTSConfig():
         self.model_name = model_name
         self.models_path = models_path
         self.threads = threads
+        # 0 keeps the torch default
+        self.interop_threads = interop_threads
+        # thread counts saved by app.tuning in models_path for this host and model win over the two above
+        self.tuned_threads = tuned_threads
+        self.precision = precision
         self.url_base_models_download = url_base_models_download
         self.warmup = warmup
+        self.warmup_config = warmup_config
+        self.warmup_background = warmup_background
+        self.model_cache = model_cache
+        self.trace_dir = trace_dir
+        self.metrics_port = metrics_port
+        self.metrics_json = metrics_json
+        self.metrics_interval = metrics_interval
+        self.profile_dir = profile_dir
+        self.profile_every = profile_every
+        self.profile_min_ms = profile_min_ms
+        self.streaming = streaming
         self.download_model_if_not_exists = download_model_if_not_exists
+        self.audio_cache_bytes = audio_cache_bytes
+        self.audio_cache_dir = audio_cache_dir
+        self.audio_cache_dir_bytes = audio_cache_dir_bytes
+        self.frontend_cache_size = frontend_cache_size
+        # SSML parsing in this many worker processes, 0 parses in the inference process
+        self.frontend_workers = frontend_workers
+        # longer inputs are synthesized in chunks of this many characters, 0 disables it;
+        # the chunks only overlap on TTSPool replicas, on one model they add crossfades and no speed
+        self.chunk_chars = chunk_chars
+        self.chunk_workers = chunk_workers
+        self.crossfade_ms = crossfade_ms
+        # trim, fades and loudness of the output, see app.dsp, None leaves it as the model made it
+        self.dsp = dsp
         self._jit_stuck_fix = _jit_stuck_fix
 
         self._full_model_path = Path(
@@ -79,42 +148,433 @@ class TTSConfig():
     def get_model_path(self) -> str:
         return str(self._full_model_path)
 
+    def get_cache_namespace(self) -> str:
+        namespace = f'{self.model_name}:{self.sample_rate}'
+        # reduced precision changes the audio
+        if self.precision != Precision.FP32:
+            namespace += f':{self.precision.value}'
+        # the cache keeps processed audio
+        if self.dsp is not None:
+            namespace += f':{self.dsp.cache_tag()}'
+        return namespace
+
     pass
 
 
+class ModelInput(NamedTuple):
+    """
+    Front-end output of TTSModelMultiAcc_v3.prepare_tts_model_input,
+    one list item per sentence.
+    """
+    sentences: list[str]
+    clean_sentences: list[str]
+    break_lens: list[int | None]
+    prosody_rates: list[float]
+    prosody_pitches: list[float]
+
+    def sentence(self, i: int) -> 'ModelInput':
+        return ModelInput(*([field[i]] for field in self))
+
+
+_requests = metrics.counter('tts_requests_total', 'synthesized utterances, cache hits included')
+_synthesis_seconds = metrics.counter('tts_synthesis_seconds_total', 'time spent synthesizing cache misses')
+_audio_seconds = metrics.counter('tts_audio_seconds_total', 'duration of the synthesized audio')
+_rtf = metrics.histogram(
+    'tts_real_time_factor', 'synthesis time divided by audio duration, per request',
+    buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1., 2.),
+)
+_cache_hits = metrics.counter('tts_cache_lookups_total', 'memory and disk cache lookups', {'result': 'hit'})
+_cache_misses = metrics.counter('tts_cache_lookups_total', labels={'result': 'miss'})
+_frontend_chars = metrics.counter('tts_frontend_chars_total', 'characters through prepare_text_input')
+_frontend_seconds = metrics.counter('tts_frontend_seconds_total', 'time spent in prepare_text_input')
+metrics.gauge(
+    'tts_frontend_chars_per_second', 'prepare_text_input throughput since start',
+    fn=lambda: _frontend_chars.value / _frontend_seconds.value if _frontend_seconds.value else 0.,
+)
+
+
+def _count_frontend(chars: int, seconds: float) -> None:
+    _frontend_seconds.inc(seconds)
+    _frontend_chars.inc(chars)
+
+
 class TTS():
 
     def __init__(self, config: TTSConfig) -> None:
         self.config = config
+        self.audio_cache: AudioCache | None = None
+        if config.audio_cache_bytes > 0:
+            self.audio_cache = AudioCache(config.audio_cache_bytes)
+        self.disk_cache: DiskAudioCache | None = None
+        self.frontend_cache: FrontendCache | None = None
+        if config.frontend_cache_size > 0:
+            self.frontend_cache = FrontendCache(config.frontend_cache_size)
+        self.frontend_pool: FrontendPool | None = None
+        # one model call at a time, requests go before background warmup
+        self._model_lock = threading.Lock()
+        # TTSPool calls do_tts from several threads
+        self._cache_lock = threading.Lock()
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+        self._warmup_thread: threading.Thread | None = None
+        self._warmup_stop = threading.Event()
+        self.profiler: InferenceProfiler | None = None
+        self._chunk_executor: ThreadPoolExecutor | None = None
+        # what configure() could apply of config.precision
+        self.precision = Precision.FP32
+        if config.profile_dir:
+            self.profiler = InferenceProfiler(
+                config.profile_dir, config.profile_every, config.profile_min_ms, config.device
+            )
         pass
 
-    def do_tts(self, sample: str, speaker: Speaker | None = None) -> Tensor:
+    def do_tts(self, sample: str, speaker: Speaker | None = None, model_input: ModelInput | None = None) -> Tensor:
+        """
+        Returns float32 audio. With an audio cache it is the cached PCM
+        converted back, the same on a hit and a miss, and never the cached
+        array itself. model_input is sample already parsed by prepare, it
+        is synthesized instead of parsing sample again.
+        """
         speaker = speaker if speaker else self.config.default_speaker
-        audio: Tensor = self.model.apply_tts(
-            ssml_text=sample,
-            speaker=speaker,
-            sample_rate=self.config.sample_rate,
-        )
+
+        # random voices are regenerated on every load, never cache them
+        _requests.inc()
+        no_cache = self.audio_cache is None and self.disk_cache is None
+        if no_cache or speaker == Speaker.random:
+            start = time.perf_counter()
+            audio = self._apply_tts(sample, speaker, model_input)
+            self._observe_synthesis(time.perf_counter() - start, len(audio))
+            return self._postprocess(audio)
+
+        key = make_key(sample, speaker, self.config.sample_rate)
+        pcm = self._get_cached(key)
+        if pcm is None:
+            start = time.perf_counter()
+            audio = self._apply_tts(sample, speaker, model_input)
+            self._observe_synthesis(time.perf_counter() - start, len(audio))
+            return self._cache_audio(key, self._postprocess(audio))
+        tracer.instant('cache_hit')
+        return torch.from_numpy(from_pcm16(pcm))
+
+    def do_tts_stream(
+        self, sample: str, speaker: Speaker | None = None, model_input: ModelInput | None = None
+    ) -> Generator[Tensor, None, None]:
+        """
+        Synthesizes sample sentence by sentence and yields every chunk as soon
+        as it is ready. Breaks and prosody are kept per sentence, so the joined
+        chunks sound like do_tts output. SSML errors are raised before the
+        first chunk. model_input as in do_tts.
+        """
+        speaker = speaker if speaker else self.config.default_speaker
+        _requests.inc()
+
+        no_cache = self.audio_cache is None and self.disk_cache is None
+        cacheable = not no_cache and speaker != Speaker.random
+        key = make_key(sample, speaker, self.config.sample_rate)
+
+        if cacheable and (pcm := self._get_cached(key)) is not None:
+            yield torch.from_numpy(from_pcm16(pcm))
+            return
+
+        start = time.perf_counter()
+        # sentences over the chunk limit are streamed in pieces
+        if model_input is None:
+            model_input = self._prepare(sample)
+        model_input = self._split_long(model_input)
+        speaker_ids = self._speaker_ids(speaker)
+        # excludes the time the consumer holds the generator
+        elapsed = time.perf_counter() - start
+        frames = 0
+
+        chunks: list[numpy.ndarray] = []
+        for i in range(len(model_input.sentences)):
+            start = time.perf_counter()
+            audio = self._forward(model_input.sentence(i), speaker_ids)
+            elapsed += time.perf_counter() - start
+            frames += len(audio)
+            last = i == len(model_input.sentences) - 1
+            if last:
+                self._observe_synthesis(elapsed, frames)
+            # the utterance is trimmed and faded at its ends only
+            audio = self._postprocess(audio, trim_start=i == 0, trim_end=last)
+            if not cacheable:
+                yield audio
+                continue
+            pcm = to_pcm16(audio, inplace=True)
+            chunks.append(pcm)
+            yield torch.from_numpy(from_pcm16(pcm, out=audio.numpy()))
+
+        if cacheable:
+            self._put_cached(key, numpy.concatenate(chunks))
+
+    def close(self) -> None:
+        if self._warmup_thread is not None:
+            self._warmup_stop.set()
+            self._warmup_thread.join()
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+        if self._chunk_executor is not None:
+            self._chunk_executor.shutdown()
+        if self.frontend_pool is not None:
+            self.frontend_pool.close()
+
+    def _postprocess(self, audio: Tensor, trim_start: bool = True, trim_end: bool = True) -> Tensor:
+        if self.config.dsp is None:
+            return audio
+        with tracer.span('dsp'):
+            # in place, a view of the model output
+            return torch.from_numpy(dsp.process(audio, self.config.dsp, self.config.sample_rate, trim_start, trim_end))
+
+    def _get_cached(self, key: CacheKey) -> numpy.ndarray | None:
+        pcm = None
+        with self._cache_lock:
+            if self.audio_cache is not None:
+                pcm = self.audio_cache.get(key)
+            if pcm is None and self.disk_cache is not None:
+                pcm = self.disk_cache.get(key)
+                if pcm is not None and self.audio_cache is not None:
+                    self.audio_cache.put(key, pcm)
+        (_cache_misses if pcm is None else _cache_hits).inc()
+        return pcm
+
+    def _cache_audio(self, key: CacheKey, audio: Tensor) -> Tensor:
+        """
+        Caches audio as PCM and returns it as a cache hit would, converted in
+        place in the audio buffer.
+        """
+        pcm = to_pcm16(audio, inplace=True)
+        self._put_cached(key, pcm)
+        return torch.from_numpy(from_pcm16(pcm, out=audio.numpy()))
+
+    def _put_cached(self, key: CacheKey, pcm: numpy.ndarray) -> None:
+        with self._cache_lock:
+            if self.audio_cache is not None:
+                self.audio_cache.put(key, pcm)
+            if self.disk_cache is not None:
+                self.disk_cache.put(key, pcm)
+
+    def _observe_synthesis(self, seconds: float, frames: int) -> None:
+        duration = frames / self.config.sample_rate
+        _synthesis_seconds.inc(seconds)
+        _audio_seconds.inc(duration)
+        if duration:
+            _rtf.observe(seconds / duration)
+
+    def _apply_tts(self, sample: str, speaker: Speaker, model_input: ModelInput | None = None) -> Tensor:
+        """
+        TTSModelMultiAcc_v3.apply_tts for ssml input, split in traced stages.
+        """
+        speaker_ids = self._speaker_ids(speaker)
+        if model_input is None:
+            model_input = self._prepare(sample)
+        return self._synthesize_input(model_input, speaker_ids)
+
+    def prepare(self, sample: str) -> ModelInput:
+        """
+        Parses and normalizes the ssml sample, raises on invalid SSML like
+        do_tts. The result can be passed to do_tts.
+        """
+        return self._prepare(sample)
+
+    def _prepare(self, sample: str) -> ModelInput:
+        with tracer.span('ssml'):
+            # speaker ids are built separately, see _speaker_ids
+            prepared = self.model.prepare_tts_model_input(
+                sample, ssml=True, speaker_ids=[]
+            )
+        return ModelInput(*prepared[:5])
+
+    def _speaker_ids(self, speaker: Speaker) -> Tensor:
+        assert speaker in self.model.speakers, f"`speaker` should be in {', '.join(self.model.speakers)}"
+        return torch.LongTensor(self.model.get_speakers(speaker))
+
+    def _forward(self, model_input: ModelInput, speaker_ids: Tensor) -> Tensor:
+        """
+        The model call of TTSModelMultiAcc_v3.apply_tts on prepared input.
+        """
+        out, _ = self._forward_raw(model_input, speaker_ids)
+        audio: Tensor = out.to('cpu')[0]
         return audio
 
+    def _synthesize_input(self, model_input: ModelInput, speaker_ids: Tensor) -> Tensor:
+        if self._too_long(model_input):
+            return self._forward_chunked(model_input, speaker_ids)
+        return self._forward(model_input, speaker_ids)
+
+    def _too_long(self, model_input: ModelInput) -> bool:
+        return bool(self.config.chunk_chars) and sum(map(len, model_input.sentences)) > self.config.chunk_chars
+
+    def _split_long(self, model_input: ModelInput) -> ModelInput:
+        if not self.config.chunk_chars:
+            return model_input
+        return chunking.split_long(model_input, self.config.chunk_chars)
+
+    def _forward_chunked(self, model_input: ModelInput, speaker_ids: Tensor) -> Tensor:
+        """
+        Synthesizes a long input in chunks of config.chunk_chars, in parallel
+        when the model calls can overlap (TTSPool replicas), and crossfades
+        them together.
+        """
+        parts = chunking.chunks(self._split_long(model_input), self.config.chunk_chars)
+        assert self._chunk_executor is not None
+        request_id = tracing.current_request_id()
+
+        def forward(part: ModelInput) -> Tensor:
+            with tracing.request(request_id):
+                return self._forward(part, speaker_ids)
+
+        audios = list(self._chunk_executor.map(forward, parts))
+        crossfade = int(self.config.crossfade_ms * self.config.sample_rate / 1000)
+        return chunking.join(audios, crossfade)
+
+    def _forward_raw(self, model_input: ModelInput, speaker_ids: Tensor) -> tuple[Tensor, Tensor]:
+        with self._using_model(), tracer.span('inference'):
+            if self.profiler is None:
+                return self._forward_model(model_input, speaker_ids)
+            with self.profiler.profile():
+                return self._forward_model(model_input, speaker_ids)
+
+    @contextmanager
+    def _using_model(self) -> Generator[None, None, None]:
+        if threading.current_thread() is self._warmup_thread:
+            # background warmup steps aside while requests wait
+            while True:
+                while self._waiting:
+                    time.sleep(0.005)
+                self._model_lock.acquire()
+                if not self._waiting:
+                    break
+                self._model_lock.release()
+        else:
+            with self._waiting_lock:
+                self._waiting += 1
+            self._model_lock.acquire()
+            with self._waiting_lock:
+                self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._model_lock.release()
+
+    def _forward_model(self, model_input: ModelInput, speaker_ids: Tensor) -> tuple[Tensor, Tensor]:
+        model = self.model
+        if not model.q_model_unpacked:
+            model.unpack_q_model()
+            model.q_model_unpacked = True
+
+        with torch.no_grad(), precision.autocast(self.precision):
+            try:
+                model_kwargs = {
+                    'sentences': model_input.sentences,
+                    'clean_sentences': model_input.clean_sentences,
+                    'break_lens': model_input.break_lens,
+                    'prosody_rates': model_input.prosody_rates,
+                    'prosody_pitches': model_input.prosody_pitches,
+                    'speaker_ids': speaker_ids,
+                    'sr': self.config.sample_rate,
+                    'device': str(model.device),
+                }
+                if model.model.set_accent:
+                    model_kwargs['put_yo'] = True
+                    model_kwargs['put_accent'] = True
+
+                out, out_lens = model.model(**model_kwargs)
+            except RuntimeError:
+                raise Exception("Model couldn't generate your text, probably it's too long")
+        if out.dtype != torch.float32:
+            out = out.float()
+        return out, out_lens
+
     def configure(self) -> None:
         print('tts configure...')
+        start = time.perf_counter()
         if self.config._jit_stuck_fix:
             # fix torch stuck bug
             torch._C._jit_set_profiling_mode(False)
 
-        torch.set_num_threads(self.config.threads)
+        self._set_threads()
+        self._chunk_executor = ThreadPoolExecutor(self.config.chunk_workers, thread_name_prefix='chunk')
+
+        if self.config.audio_cache_dir:
+            self.disk_cache = DiskAudioCache(
+                self.config.audio_cache_dir,
+                self.config.audio_cache_dir_bytes,
+                self.config.get_cache_namespace(),
+            )
 
         if self.config.download_model_if_not_exists:
             self.config.download_model()
         self.model = self._load_model()
+        self.precision = precision.apply(self.model, self.config.precision, self.config.device, self._probe)
+        print(f'inference precision: {self.precision.value}')
+        # shadows the method on the instance, the model's ssml code calls it
+        self.model.prepare_text_input = TextNormalizer(  # type: ignore
+            self.model.symbols, self.model.symb_ascii_dict
+        )
+        self._instrument_frontend()
+        if self.config.frontend_workers > 0:
+            self.frontend_pool = FrontendPool(
+                self.model,
+                self.config.frontend_workers,
+                model_path=self.config.get_model_path(),
+                on_parsed=_count_frontend,
+            )
+            self.frontend_pool.start()
+            self.model.prepare_tts_model_input = self.frontend_pool.prepare_tts_model_input  # type: ignore
+        if self.frontend_cache is not None:
+            self.model.prepare_tts_model_input = self.frontend_cache.wrap(  # type: ignore
+                self.model.prepare_tts_model_input
+            )
+        self._register_metrics()
 
-        if self.config.warmup:
+        if self.config.warmup and not self.config.warmup_background:
             self._warmup()
-        
-        print('TTS ready')
+
+        elapsed = time.perf_counter() - start
+        metrics.gauge('tts_startup_seconds', 'configure() until ready, model load and warmup included').set(elapsed)
+        print(f'TTS ready in {elapsed:.2f} s')
+
+        if self.config.warmup and self.config.warmup_background:
+            self._warmup_in_background()
+
+    def _warmup_in_background(self) -> None:
+        self._warmup_thread = threading.Thread(target=self._warmup, name='warmup', daemon=True)
+        self._warmup_thread.start()
+
+    def _set_threads(self) -> None:
+        threads, interop = self.config.threads, self.config.interop_threads
+        if self.config.tuned_threads and (tuned := tuning.load_tuned(self.config)) is not None:
+            threads, interop = tuned
+            print(f'using tuned threads: intra-op {threads}, inter-op {interop}')
+
+        torch.set_num_threads(threads)
+        if interop and interop != torch.get_num_interop_threads():
+            try:
+                torch.set_num_interop_threads(interop)
+            except RuntimeError as e:
+                # only possible before the first inter-op parallel work
+                print(f'inter-op threads stay at {torch.get_num_interop_threads()} ({e})')
 
     def _load_model(self) -> TTSModelMultiAcc_v3:
+        model_path = self.config.get_model_path()
+        start = time.perf_counter()
+        if self.config.model_cache:
+            cached = model_cache.load(model_path, self.config.device)
+            if cached is not None:
+                print(f'model loaded in {time.perf_counter() - start:.2f} s')
+                return cached
+
+        model = self._load_package()
+        print(f'model loaded in {time.perf_counter() - start:.2f} s')
+
+        if self.config.model_cache:
+            model_cache.save(model_path, self.config.device, model, self._probe)
+        return model
+
+    def _probe(self, model: TTSModelMultiAcc_v3) -> None:
+        model.apply_tts('проверка', speaker=model.speakers[0], sample_rate=self.config.sample_rate)
+
+    def _load_package(self) -> TTSModelMultiAcc_v3:
         importer: PackageImporter = torch.package.PackageImporter(
             self.config.get_model_path()
         )
@@ -127,9 +587,42 @@ class TTS():
         model.to(self.config.device)
         return model
 
+    def _instrument_frontend(self) -> None:
+        """
+        Counts characters and time of prepare_text_input, patched on the
+        instance so the model's own calls go through it. The front-end pool
+        counts the calls in its workers.
+        """
+        prepare_text_input: Callable[[str], Any] = self.model.prepare_text_input
+
+        def counted(text: str) -> Any:
+            start = time.perf_counter()
+            result = prepare_text_input(text)
+            _count_frontend(len(text), time.perf_counter() - start)
+            return result
+
+        self.model.prepare_text_input = counted  # type: ignore
+
+    def _register_metrics(self) -> None:
+        if self.audio_cache is not None:
+            stats = self.audio_cache.stats
+            metrics.gauge('tts_audio_cache_hit_rate', 'memory cache hits / lookups', fn=lambda: stats.hit_rate)
+            metrics.gauge('tts_audio_cache_bytes', 'memory cache size', fn=lambda: stats.size_bytes)
+        if self.frontend_cache is not None:
+            frontend_stats = self.frontend_cache.stats
+            metrics.gauge('tts_frontend_cache_hit_rate', 'front-end cache hits / lookups', fn=lambda: frontend_stats.hit_rate)
+
     def _warmup(self) -> None:
+        from app.warmup import WarmupConfig, run_warmup
+
         print('model warmup...')
-        self.model.apply_tts('с', speaker=self.config.default_speaker)
-        pass
+        start = time.perf_counter()
+        report = run_warmup(
+            self._apply_tts,
+            self.config.warmup_config or WarmupConfig(),
+            should_stop=self._warmup_stop.is_set,
+        )
+        state = 'stopped' if report.stopped else 'stable' if report.stable else 'not stable'
+        print(f'warmup done in {time.perf_counter() - start:.2f} s, {len(report.passes)} passes, latency {state}')
 
     pass
@@ -0,0 +1,205 @@
+"""
+CPU thread tuning.
+
+Every (intra-op, inter-op) thread count pair is measured in its own process,
+torch fixes the inter-op pool at the first parallel op. Each process loads
+the model, warms up and times apply_tts on a reference corpus. The pair with
+the lowest p95 is saved per host, model, device and precision and picked up
+by later boots which ask for it, see TTSConfig.tuned_threads.
+"""
+from datetime import datetime
+import importlib
+import json
+import os
+from pathlib import Path
+import socket
+import subprocess
+import sys
+import time
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from app.tts import TTSConfig
+
+
+TUNING_FILE = 'thread_tuning.json'
+# device worker processes of the writers, each wants a core for itself
+AUDIO_WORKERS = {
+    'VBCableWriter': 2,
+    'GenericWriter': 1,
+    'SimpleWavWriter': 0,
+}
+
+
+def tuning_path(config: 'TTSConfig') -> Path:
+    return Path(config.models_path) / TUNING_FILE
+
+
+def tuning_key(config: 'TTSConfig') -> str:
+    # int8 and bf16 kernels scale with threads differently from fp32
+    return f'{socket.gethostname()}/{config.model_name}/{config.device.type}/{config.precision.value}'
+
+
+def load_tuned(config: 'TTSConfig') -> tuple[int, int] | None:
+    """
+    (intra-op, inter-op) threads saved for this host, model and precision,
+    None if never tuned or the host has a different core count now.
+    """
+    try:
+        with open(tuning_path(config), encoding='utf-8') as f:
+            entry = json.load(f).get(tuning_key(config))
+    except (OSError, ValueError):
+        return None
+    if not entry or entry.get('cpu_count') != os.cpu_count():
+        return None
+    return entry['intra'], entry['inter']
+
+
+def candidates(reserved_cores: int) -> list[tuple[int, int]]:
+    available = max(1, (os.cpu_count() or 1) - reserved_cores)
+    intra = sorted({1, 2, 4, 8, 16, 32, available} & set(range(1, available + 1)))
+    inter = [1, 2] if available > 1 else [1]
+    return [(i, j) for i in intra for j in inter if i + j - 1 <= available]
+
+
+def tune(
+    config: 'TTSConfig',
+    reserved_cores: int = 2,
+    repeats: int = 5,
+    tts_class: str = 'app.tts:TTS',
+    grid: list[tuple[int, int]] | None = None,
+    timeout: float = 600.,
+) -> tuple[int, int]:
+    """
+    Measures every thread count pair, saves and returns the fastest.
+    reserved_cores are kept free for the audio workers.
+    """
+    grid = grid or candidates(reserved_cores)
+    print(f'tuning threads on {os.cpu_count()} cores, {reserved_cores} reserved for audio: {len(grid)} configurations')
+
+    results = []
+    for intra, inter in grid:
+        params = {
+            'intra': intra,
+            'inter': inter,
+            'repeats': repeats,
+            'tts_class': tts_class,
+            'device': config.device.type,
+            'sample_rate': config.sample_rate,
+            'model_name': config.model_name,
+            'models_path': config.models_path,
+            'model_cache': config.model_cache,
+            'precision': config.precision.value,
+        }
+        try:
+            proc = subprocess.run(
+                [sys.executable, '-m', 'app.tuning', json.dumps(params)],
+                cwd=Path(__file__).resolve().parent.parent,
+                capture_output=True, text=True, timeout=timeout, check=True,
+            )
+            times = json.loads(proc.stdout.strip().splitlines()[-1])['times']
+        except (subprocess.SubprocessError, ValueError, IndexError, KeyError) as e:
+            print(f'  intra={intra} inter={inter}: failed ({type(e).__name__})')
+            continue
+
+        times.sort()
+        row = {
+            'intra': intra,
+            'inter': inter,
+            'p50_ms': times[len(times) // 2] * 1000,
+            'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+            'mean_ms': sum(times) / len(times) * 1000,
+        }
+        results.append(row)
+        print(f'  intra={intra} inter={inter}: p50={row["p50_ms"]:.1f} ms p95={row["p95_ms"]:.1f} ms')
+
+    if not results:
+        raise Exception('thread tuning failed for every configuration')
+
+    # fewer threads on a tie
+    best = min(results, key=lambda r: (round(r['p95_ms'], 1), r['intra'] + r['inter']))
+    _save(config, {
+        'intra': best['intra'],
+        'inter': best['inter'],
+        'p95_ms': best['p95_ms'],
+        'cpu_count': os.cpu_count(),
+        'reserved_cores': reserved_cores,
+        'torch': _torch_version(),
+        'tuned_at': datetime.now().isoformat(timespec='seconds'),
+        'results': results,
+    })
+    print(f'best: intra={best["intra"]} inter={best["inter"]}, saved to {tuning_path(config)}')
+    return best['intra'], best['inter']
+
+
+def _save(config: 'TTSConfig', entry: dict[str, Any]) -> None:
+    path = tuning_path(config)
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[tuning_key(config)] = entry
+
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _torch_version() -> str:
+    import torch
+    return torch.__version__
+
+
+def _measure(params: dict[str, Any]) -> list[float]:
+    """
+    Runs in the tuning subprocess.
+    """
+    import torch
+    # before anything starts the inter-op pool
+    torch.set_num_interop_threads(params['inter'])
+    torch.set_num_threads(params['intra'])
+
+    from app.precision import Precision
+    from app.tts import Device, Speaker, TTSConfig
+    from app.warmup import WarmupConfig, build_corpus
+
+    module, name = params['tts_class'].split(':')
+    tts_class = getattr(importlib.import_module(module), name)
+    config = TTSConfig(
+        Device.from_string(params['device']),
+        Speaker.baya,
+        sample_rate=params['sample_rate'],
+        model_name=params['model_name'],
+        models_path=params['models_path'],
+        download_model_if_not_exists=False,
+        threads=params['intra'],
+        warmup=False,
+        model_cache=params['model_cache'],
+        precision=Precision.from_string(params['precision']),
+        tuned_threads=False,
+        frontend_cache_size=0,
+    )
+    tts = tts_class(config)
+    tts.configure()
+
+    corpus = build_corpus(WarmupConfig(speakers=[Speaker.baya], prosodies=[]))
+    for _ in range(2):
+        for item in corpus:
+            tts._apply_tts(item.sample, item.speaker)
+
+    times = []
+    for _ in range(params['repeats']):
+        for item in corpus:
+            start = time.perf_counter()
+            tts._apply_tts(item.sample, item.speaker)
+            times.append(time.perf_counter() - start)
+    tts.close()
+    return times
+
+
+if __name__ == '__main__':
+    times = _measure(json.loads(sys.argv[1]))
+    # the parent reads the last line, model loading may print before it
+    print(json.dumps({'times': times}))
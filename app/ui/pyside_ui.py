@@ -1,6 +1,8 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from multiprocessing import Queue
+from queue import Empty, Full
+import threading
 import time
 
 from typing import Any, Callable, Generator, Optional
@@ -10,7 +12,11 @@ import sys
 import PySide6
 from PySide6.QtWidgets import *
 from torch import Tensor
+from app import priority, tracing
+from app.io.request_queue import GuiRequest, RequestQueue, ShedReason
+from app.priority import Priority
 from app.io.vb_cable_writer import VBCableWriter
+from app.tracing import tracer
 
 from app.tts import SampleRate, Speaker
 from app.io.io import Reader, Writer
@@ -25,7 +31,7 @@ class FormatText:
 
 
 class PysideReader(Reader):
-    def __init__(self, q_input: Queue[str]) -> None:
+    def __init__(self, q_input: RequestQueue | Queue[GuiRequest]) -> None:
         self.q_input = q_input
         self.default_speaker = Speaker.baya
         self.stop = False
@@ -42,7 +48,15 @@ class PysideReader(Reader):
         while True:
             if self.stop:
                 break
-            data = self.q_input.get()
+            request_id, put_at, data, request_priority = self.q_input.get()
+            if data is None:
+                # stop/skip
+                if self.on_interrupt is not None:
+                    self.on_interrupt()
+                continue
+            priority.set_current(Priority(request_priority))
+            tracing.set_current_request_id(request_id)
+            tracer.complete('gui_queue', put_at, request_id=request_id)
             sample = f"<speak>{data}</speak>"
             yield (sample, self.default_speaker)
 
@@ -300,14 +314,40 @@ class GlobalProsodyWidget(QtWidgets.QWidget):
 
 
 class OutputProxy:
-    def __init__(self, q_reader: Queue[str]) -> None:
+    def __init__(self, q_reader: Queue[GuiRequest]) -> None:
         self.q_reader = q_reader
         self.__global_prosody_text: FormatText = FormatText('')
+        # called with the reason and count of dropped requests
+        self.on_shed: Callable[[str, int], None] | None = None
 
-    def put(self, data: str, block: bool = True, timeout: float | None = None) -> None:
+    def put(self, data: str, block: bool = False, timeout: float | None = None) -> None:
         print('proxy put')
-        sample = self.__global_prosody_text.format(data)
-        self.q_reader.put(sample, block, timeout)
+        # !text cuts the playback and plays text right away
+        request_priority = Priority.high if data.startswith('!') else Priority.normal
+        sample = self.__global_prosody_text.format(data.removeprefix('!'))
+        try:
+            # the id and timestamp let the tts process trace the request from here
+            self.q_reader.put((tracing.new_request_id(), tracing.now(), sample, request_priority.value), block, timeout)
+        except Full:
+            # the tts process is that far behind, don't block the GUI
+            print('request queue is full, request dropped')
+            if self.on_shed is not None:
+                self.on_shed(ShedReason.overflow.value, 1)
+
+    def interrupt(self) -> None:
+        print('proxy interrupt')
+        request = (tracing.new_request_id(), tracing.now(), None, Priority.high.value)
+        try:
+            self.q_reader.put_nowait(request)
+        except Full:
+            # a stop shouldn't be dropped, it waits for a slot off the GUI thread
+            threading.Thread(target=self.__put_stop, args=(request,), daemon=True).start()
+
+    def __put_stop(self, request: GuiRequest) -> None:
+        try:
+            self.q_reader.put(request, True, 1.)
+        except Full:
+            print('request queue is full, stop dropped')
 
     def slot_prosody_changed(self, text: str) -> None:
         self.__global_prosody_text = FormatText(text)
@@ -316,12 +356,50 @@ class OutputProxy:
         self.__global_prosody_text = global_prosody
 
 
+class ShedStatusLabel(QtWidgets.QLabel):
+    """
+    Counts of requests dropped by the GUI and the request queue of the tts
+    process, polled from q_events.
+    """
+
+    def __init__(self, q_events: Queue[tuple[str, int]] | None = None, parent: QtWidgets.QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.q_events = q_events
+        self.shed: dict[str, int] = {}
+
+        if self.q_events is not None:
+            self.timer = QtCore.QTimer(self)
+            self.timer.timeout.connect(self.poll)
+            self.timer.start(250)
+
+    def add_shed(self, reason: str, n: int) -> None:
+        self.shed[reason] = self.shed.get(reason, 0) + n
+        self.setText('Skipped requests: ' + ', '.join(f'{count} {reason}' for reason, count in self.shed.items()))
+
+    def poll(self) -> None:
+        assert self.q_events is not None
+        while True:
+            try:
+                reason, n = self.q_events.get_nowait()
+            except Empty:
+                return
+            self.add_shed(reason, n)
+
+
 class TTSUI(QtWidgets.QWidget):
 
-    def __init__(self, q_reader: Queue[str]) -> None:
+    def __init__(
+        self,
+        q_reader: Queue[GuiRequest],
+        q_events: Queue[tuple[str, int]] | None = None,
+    ) -> None:
         super().__init__()
 
         self.output_proxy = OutputProxy(q_reader)
+        self.shed_status = ShedStatusLabel(q_events)
+        self.output_proxy.on_shed = self.shed_status.add_shed
+        self.stop_btn = QtWidgets.QPushButton(text='Stop')
+        self.stop_btn.clicked.connect(self.output_proxy.interrupt)
 
         macros_manager = MacrosDataManager(self.output_proxy)
 
@@ -355,6 +433,12 @@ class TTSUI(QtWidgets.QWidget):
             self.macros_list_view
         )
         layout.addLayout(self.output_layout)
+        layout.addWidget(
+            self.stop_btn
+        )
+        layout.addWidget(
+            self.shed_status
+        )
 
         self.setLayout(layout)
 
@@ -364,7 +448,7 @@ class TTSUI(QtWidgets.QWidget):
 if __name__ == "__main__":
     app = QtWidgets.QApplication([])
 
-    q_reader: Queue[str] = Queue()
+    q_reader: Queue[GuiRequest] = Queue()
 
     widget = TTSUI(q_reader)
     widget.resize(800, 600)
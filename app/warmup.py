@@ -0,0 +1,130 @@
+"""
+Model warmup over a corpus of speakers, input lengths and prosody.
+
+TorchScript specializes the graph on what it sees: every speaker, longer
+inputs and prosody changes pay for it on their first call. Warmup runs the
+corpus in passes until the per-item latency stops changing, so that cost is
+paid before a user waits for it.
+"""
+from dataclasses import dataclass, field
+import time
+from typing import Callable, NamedTuple
+
+from app.tts import Speaker
+
+
+BASE_TEXT = (
+    'Всем добрый вечер! Сегодня мы играем на новой карте, поэтому держитесь '
+    'вместе, не лезьте вперёд без разведки и следите за флангами. '
+)
+
+PROSODY_VARIANTS = {
+    'plain': '{}',
+    'fast': '<prosody rate="fast">{}</prosody>',
+    'slow_low': '<prosody rate="slow" pitch="low">{}</prosody>',
+    'high': '<prosody pitch="x-high">{}</prosody>',
+    'break': '{}<break time="300ms"/>{}',
+}
+
+
+@dataclass
+class WarmupConfig:
+    speakers: list[Speaker] = field(
+        default_factory=lambda: [s for s in Speaker if s != Speaker.random]
+    )
+    # characters of BASE_TEXT per item
+    lengths: list[int] = field(default_factory=lambda: [1, 40, 200])
+    # prosody variants are warmed up with the first speaker and the middle length
+    prosodies: list[str] = field(default_factory=lambda: list(PROSODY_VARIANTS))
+    # replace the generated texts, run with every speaker
+    texts: list[str] | None = None
+    max_passes: int = 4
+    # stop once a pass is within this fraction of the previous one
+    tolerance: float = 0.15
+    pass
+
+
+class WarmupItem(NamedTuple):
+    name: str
+    sample: str
+    speaker: Speaker
+
+
+def _text(length: int) -> str:
+    text = BASE_TEXT * (length // len(BASE_TEXT) + 1)
+    return text[:length].strip() or 'с'
+
+
+def build_corpus(config: WarmupConfig) -> list[WarmupItem]:
+    items: list[WarmupItem] = []
+    if config.texts is not None:
+        for speaker in config.speakers:
+            for i, text in enumerate(config.texts):
+                items.append(WarmupItem(f'{speaker.value}/text{i}', f'<speak>{text}</speak>', speaker))
+        return items
+
+    for speaker in config.speakers:
+        for length in config.lengths:
+            items.append(WarmupItem(f'{speaker.value}/{length}', f'<speak>{_text(length)}</speak>', speaker))
+
+    if config.speakers and config.lengths:
+        speaker = config.speakers[0]
+        length = sorted(config.lengths)[len(config.lengths) // 2]
+        half = _text(length // 2)
+        for name in config.prosodies:
+            if name == 'plain':
+                continue
+            body = PROSODY_VARIANTS[name].format(half, half)
+            items.append(WarmupItem(f'{speaker.value}/{name}', f'<speak>{body}</speak>', speaker))
+    return items
+
+
+class WarmupReport(NamedTuple):
+    # seconds per item, one dict per pass
+    passes: list[dict[str, float]]
+    stable: bool
+    stopped: bool
+
+
+def run_warmup(
+    synthesize: Callable[[str, Speaker], object],
+    config: WarmupConfig,
+    should_stop: Callable[[], bool] = lambda: False,
+) -> WarmupReport:
+    """
+    Runs the corpus in passes, timing every item, until the total of a pass
+    is within tolerance of the previous one, max_passes ran or should_stop.
+    Items which fail are reported and dropped.
+    """
+    corpus = build_corpus(config)
+    passes: list[dict[str, float]] = []
+
+    for n in range(config.max_passes):
+        timings: dict[str, float] = {}
+        for item in corpus:
+            if should_stop():
+                return WarmupReport(passes, False, True)
+            start = time.perf_counter()
+            try:
+                synthesize(item.sample, item.speaker)
+            except Exception as e:
+                print(f'warmup: {item.name} failed, skipped ({e})')
+                continue
+            timings[item.name] = time.perf_counter() - start
+        corpus = [item for item in corpus if item.name in timings]
+        passes.append(timings)
+
+        total = sum(timings.values())
+        slowest = max(timings, key=timings.__getitem__, default='-')
+        print(f'warmup pass {n + 1}: {len(timings)} items in {total * 1000:.0f} ms, slowest {slowest}')
+
+        if n and _stable(passes[-2], timings, config.tolerance):
+            return WarmupReport(passes, True, False)
+
+    return WarmupReport(passes, False, False)
+
+
+def _stable(previous: dict[str, float], current: dict[str, float], tolerance: float) -> bool:
+    before = sum(previous[name] for name in current)
+    after = sum(current.values())
+    return before > 0 and abs(after - before) / before <= tolerance
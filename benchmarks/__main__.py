@@ -0,0 +1,44 @@
+import argparse
+import json
+from benchmarks import fake_backend
+
+# before the writers get a chance to import the real one
+fake_backend.install()
+
+from benchmarks import suite  # noqa: E402
+
+
+def _parse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument(
+        '--out',
+        type=str,
+        default='bench_results.json',
+    )
+    parser.add_argument(
+        '--only',
+        type=str,
+        nargs='*',
+        choices=suite.names(),
+    )
+    parser.add_argument(
+        '--quick',
+        action='store_true',
+        help='few repeats, for smoke runs',
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse()
+    results = suite.run(args.only, args.quick)
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(results['results'], indent=2, ensure_ascii=False))
+    print(f'saved to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Time and allocations of tensor to int16 PCM conversion per call:
+
+    python -m benchmarks.bench_pcm
+
+tracemalloc only sees numpy allocations, the float temporary torch makes in
+the legacy path is not counted.
+"""
+import time
+import tracemalloc
+from typing import Callable
+import numpy
+import torch
+from torch import Tensor
+from app.pcm import PCMConverter, to_pcm16
+
+
+SAMPLE_RATE = 48000
+DURATIONS = [1, 5, 10, 20, 30]
+
+
+def _legacy(audio: Tensor) -> numpy.ndarray:
+    return (audio * 32767).numpy().astype(numpy.int16)
+
+
+def measure(convert: Callable[[Tensor], numpy.ndarray], audio: Tensor, repeats: int = 20) -> tuple[float, int]:
+    """
+    Returns the best time per call in seconds and the peak of numpy
+    allocations of one call in bytes.
+    """
+    convert(audio)
+
+    times = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        convert(audio)
+        times.append(time.perf_counter() - t)
+
+    tracemalloc.start()
+    convert(audio)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run(durations: list[int] = DURATIONS) -> list[dict]:
+    results = []
+    for seconds in durations:
+        audio = torch.rand(SAMPLE_RATE * seconds) * 2.2 - 1.1
+        converter = PCMConverter(SAMPLE_RATE * max(durations))
+        cases: dict[str, Callable[[Tensor], numpy.ndarray]] = {
+            'legacy': _legacy,
+            'to_pcm16': to_pcm16,
+            'PCMConverter': converter.convert,
+        }
+        for name, convert in cases.items():
+            t, peak = measure(convert, audio)
+            results.append({
+                'case': name,
+                'seconds': seconds,
+                'ms_per_call': t * 1000,
+                'alloc_bytes': peak,
+            })
+    return results
+
+
+def main() -> None:
+    for r in run():
+        print(
+            f"{r['case']:>12} {r['seconds']:>3d} s: {r['ms_per_call']:8.3f} ms, "
+            f"{r['alloc_bytes'] / 1024:10.1f} KiB allocated"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Latency, memory and audio deviation of every inference precision against
+fp32, on CPU. Every precision runs in its own process, so peak memory is
+its own:
+
+    python -m benchmarks.bench_precision --models_dir ./models/
+"""
+import argparse
+import io
+import json
+import math
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import torch
+from app.precision import Precision
+from app.tts import TTS, Device, Speaker, TTSConfig
+
+
+SAMPLES = [
+    '<speak>Привет, как дела?</speak>',
+    '<speak>Всем добрый вечер! Сегодня мы играем на новой карте, поэтому держитесь вместе.</speak>',
+    '<speak><prosody rate="fast">Иду на точку, прикройте меня.</prosody><break time="300ms"/>Враг справа, за домом.</speak>',
+    '<speak>' + ' '.join(['Отличная игра, спасибо всем, до встречи в следующий раз.'] * 4) + '</speak>',
+]
+
+
+def _parse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models_dir', type=str, default='./models/')
+    parser.add_argument('--model_name', type=str, default='v3_1_ru.pt')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--precisions', type=str, nargs='*', default=[p.value for p in Precision])
+    # set on the per-precision child processes
+    parser.add_argument('--child', type=str, default=None)
+    parser.add_argument('--audio_dir', type=str, default=None)
+    return parser.parse_args()
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _model_mb(tts: TTS) -> float:
+    buffer = io.BytesIO()
+    torch.jit.save(tts.model.model, buffer)
+    return len(buffer.getvalue()) / 1024 / 1024
+
+
+def _child(args: argparse.Namespace) -> None:
+    tts = TTS(TTSConfig(
+        device=Device.CPU,
+        default_speaker=Speaker.baya,
+        models_path=args.models_dir,
+        model_name=args.model_name,
+        download_model_if_not_exists=False,
+        threads=args.threads,
+        tuned_threads=False,
+        precision=Precision.from_string(args.child),
+        warmup=False,
+        frontend_cache_size=0,
+    ))
+    tts.configure()
+    for sample in SAMPLES:
+        tts.do_tts(sample)
+
+    times = []
+    audio_seconds = 0.
+    for _ in range(args.repeats):
+        for sample in SAMPLES:
+            t = time.perf_counter()
+            audio = tts.do_tts(sample)
+            times.append(time.perf_counter() - t)
+            audio_seconds += len(audio) / tts.config.sample_rate
+
+    for i, sample in enumerate(SAMPLES):
+        torch.save(tts.do_tts(sample), Path(args.audio_dir) / f'{args.child}-{i}.pt')
+
+    times.sort()
+    print(json.dumps({
+        'effective': tts.precision.value,
+        'p50_ms': times[len(times) // 2] * 1000,
+        'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        'rtf': sum(times) / audio_seconds,
+        'model_mb': _model_mb(tts),
+        'peak_rss_mb': _peak_rss_mb(),
+    }))
+
+
+def _deviation(reference: torch.Tensor, audio: torch.Tensor) -> dict[str, float]:
+    n = min(len(reference), len(audio))
+    ref, out = reference[:n], audio[:n]
+    noise = float(((ref - out) ** 2).sum())
+    return {
+        'length_delta': abs(len(reference) - len(audio)) / max(len(reference), 1),
+        'max_abs_diff': float((ref - out).abs().max()) if n else 0.,
+        'snr_db': 10 * math.log10(float((ref ** 2).sum()) / noise) if noise else math.inf,
+    }
+
+
+def main() -> None:
+    args = _parse()
+    if args.child:
+        _child(args)
+        return
+
+    precisions = [Precision.from_string(p) for p in args.precisions]
+    if Precision.FP32 not in precisions:
+        precisions.insert(0, Precision.FP32)
+
+    with tempfile.TemporaryDirectory() as audio_dir:
+        results = {}
+        for p in precisions:
+            proc = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_precision', '--child', p.value, '--audio_dir', audio_dir,
+                 '--models_dir', args.models_dir, '--model_name', args.model_name,
+                 '--repeats', str(args.repeats), '--threads', str(args.threads)],
+                capture_output=True, text=True, check=True,
+            )
+            results[p] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        for p, r in results.items():
+            deviations = [
+                _deviation(torch.load(Path(audio_dir) / f'fp32-{i}.pt'), torch.load(Path(audio_dir) / f'{p.value}-{i}.pt'))
+                for i in range(len(SAMPLES))
+            ]
+            rss = f'{r["peak_rss_mb"]:7.0f} MB rss' if r['peak_rss_mb'] is not None else ''
+            print(
+                f'{p.value:>5} (ran {r["effective"]}): p50 {r["p50_ms"]:7.1f} ms, p95 {r["p95_ms"]:7.1f} ms, '
+                f'RTF {r["rtf"]:.3f}, model {r["model_mb"]:6.1f} MB {rss}, '
+                f'SNR {min(d["snr_db"] for d in deviations):6.1f} dB, '
+                f'max diff {max(d["max_abs_diff"] for d in deviations):.4f}, '
+                f'length delta {max(d["length_delta"] for d in deviations):.1%}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+
+def install() -> bool:
+    """
+    Puts the fake pyaudio first on the import path of this process and of
+    spawned worker processes. Call before anything imports pyaudio, returns
+    False if the real one is already loaded.
+    """
+    path = os.path.dirname(os.path.abspath(__file__))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    env = os.environ.get('PYTHONPATH', '')
+    if path not in env.split(os.pathsep):
+        os.environ['PYTHONPATH'] = os.pathsep.join(p for p in (path, env) if p)
+
+    loaded = sys.modules.get('pyaudio')
+    return loaded is None or getattr(loaded, '__file__', '').startswith(path)
@@ -0,0 +1,124 @@
+"""
+Fake PyAudio: the subset of the API the writers use, backed by no device.
+
+Blocking writes and callback streams consume audio in real time scaled by
+FAKE_PYAUDIO_SPEED (0 consumes instantly), the number of bytes every
+stream consumed is kept in `played`.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable
+
+paInt16 = 8
+paContinue = 0
+paComplete = 1
+paAbort = 2
+paOutputUnderflow = 4
+paOutputOverflow = 8
+paOutputUnderflowed = -9980
+paFramesPerBufferUnspecified = 0
+
+DEVICES = [
+    {'index': 0, 'name': 'Speakers (Fake Audio)', 'maxOutputChannels': 2,
+     'defaultLowOutputLatency': 0.01, 'defaultHighOutputLatency': 0.1},
+    {'index': 1, 'name': 'CABLE Input (VB-Audio Virtual Cable)', 'maxOutputChannels': 8,
+     'defaultLowOutputLatency': 0.01, 'defaultHighOutputLatency': 0.1},
+]
+
+played: dict[Any, int] = {}
+
+
+def _speed() -> float:
+    return float(os.environ.get('FAKE_PYAUDIO_SPEED', '0'))
+
+
+def get_sample_size(format: int) -> int:
+    return 2
+
+
+class Stream:
+    def __init__(
+        self,
+        rate: int,
+        channels: int = 1,
+        format: int = paInt16,
+        output: bool = True,
+        frames_per_buffer: int = 1024,
+        output_device_index: int | None = None,
+        stream_callback: Callable | None = None,
+        start: bool = True,
+        **kwargs: Any,
+    ) -> None:
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer or 1024
+        self.device = output_device_index
+        self.callback = stream_callback
+        self._active = False
+        self._thread: threading.Thread | None = None
+        played.setdefault(self.device, 0)
+        if start:
+            self.start_stream()
+
+    def write(self, frames: Any, num_frames: int | None = None, exception_on_underflow: bool = False) -> None:
+        size = len(memoryview(frames).cast('B'))
+        played[self.device] += size
+        if _speed():
+            time.sleep(size / 2 / self.rate / _speed())
+
+    def get_write_available(self) -> int:
+        return self.frames_per_buffer
+
+    def get_output_latency(self) -> float:
+        return self.frames_per_buffer / self.rate
+
+    def start_stream(self) -> None:
+        self._active = True
+        if self.callback is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._pump, daemon=True)
+            self._thread.start()
+
+    def stop_stream(self) -> None:
+        self._active = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_active(self) -> bool:
+        return self._active
+
+    def close(self) -> None:
+        self.stop_stream()
+
+    def _pump(self) -> None:
+        period = self.frames_per_buffer / self.rate
+        while self._active:
+            data, flag = self.callback(None, self.frames_per_buffer, {}, 0)  # type: ignore
+            played[self.device] += len(data)
+            if flag != paContinue:
+                self._active = False
+                break
+            time.sleep(period / _speed() if _speed() else 0.0005)
+
+
+class PyAudio:
+    def open(self, *args: Any, **kwargs: Any) -> Stream:
+        return Stream(*args, **kwargs)
+
+    def get_host_api_info_by_index(self, index: int) -> dict:
+        return {'index': index, 'deviceCount': len(DEVICES)}
+
+    def get_device_info_by_host_api_device_index(self, host_api: int, index: int) -> dict:
+        return DEVICES[index]
+
+    def get_device_info_by_index(self, index: int) -> dict:
+        return DEVICES[index]
+
+    def get_default_output_device_info(self) -> dict:
+        return DEVICES[0]
+
+    def get_sample_size(self, format: int) -> int:
+        return 2
+
+    def terminate(self) -> None:
+        pass
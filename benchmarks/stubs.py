@@ -0,0 +1,103 @@
+"""
+Deterministic stand-ins for the TorchScript model, so the whole pipeline
+runs on a bare CPU box without the downloaded package.
+"""
+import math
+import time
+from typing import Any
+import torch
+from torch import Tensor
+from app.tts import TTS, TTSConfig
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+
+
+RU_LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+LATIN = 'abvgdeejziiklmnoprstufhccss_y_eua'
+# mirrors the layout of the silero symbol set: 3 service symbols first
+SYMBOLS = '_~#' + RU_LETTERS + " !'(),.:;?–-…+"
+SYMB_ASCII_DICT = {r: l for r, l in zip(RU_LETTERS, LATIN)}
+SPEAKER_TO_ID = {
+    'aidar': 0,
+    'baya': 1,
+    'kseniya': 2,
+    'xenia': 3,
+    'eugene': 4,
+    'random': 5,
+}
+
+
+class StubJitModel:
+    """
+    Callable with the signature of the scripted forward. Audio length follows
+    the text length, rate and break lengths, samples are a speaker and pitch
+    dependent tone. latency_per_char emulates inference time with a sleep,
+    which like torch ops releases the GIL.
+    """
+
+    set_accent = False
+    ms_per_char = 60.
+
+    def __init__(self, latency_per_char: float = 0.) -> None:
+        self.latency_per_char = latency_per_char
+        self.tts_model = torch.nn.Identity()
+        self.calls = 0
+
+    def __call__(self, **kwargs: Any) -> tuple[Tensor, Tensor]:
+        self.calls += 1
+        sr: int = kwargs['sr']
+        speaker_id = int(kwargs['speaker_ids'][0])
+
+        pieces = []
+        chars = 0
+        for clean, break_len, rate, pitch in zip(
+            kwargs['clean_sentences'],
+            kwargs['break_lens'],
+            kwargs['prosody_rates'],
+            kwargs['prosody_pitches'],
+        ):
+            chars += len(clean)
+            n = int(len(clean) * self.ms_per_char / max(rate, 0.1) * sr / 1000)
+            freq = 110. * (1 + speaker_id / 4) * (pitch or 1.)
+            t = torch.arange(n, dtype=torch.float32) / sr
+            pieces.append(0.5 * torch.sin(2 * math.pi * freq * t))
+            if break_len:
+                pieces.append(torch.zeros(int(break_len * 12.5 * sr / 1000)))
+
+        if self.latency_per_char:
+            time.sleep(chars * self.latency_per_char)
+
+        audio = torch.cat(pieces) if pieces else torch.zeros(1)
+        return audio.unsqueeze(0), torch.tensor([len(audio)])
+
+
+class _StubModel(TTSModelMultiAcc_v3):
+    def init_jit_model(self, model_path: str) -> StubJitModel:  # type: ignore
+        return StubJitModel()
+
+
+def make_stub_model(latency_per_char: float = 0.) -> TTSModelMultiAcc_v3:
+    model = _StubModel(
+        model_path=None,
+        symbols=SYMBOLS,
+        speaker_to_id=SPEAKER_TO_ID,
+        symb_ascii_dict=SYMB_ASCII_DICT,
+    )
+    model.model.latency_per_char = latency_per_char
+    return model
+
+
+class StubTTS(TTS):
+    """
+    TTS running on the stub model, nothing is downloaded or loaded from disk.
+    """
+
+    def __init__(self, config: TTSConfig, latency_per_char: float = 0.) -> None:
+        config.download_model_if_not_exists = False
+        super().__init__(config)
+        self.latency_per_char = latency_per_char
+
+    def _load_model(self) -> TTSModelMultiAcc_v3:
+        model = make_stub_model(self.latency_per_char)
+        model.to(self.config.device)
+        return model
+    pass
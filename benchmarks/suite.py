@@ -0,0 +1,324 @@
+"""
+Headless benchmarks of the tts pipeline: stub model instead of the
+TorchScript package, fake PyAudio instead of the devices.
+"""
+import builtins
+import contextlib
+import io
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Generator, TypeAlias
+import torch
+from torch import Tensor
+from app.io.io import Reader, Writer
+from app.tts import Device, SampleRate, Speaker, TTSConfig
+from benchmarks import fake_backend
+from benchmarks.stubs import StubTTS, make_stub_model
+
+
+Bench: TypeAlias = Callable[[bool], dict[str, Any]]
+
+
+_benchmarks: dict[str, Bench] = {}
+
+
+def bench(func: Bench) -> Bench:
+    """
+    bench decorator
+    """
+    _benchmarks[func.__name__] = func
+    return func
+
+
+SAMPLE_RATE = 48000
+
+SHORT_TEXT = 'Привет, как дела?'
+MEDIUM_TEXT = (
+    'Всем добрый вечер! Сегодня мы играем на новой карте, '
+    'поэтому держитесь вместе и не лезьте вперёд без разведки.'
+)
+LONG_TEXT = ' '.join([MEDIUM_TEXT] * 8)
+PARAGRAPHS_TEXT = '\n\n'.join(
+    f'Глава {i} — {LONG_TEXT}\t«Конец‑главы»  ' for i in range(20)
+)
+
+SSML_SAMPLES = {
+    'plain': f'<speak>{MEDIUM_TEXT}</speak>',
+    'prosody': f'<speak><prosody rate="fast">{MEDIUM_TEXT}</prosody></speak>',
+    'structured': (
+        '<speak><p><s>Внимание всем.</s><s>Идём на точку Б.</s></p>'
+        '<break time="500ms"/><prosody pitch="high" rate="slow">'
+        f'{MEDIUM_TEXT}</prosody><p>{SHORT_TEXT}</p></speak>'
+    ),
+}
+
+
+def stats(times: list[float]) -> dict[str, float]:
+    ordered = sorted(times)
+    return {
+        'n': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'min_ms': ordered[0] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def timeit(fn: Callable[[], Any], repeats: int, warmup: int = 1) -> dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return stats(times)
+
+
+@bench
+def prepare_text_input(quick: bool) -> dict[str, Any]:
+    model = make_stub_model()
+    repeats = 20 if quick else 500
+    return {
+        name: timeit(lambda: model.prepare_text_input(text), repeats)
+        for name, text in (('short', SHORT_TEXT), ('medium', MEDIUM_TEXT), ('long', LONG_TEXT))
+    }
+
+
+@bench
+def text_normalization(quick: bool) -> dict[str, Any]:
+    from app.frontend import TextNormalizer
+
+    model = make_stub_model()
+    normalizer = TextNormalizer(model.symbols, model.symb_ascii_dict)
+    repeats = 5 if quick else 100
+    results = {}
+    for name, text in (('medium', MEDIUM_TEXT), ('long', LONG_TEXT), ('paragraphs', PARAGRAPHS_TEXT)):
+        assert normalizer(text) == model.prepare_text_input(text)
+        reference = timeit(lambda: model.prepare_text_input(text), repeats)
+        compiled = timeit(lambda: normalizer(text), repeats)
+        results[name] = {
+            'chars': len(text),
+            'reference': reference,
+            'compiled': compiled,
+            'speedup': reference['p50_ms'] / compiled['p50_ms'],
+        }
+    return results
+
+
+@bench
+def process_ssml(quick: bool) -> dict[str, Any]:
+    from app.frontend import FrontendCache
+
+    model = make_stub_model()
+    cached = FrontendCache(len(SSML_SAMPLES)).wrap(model.prepare_tts_model_input)
+    repeats = 20 if quick else 500
+    results = {}
+    for name, sample in SSML_SAMPLES.items():
+        results[name] = timeit(lambda: model.process_ssml(sample), repeats)
+        # repeated macro text, the whole front-end served from the cache
+        results[f'{name}_cached'] = timeit(lambda: cached(sample, ssml=True, speaker_ids=[1]), repeats)
+    return results
+
+
+@bench
+def command_parsing(quick: bool) -> dict[str, Any]:
+    from app.io.command_polling_reader import PollingCommandReader
+
+    lines = ['g rate:fast pitch:low', MEDIUM_TEXT, 'speaker xenia', SHORT_TEXT] * (5 if quick else 250)
+    results = {}
+    for name, commands in (('text_only', [MEDIUM_TEXT] * len(lines)), ('mixed', lines)):
+        feed = iter(commands + ['exit'])
+        reader = PollingCommandReader()
+        original_input = builtins.input
+        builtins.input = lambda *args: next(feed)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                t = time.perf_counter()
+                produced = sum(1 for _ in reader.read())
+                elapsed = time.perf_counter() - t
+        finally:
+            builtins.input = original_input
+        results[name] = {
+            'lines': len(commands),
+            'samples': produced,
+            'us_per_line': elapsed / len(commands) * 1e6,
+        }
+    return results
+
+
+@bench
+def pcm_conversion(quick: bool) -> dict[str, Any]:
+    from benchmarks.bench_pcm import run
+
+    durations = [1, 5] if quick else [1, 5, 10, 20, 30]
+    return {f"{r['case']}_{r['seconds']}s": r for r in run(durations)}
+
+
+@bench
+def output_dsp(quick: bool) -> dict[str, Any]:
+    import numpy
+    from app import dsp
+
+    config = dsp.DSPConfig()
+    repeats = 5 if quick else 50
+    results = {}
+    for seconds in ([1, 5] if quick else [1, 5, 10, 30]):
+        # speech-like bursts between pauses, silence at both ends
+        n = SAMPLE_RATE * seconds
+        t = numpy.arange(n, dtype=numpy.float32) / SAMPLE_RATE
+        envelope = (numpy.sin(2 * numpy.pi * 2 * t) > -0.3).astype(numpy.float32)
+        source = numpy.random.default_rng(0).standard_normal(n).astype(numpy.float32) * 0.1 * envelope
+        pad = SAMPLE_RATE // 4
+        source[:pad] = 0
+        source[-pad:] = 0
+        # in place, every run starts from a fresh copy
+        audio = numpy.empty_like(source)
+        copy = timeit(lambda: numpy.copyto(audio, source), repeats)
+        result = timeit(lambda: (numpy.copyto(audio, source), dsp.process(audio, config, SAMPLE_RATE)), repeats)
+        result['ms_per_audio_second'] = max(0., result['p50_ms'] - copy['p50_ms']) / seconds
+        results[f'{seconds}s'] = result
+    return results
+
+
+@bench
+def writer_ipc(quick: bool) -> dict[str, Any]:
+    if not fake_backend.install():
+        return {'skipped': 'real pyaudio is already loaded'}
+
+    from app.io.generic_writer import GenericWriter
+    from app.io.vb_cable_writer import VBCableWriter
+
+    clips = 3 if quick else 30
+    audio = torch.rand(SAMPLE_RATE * 5) - 0.5
+    results = {}
+    for name, writer_cls, drained in (
+        ('VBCableWriter', VBCableWriter, lambda w: w.ring.fill_level() == 0),
+        ('GenericWriter', GenericWriter, lambda w: not w.player.is_playing()),
+    ):
+        writer = writer_cls()
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            writer.configure(SAMPLE_RATE)
+            startup = time.perf_counter() - t
+
+        write_times = []
+        t = time.perf_counter()
+        for _ in range(clips):
+            tw = time.perf_counter()
+            writer.write(audio)
+            write_times.append(time.perf_counter() - tw)
+        while not drained(writer):
+            time.sleep(0.001)
+        elapsed = time.perf_counter() - t
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            writer.close()
+
+        results[name] = {
+            'startup_ms': startup * 1000,
+            'write': stats(write_times),
+            'audio_seconds_per_second': clips * 5 / elapsed,
+            'mb_per_second': clips * audio.numel() * 2 / elapsed / 1e6,
+        }
+    return results
+
+
+class _ListReader(Reader):
+    def __init__(self, samples: list[str]) -> None:
+        self.samples = samples
+        self.read_times: list[float] = []
+
+    def configure(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def read(self) -> Generator[tuple[str, Speaker | None], None, None]:
+        for s in self.samples:
+            self.read_times.append(time.perf_counter())
+            yield s, Speaker.baya
+
+
+class _NullWriter(Writer):
+    def __init__(self) -> None:
+        self.write_times: list[float] = []
+
+    def configure(self, sample_rate: SampleRate) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def write(self, audio: Tensor) -> Any:
+        self.write_times.append(time.perf_counter())
+
+
+@bench
+def end_to_end(quick: bool) -> dict[str, Any]:
+    from app.manager import make_manager
+
+    samples = list(SSML_SAMPLES.values()) * (2 if quick else 20)
+    results = {}
+    for pipelined in (False, True):
+        tts = StubTTS(
+            TTSConfig(Device.CPU, Speaker.baya, warmup=False),
+            latency_per_char=0.0002,
+        )
+        reader, writer = _ListReader(samples), _NullWriter()
+        manager = make_manager(tts, reader, writer, pipelined=pipelined)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            manager.start()
+            elapsed = time.perf_counter() - t
+
+        latencies = [w - r for r, w in zip(reader.read_times, writer.write_times)]
+        results['pipelined' if pipelined else 'serial'] = {
+            'utterances': len(writer.write_times),
+            'utterances_per_second': len(samples) / elapsed,
+            'latency': stats(latencies),
+        }
+    return results
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def names() -> list[str]:
+    return list(_benchmarks)
+
+
+def run(only: list[str] | None = None, quick: bool = False) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for name, func in _benchmarks.items():
+        if only and name not in only:
+            continue
+        results[name] = func(quick)
+
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': _git_revision(),
+            'python': sys.version.split()[0],
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'torch_threads': torch.get_num_threads(),
+            'quick': quick,
+        },
+        'results': results,
+    }
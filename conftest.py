@@ -0,0 +1,6 @@
+try:
+    import pyaudio  # noqa: F401
+except ImportError:
+    # headless boxes without PortAudio run the writers on the fake backend
+    from benchmarks import fake_backend
+    fake_backend.install()
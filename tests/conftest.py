@@ -0,0 +1,181 @@
+"""
+Helpers shared by the test modules, handed out as fixtures.
+"""
+import time
+from typing import Any, Callable, Generator, List, Optional, Tuple
+import pytest
+import torch
+from torch import Tensor
+from app import priority
+from app.io.io import Reader, Writer
+from app.priority import Priority
+from app.tracing import tracer
+from app.tts import Device, SampleRate, Speaker, TTSConfig
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+from benchmarks.stubs import SPEAKER_TO_ID, SYMB_ASCII_DICT, SYMBOLS, StubTTS
+
+
+SAMPLE = (
+    '<speak>Привет, мир. <break time="300ms"/> Как дела? '
+    '<prosody rate="fast">Хорошо.</prosody></speak>'
+)
+
+
+class ListReader(Reader):
+    """
+    Reads samples like the real readers: every sample is a new traced
+    request, '!' marks a high priority one and None is a stop/skip.
+    """
+
+    def __init__(self, samples: list[str | None]) -> None:
+        self.samples = samples
+
+    def configure(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def read(self) -> Generator[tuple[str, Speaker | None], None, None]:
+        for s in self.samples:
+            if s is None:
+                assert self.on_interrupt is not None
+                self.on_interrupt()
+                continue
+            tracer.begin_request()
+            priority.set_current(Priority.high if s.startswith('!') else Priority.normal)
+            yield s.removeprefix('!'), Speaker.baya
+
+
+class ListWriter(Writer):
+    """
+    Keeps the written audio, events has it in order with 'interrupt' marks.
+    """
+
+    def __init__(self, delay: float = 0.) -> None:
+        self.delay = delay
+        self.written: list[Tensor] = []
+        self.events: list[Tensor | str] = []
+
+    def configure(self, sample_rate: SampleRate) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def write(self, audio: Tensor) -> Any:
+        time.sleep(self.delay)
+        self.written.append(audio)
+        self.events.append(audio)
+
+    def interrupt(self) -> None:
+        self.events.append('interrupt')
+
+
+class TinyAccentor(torch.nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.embedding = torch.nn.Embedding(4, 2)
+        self.embedding.weight.data = torch.tensor([[1., 2.], [3., 4.], [5., 6.], [7., 8.]])
+        self.scale = 0.5
+        self.zero_point = 1.
+
+
+class TinyModel(torch.nn.Module):
+    """
+    Scriptable module with the forward signature and accentor layout of the
+    packaged model.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.set_accent = True
+        self.accentor = TinyAccentor()
+        self.tts_model = torch.nn.Linear(2, 2)
+
+    def forward(
+        self,
+        sentences: List[str],
+        clean_sentences: List[str],
+        break_lens: List[Optional[int]],
+        prosody_rates: List[float],
+        prosody_pitches: List[float],
+        speaker_ids: torch.Tensor,
+        sr: int,
+        device: str,
+        put_yo: bool = True,
+        put_accent: bool = True,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        n = 0
+        for s in clean_sentences:
+            n += len(s)
+        out = self.tts_model(self.accentor.embedding.weight).sum() * torch.ones(1, n * 10)
+        return out, torch.tensor([n * 10])
+
+
+@pytest.fixture
+def sample() -> str:
+    return SAMPLE
+
+
+@pytest.fixture
+def make_tts() -> Generator[Callable[..., StubTTS], None, None]:
+    """
+    Configured StubTTS factory, TTSConfig arguments as keywords.
+    """
+    made: list[StubTTS] = []
+
+    def make(latency_per_char: float = 0., **kwargs: Any) -> StubTTS:
+        tts = StubTTS(TTSConfig(Device.CPU, Speaker.baya, warmup=False, **kwargs), latency_per_char)
+        tts.configure()
+        made.append(tts)
+        return tts
+
+    yield make
+    for tts in made:
+        tts.close()
+
+
+@pytest.fixture
+def make_reader() -> Callable[[list[str | None]], ListReader]:
+    return ListReader
+
+
+@pytest.fixture
+def make_writer() -> Callable[..., ListWriter]:
+    return ListWriter
+
+
+@pytest.fixture
+def tiny_model_path(tmp_path: Any) -> str:
+    """
+    A scripted TinyModel saved where a model package would be.
+    """
+    path = str(tmp_path / 'model.pt')
+    torch.jit.save(torch.jit.script(TinyModel()), path)
+    return path
+
+
+@pytest.fixture
+def tiny_model(tiny_model_path: str) -> TTSModelMultiAcc_v3:
+    return TTSModelMultiAcc_v3(tiny_model_path, SYMBOLS, SPEAKER_TO_ID, SYMB_ASCII_DICT)
+
+
+@pytest.fixture
+def tiny_package_path(tmp_path: Any, tiny_model: TTSModelMultiAcc_v3, monkeypatch: Any) -> str:
+    """
+    tiny_model in a torch.package laid out like the model package, the
+    typing copy of the wrapper class standing in for the shipped one.
+    """
+    path = str(tmp_path / 'package.pt')
+    monkeypatch.setattr(torch.package.package_exporter, '_gate_torchscript_serialization', False)
+    with torch.package.PackageExporter(path) as exporter:
+        exporter.extern(['torch', 'torch.**'])
+        exporter.intern('app.typing.multi_acc_v3_package')
+        exporter.save_pickle('tts_models', 'model', tiny_model)
+    return path
+
+
+@pytest.fixture
+def tiny_package(tiny_package_path: str) -> TTSModelMultiAcc_v3:
+    return torch.package.PackageImporter(tiny_package_path).load_pickle('tts_models', 'model')
@@ -0,0 +1,17 @@
+import json
+import pytest
+from benchmarks import suite
+
+
+@pytest.mark.parametrize('name', suite.names())
+def test_benchmark_runs(name, tmp_path):
+    results = suite.run([name], quick=True)
+
+    assert set(results['results']) == {name}
+    if 'skipped' in results['results'][name]:
+        pytest.skip(results['results'][name]['skipped'])
+
+    # the saved file is what runs are diffed by
+    path = tmp_path / 'results.json'
+    path.write_text(json.dumps(results))
+    assert json.loads(path.read_text())['meta']['quick'] is True
@@ -0,0 +1,91 @@
+import numpy
+import torch
+from app.cache import AudioCache, DiskAudioCache, make_key
+from app.tts import Speaker
+
+
+def _pcm(n: int) -> numpy.ndarray:
+    return numpy.arange(n, dtype=numpy.int16)
+
+
+def test_key_normalization():
+    a = make_key('<speak>  привет\n мир </speak>', Speaker.baya, 48000)
+    b = make_key('<speak> привет мир </speak>', 'baya', 48000)
+    assert a == b
+    assert a != make_key('<speak> привет мир </speak>', 'baya', 24000)
+
+
+def test_audio_cache_lru_eviction():
+    cache = AudioCache(max_bytes=3 * 200)
+    keys = [make_key(f'<speak>{i}</speak>', 'baya', 48000) for i in range(4)]
+
+    for k in keys[:3]:
+        cache.put(k, _pcm(100))
+    assert cache.get(keys[0]) is not None
+
+    cache.put(keys[3], _pcm(100))
+
+    assert keys[1] not in cache
+    assert keys[0] in cache
+    assert cache.stats.evictions == 1
+    assert cache.stats.size_bytes == 600
+    assert cache.get(keys[1]) is None
+    assert cache.stats.hits == 1 and cache.stats.misses == 1
+
+
+def test_audio_cache_skips_oversized():
+    cache = AudioCache(max_bytes=10)
+    key = make_key('<speak>long</speak>', 'baya', 48000)
+    cache.put(key, _pcm(100))
+    assert len(cache) == 0
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    key = make_key('<speak>привет</speak>', 'baya', 48000)
+    pcm = _pcm(1000)
+
+    cache = DiskAudioCache(str(tmp_path), 1024 * 1024, 'v3_1_ru.pt:48000')
+    cache.put(key, pcm)
+    cache.close()
+
+    cache = DiskAudioCache(str(tmp_path), 1024 * 1024, 'v3_1_ru.pt:48000')
+    hit = cache.get(key)
+    assert hit is not None
+    assert numpy.array_equal(hit, pcm)
+    assert cache.stats.hits == 1
+
+
+def test_disk_cache_invalidated_by_namespace(tmp_path):
+    key = make_key('<speak>привет</speak>', 'baya', 48000)
+
+    cache = DiskAudioCache(str(tmp_path), 1024 * 1024, 'v3_1_ru.pt:48000')
+    cache.put(key, _pcm(1000))
+    cache.close()
+
+    cache = DiskAudioCache(str(tmp_path), 1024 * 1024, 'v3_1_ru.pt:24000')
+    assert cache.get(key) is None
+    assert not list(tmp_path.glob('*.pcm'))
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskAudioCache(str(tmp_path), 2 * 200, 'ns')
+    keys = [make_key(f'<speak>{i}</speak>', 'baya', 48000) for i in range(3)]
+    for i, k in enumerate(keys):
+        cache.put(k, _pcm(100) + i)
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.stats.evictions == 1
+    assert len(list(tmp_path.glob('*.pcm'))) == 2
+
+
+def test_tts_returns_float_audio_and_keeps_the_cache_intact(make_tts):
+    tts = make_tts(audio_cache_bytes=1024 * 1024)
+
+    miss = tts.do_tts('<speak>Привет, мир.</speak>')
+    hit = tts.do_tts('<speak>Привет, мир.</speak>')
+    assert miss.dtype == hit.dtype == torch.float32
+    assert torch.equal(miss, hit)
+
+    hit.zero_()
+    assert torch.equal(tts.do_tts('<speak>Привет, мир.</speak>'), miss)
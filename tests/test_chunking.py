@@ -0,0 +1,79 @@
+import time
+from typing import Any, Callable
+import pytest
+from torch import Tensor
+from app import chunking
+from app.pool import TTSPool
+from app.tts import Device, ModelInput, Speaker, TTSConfig
+from benchmarks.stubs import StubJitModel, StubTTS
+
+SENTENCE = 'Всем добрый вечер, сегодня играем на новой карте, держитесь вместе и следите за флангами.'
+LONG = '<speak>' + ' '.join([SENTENCE] * 12) + '<break time="500ms"/><prosody rate="slow">' + SENTENCE + '</prosody></speak>'
+
+
+class LimitedJitModel(StubJitModel):
+    limit = 300
+
+    def __call__(self, **kwargs: Any) -> tuple[Tensor, Tensor]:
+        if sum(len(s) for s in kwargs['clean_sentences']) > self.limit:
+            raise RuntimeError('input is too long')
+        return super().__call__(**kwargs)
+
+
+@pytest.fixture
+def limited_tts(make_tts: Callable[..., StubTTS]) -> Callable[..., StubTTS]:
+    def make(**kwargs: Any) -> StubTTS:
+        tts = make_tts(**kwargs)
+        tts.model.model = LimitedJitModel()
+        return tts
+    return make
+
+
+def test_split_text_prefers_sentence_then_clause_boundaries():
+    text = 'Раз два три. Четыре, пять, шесть семь восемь. Девять.'
+
+    assert chunking.split_text(text, 30) == ['Раз два три.', 'Четыре, пять,', 'шесть семь восемь.', 'Девять.']
+    assert chunking.split_text('Один, два, три четыре.', 12) == ['Один, два,', 'три четыре.']
+    assert all(len(p) <= 5 for p in chunking.split_text('абвгдеёжзийклм', 5))
+
+
+def test_split_long_keeps_a_sentence_with_nothing_to_speak():
+    dots = '. ' * 100
+    model_input = ModelInput(['privet', dots], ['privet', ''], [None, 40], [1., 1.], [1., 1.])
+
+    assert chunking.split_long(model_input, 50) == model_input
+
+
+def test_long_text_is_chunked_keeping_breaks_and_prosody(limited_tts):
+    with pytest.raises(Exception, match='too long'):
+        limited_tts(chunk_chars=0).do_tts(LONG)
+
+    tts = limited_tts(chunk_chars=250)
+    audio = tts.do_tts(LONG)
+
+    model_input = tts._split_long(tts._prepare(LONG))
+    parts = chunking.chunks(model_input, 250)
+    assert len(parts) > 1 and all(sum(map(len, p.sentences)) <= 250 for p in parts)
+    assert model_input.break_lens[-2] == 40 and model_input.prosody_rates[-1] == 0.8
+
+    # the audio of every chunk, less the crossfades
+    crossfade = int(0.01 * 48000)
+    expected = sum(len(tts._forward(p, tts._speaker_ids(Speaker.baya))) for p in parts) - crossfade * (len(parts) - 1)
+    assert len(audio) == expected
+
+
+def test_chunks_run_in_parallel_on_pool_replicas():
+    tts = StubTTS(TTSConfig(Device.CPU, Speaker.baya, warmup=False, chunk_chars=250), latency_per_char=0.0005)
+    pool = TTSPool(tts, 3, threads=1)
+    pool.configure()
+    try:
+        n_chunks = len(chunking.chunks(tts._split_long(tts._prepare(LONG)), 250))
+        start = time.perf_counter()
+        pool.do_tts(LONG)
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    serial = sum(len(s) for s in tts._prepare(LONG).clean_sentences) * 0.0005
+    assert n_chunks >= 3
+    assert elapsed < serial * 0.7
@@ -0,0 +1,85 @@
+import numpy
+import torch
+from app import dsp
+from app.dsp import DSPConfig
+
+SR = 48000
+
+
+def _speech(seconds: float, level: float, pad: float = 0.5) -> numpy.ndarray:
+    n = int(SR * seconds)
+    t = numpy.arange(n, dtype=numpy.float32) / SR
+    tone = (numpy.sin(2 * numpy.pi * 220 * t) * level).astype(numpy.float32)
+    silence = numpy.zeros(int(SR * pad), dtype=numpy.float32)
+    return numpy.concatenate([silence, tone, silence])
+
+
+def _rms_db(audio: numpy.ndarray) -> float:
+    return 10 * numpy.log10(numpy.mean(audio.astype(numpy.float64) ** 2))
+
+
+def test_trims_silence_keeping_a_margin_in_place():
+    audio = _speech(1., 0.1)
+    out = dsp.process(audio, DSPConfig(keep_ms=30), SR)
+
+    assert numpy.shares_memory(out, audio)
+    assert abs(len(out) - int(SR * 1.06)) <= int(SR * 0.01)
+    assert out[0] == 0 and out[-1] == 0
+
+
+def test_normalizes_loudness_and_fades():
+    out = dsp.process(_speech(1., 0.03), DSPConfig(target_db=-20, keep_ms=0, fade_ms=5), SR)
+
+    assert abs(_rms_db(out) - -20) < 0.5
+    fade = int(SR * 0.005)
+    assert numpy.abs(out[:fade // 4]).max() < numpy.abs(out[fade:2 * fade]).max() / 2
+
+
+def test_gain_is_capped():
+    out = dsp.process(_speech(1., 0.001), DSPConfig(silence_db=-70, target_db=-20, max_gain_db=20, keep_ms=0), SR)
+
+    assert abs(_rms_db(out) - (_rms_db(_speech(1., 0.001, pad=0)) + 20)) < 0.5
+
+
+def test_limiter_keeps_peaks_under_the_ceiling():
+    audio = _speech(1., 0.1)
+    # clicks way over the ceiling after normalization
+    audio[SR // 2 + 1000] = 0.9
+    audio[SR + 5] = -0.9
+    out = dsp.process(audio, DSPConfig(target_db=-12, peak_db=-1), SR)
+
+    assert numpy.abs(out).max() <= 10 ** (-1 / 20) + 1e-6
+    # the tone away from the clicks is left alone
+    assert abs(numpy.abs(out[len(out) // 2 - 2000:len(out) // 2 - 1000]).max() - 10 ** (-12 / 20) * 2 ** 0.5) < 0.01
+
+
+def test_silence_is_left_as_is():
+    audio = numpy.zeros(SR, dtype=numpy.float32)
+    assert len(dsp.process(audio, DSPConfig(), SR)) == SR
+
+
+def test_stream_chunks_keep_their_inner_ends():
+    audio = _speech(1., 0.1)
+    out = dsp.process(audio, DSPConfig(fade_ms=5), SR, trim_start=False, trim_end=False)
+
+    assert len(out) == len(audio)
+    assert abs(out[SR // 2 + 100]) > 0
+
+
+def test_tts_output_is_processed_and_cached_apart(make_tts, sample):
+    plain = make_tts()
+    tts = make_tts(dsp=DSPConfig(target_db=-20))
+
+    assert tts.config.get_cache_namespace() != plain.config.get_cache_namespace()
+    audio = tts.do_tts(sample).numpy()
+    assert abs(_rms_db(audio) - -20) < 1.5
+    assert numpy.abs(audio).max() <= 10 ** (-1 / 20) + 1e-6
+
+
+def test_tts_stream_fades_only_the_utterance_ends(make_tts, sample):
+    tts = make_tts(dsp=DSPConfig(fade_ms=5))
+    chunks = list(tts.do_tts_stream(sample))
+
+    assert len(chunks) == 3
+    assert abs(float(chunks[0][0])) < 1e-3 and abs(float(chunks[-1][-1])) < 1e-3
+    assert all(torch.isfinite(c).all() for c in chunks)
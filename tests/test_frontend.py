@@ -0,0 +1,99 @@
+import random
+import pytest
+from app.frontend import FrontendCache, FrontendPool, TextNormalizer
+from benchmarks.stubs import SYMB_ASCII_DICT, SYMBOLS, make_stub_model
+
+
+TEXTS = [
+    '',
+    '   ',
+    'Привет, МИР! Как дела?',
+    'Ёлка — это\tдерево ‑ да – нет…  ',
+    'Hello 123 мир\n\nновый   абзац.',
+    '<b>теги</b> & "кавычки" [скобки] {фигурные}',
+    'ﬁ İstanbul ß 𝔘     конец',
+]
+
+
+def _random_text(rng: random.Random) -> str:
+    alphabet = SYMBOLS + 'ABCXYZ019 \t\n —‑–«»"[]\\^' + 'ÀÉİß'
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+
+
+def test_normalizer_matches_model_front_end():
+    model = make_stub_model()
+    normalizer = TextNormalizer(model.symbols, model.symb_ascii_dict)
+    rng = random.Random(0)
+    assert normalizer._slots is not None
+
+    for text in TEXTS + [_random_text(rng) for _ in range(2000)]:
+        assert normalizer(text) == model.prepare_text_input(text), repr(text)
+
+
+def test_normalizer_falls_back_for_whitespace_maps():
+    model = make_stub_model()
+    model.symb_ascii_dict = dict(SYMB_ASCII_DICT, **{'а': '', 'б': 'b b', ' ': '_'})
+    normalizer = TextNormalizer(model.symbols, model.symb_ascii_dict)
+    assert normalizer._slots is None
+
+    for text in TEXTS + ['а  б а', ' а б ']:
+        assert normalizer(text) == model.prepare_text_input(text), repr(text)
+
+
+def test_frontend_cache_skips_repeated_parsing_and_errors():
+    model = make_stub_model()
+    sample = '<speak><prosody rate="fast">Привет.</prosody> Мир.</speak>'
+    expected = model.prepare_tts_model_input(sample, ssml=True, speaker_ids=[])[:5]
+    calls = []
+    process_ssml = model.process_ssml
+    model.process_ssml = lambda text: calls.append(text) or process_ssml(text)
+    prepare = FrontendCache(max_entries=2).wrap(model.prepare_tts_model_input)
+
+    first = prepare(sample, ssml=True, speaker_ids=[1])
+    first[0].append('mutated')
+    second = prepare(sample, ssml=True, speaker_ids=[2])
+
+    assert len(calls) == 1
+    assert second[:5] == expected
+    assert second[5].tolist() == [2]
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            prepare('<speak><broken</speak>', ssml=True, speaker_ids=[1])
+    assert len(calls) == 2
+
+
+def test_frontend_pool_matches_model_front_end():
+    model = make_stub_model()
+    parsed = []
+    pool = FrontendPool(model, workers=2, on_parsed=lambda chars, seconds: parsed.append((chars, seconds)))
+    pool.start()
+    try:
+        for sample in [
+            '<speak><prosody rate="fast" pitch="low">Привет.</prosody><break time="300ms"/> Мир, как дела?</speak>',
+            '<speak>Ёлка — это дерево</speak>',
+        ]:
+            expected = model.prepare_tts_model_input(sample, ssml=True, speaker_ids=[1])
+            prepared = pool.prepare_tts_model_input(sample, ssml=True, speaker_ids=[1])
+            assert prepared[:5] == expected[:5]
+            assert prepared[5].tolist() == [1]
+        # characters normalized in the workers are reported here
+        assert len(parsed) == 2 and all(chars > 0 and seconds > 0 for chars, seconds in parsed)
+
+        with pytest.raises(ValueError):
+            pool.prepare_tts_model_input('<speak><broken</speak>', ssml=True, speaker_ids=[])
+        with pytest.raises(AssertionError):
+            pool.prepare_tts_model_input('<p>Привет</p>', ssml=True, speaker_ids=[])
+    finally:
+        pool.close()
+
+
+def test_spawned_frontend_workers_use_the_class_of_the_model_package(tiny_package, tiny_package_path):
+    sample = '<speak><prosody rate="fast">Привет.</prosody><break time="300ms"/> Мир.</speak>'
+    pool = FrontendPool(tiny_package, workers=1, start_method='spawn', model_path=tiny_package_path)
+    pool.start()
+    try:
+        fields, _, _ = pool.submit(sample, True).result()
+        assert fields == tuple(tiny_package.prepare_tts_model_input(sample, ssml=True, speaker_ids=[])[:5])
+    finally:
+        pool.close()
@@ -0,0 +1,40 @@
+import numpy
+from app.io.generic_writer import AudioPlayer, PlaybackBuffer, WriterConfig
+from app.io.latency import LatencyProfile
+
+
+def test_playback_buffer_readers_are_independent():
+    buffer = PlaybackBuffer(n_readers=2)
+    pcm = numpy.arange(10, dtype=numpy.int16)
+    buffer.append(memoryview(pcm).cast('B'))
+
+    a = buffer.read(0, 4)
+    b = buffer.read(1, 4)
+    assert a == b == pcm[:4].tobytes()
+
+    # reader 0 runs dry and gets silence
+    assert buffer.read(0, 8) == pcm[4:].tobytes() + bytes(4)
+    assert buffer.pending(0) == 0
+    assert buffer.pending(1) == 12
+
+
+def test_playback_buffer_clear():
+    buffer = PlaybackBuffer(n_readers=2)
+    buffer.append(bytes(100))
+    buffer.clear()
+    assert buffer.pending(0) == buffer.pending(1) == 0
+    assert buffer.read(1, 2) == bytes(4)
+
+
+def test_adaptive_buffer_reopens_idle_streams():
+    player = AudioPlayer(WriterConfig(8000, latency=LatencyProfile.LOW, adaptive_buffer=True))
+    try:
+        assert [s.frames_per_buffer for s in player.streams] == [256, 256]
+        for _ in range(3):
+            player.callbacks[1].frames.underrun()
+        player.play(numpy.zeros(800, dtype=numpy.int16))
+
+        assert [s.frames_per_buffer for s in player.streams] == [256, 512]
+        assert all(s.is_active() for s in player.streams)
+    finally:
+        player.close()
@@ -0,0 +1,56 @@
+from app.io.latency import AdaptiveBuffer, LatencyProfile
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.t = 0.
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def test_profiles():
+    assert LatencyProfile.from_string('LOW').frames_per_buffer == 256
+    assert LatencyProfile.BALANCED.frames_per_buffer == 1024
+
+
+def test_fixed_buffer_ignores_underruns():
+    buffer = AdaptiveBuffer(256)
+    for _ in range(10):
+        buffer.underrun()
+    assert buffer.frames() == 256
+
+
+def test_adaptive_buffer_grows_on_underruns_and_shrinks_when_stable():
+    clock = Clock()
+    buffer = AdaptiveBuffer(256, adaptive=True, max_frames=1024, grow_after=3, window=10., stable_for=30., clock=clock)
+
+    # spread out, never 3 within the window
+    for _ in range(4):
+        buffer.underrun()
+        clock.t += 6.
+    assert buffer.frames() == 256
+
+    for _ in range(3):
+        buffer.underrun()
+    assert buffer.frames() == 512
+    for _ in range(6):
+        buffer.underrun()
+        buffer.underrun()
+        buffer.underrun()
+        buffer.frames()
+    assert buffer.frames() == 1024
+
+    clock.t += 20.
+    assert buffer.frames() == 1024
+    clock.t += 10.
+    assert buffer.frames() == 512
+    # stable for a step each
+    clock.t += 10.
+    buffer.underrun()
+    clock.t += 29.
+    assert buffer.frames() == 512
+    clock.t += 1.
+    assert buffer.frames() == 256
+    clock.t += 100.
+    assert buffer.frames() == 256
@@ -0,0 +1,92 @@
+import time
+import torch
+from torch import Tensor
+from app.manager import PipelinedTTSManager, TTSManager
+from app.tts import TTS, Device, ModelInput, Speaker, TTSConfig
+from benchmarks.stubs import StubTTS
+
+
+class FakeTTS(TTS):
+    def __init__(self, delay: float = 0.) -> None:
+        super().__init__(TTSConfig(Device.CPU, Speaker.baya))
+        self.delay = delay
+
+    def configure(self) -> None:
+        pass
+
+    def do_tts(self, sample: str, speaker: Speaker | None = None, model_input: ModelInput | None = None) -> Tensor:
+        if 'bad' in sample:
+            raise ValueError('Invalid XML format')
+        time.sleep(self.delay)
+        return torch.full((4,), float(len(sample)))
+
+
+def _events(writer) -> list[int | str]:
+    return [e if isinstance(e, str) else int(e[0]) for e in writer.events]
+
+
+def test_pipelined_manager_keeps_order(make_reader, make_writer):
+    samples = ['a', 'bb', 'bad', 'ccc', 'dddd']
+    writer = make_writer()
+    PipelinedTTSManager(FakeTTS(), make_reader(samples), writer, queue_size=2).start()
+
+    assert [int(a[0]) for a in writer.written] == [1, 2, 3, 4]
+
+
+def test_pipelined_manager_overlaps_stages(make_reader, make_writer):
+    delay = 0.05
+    samples = ['a'] * 6
+    writer = make_writer(delay)
+
+    t = time.perf_counter()
+    PipelinedTTSManager(FakeTTS(delay), make_reader(samples), writer).start()
+    elapsed = time.perf_counter() - t
+
+    assert len(writer.written) == len(samples)
+    # serial would take 2 * 6 * delay
+    assert elapsed < 1.6 * len(samples) * delay
+
+
+def test_frontend_stage_rejects_invalid_ssml_before_synthesis(make_reader, make_writer):
+    samples = ['<speak>Привет.</speak>', '<speak><broken</speak>', '<p>Мир</p>', '<speak>Как дела?</speak>']
+    # without a front-end cache to find the parsed input in
+    tts = StubTTS(TTSConfig(Device.CPU, Speaker.baya, warmup=False, frontend_workers=2, frontend_cache_size=0))
+    synthesized = []
+    parsed = []
+    do_tts = tts.do_tts
+    prepare = tts._prepare
+
+    def spy_do_tts(sample: str, speaker: Speaker | None = None, model_input: ModelInput | None = None) -> Tensor:
+        assert model_input is not None
+        synthesized.append(sample)
+        return do_tts(sample, speaker, model_input)
+
+    tts.do_tts = spy_do_tts  # type: ignore
+    tts._prepare = lambda sample: parsed.append(sample) or prepare(sample)  # type: ignore
+    writer = make_writer()
+    PipelinedTTSManager(tts, make_reader(samples), writer).start()
+
+    assert synthesized == [samples[0], samples[3]]
+    assert len(writer.written) == 2
+    # every request is parsed once, by the front-end stage
+    assert parsed == samples
+
+
+def test_high_priority_request_cuts_playback(make_reader, make_writer):
+    writer = make_writer()
+    TTSManager(FakeTTS(), make_reader(['a', None, '!bb', 'ccc']), writer).start()
+
+    assert _events(writer) == [1, 'interrupt', 'interrupt', 2, 3]
+
+
+def test_pipelined_high_priority_request_drops_queued_requests(make_reader, make_writer):
+    writer = make_writer()
+    samples = ['a', 'bb', 'ccc', 'dddd', '!eeeee', 'ffffff']
+    PipelinedTTSManager(FakeTTS(0.05), make_reader(samples), writer, queue_size=2).start()
+
+    events = _events(writer)
+    written = [e for e in events if e != 'interrupt']
+    # the first one may be written before the high priority request is read
+    assert written[-2:] == [5, 6] and set(written[:-2]) <= {1}
+    assert events.count('interrupt') == 1
+    assert events.index('interrupt') == len(events) - 3
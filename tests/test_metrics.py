@@ -0,0 +1,41 @@
+import json
+import urllib.request
+from app.metrics import Registry, metrics
+
+
+def test_prometheus_text_and_json_dump(tmp_path):
+    registry = Registry()
+    registry.counter('requests_total', 'requests').inc(3)
+    registry.gauge('depth', labels={'stage': 'writer'}, fn=lambda: 2)
+    h = registry.histogram('rtf', buckets=(0.1, 1.))
+    for v in (0.05, 0.5, 5.):
+        h.observe(v)
+
+    port = registry.serve(0)
+    registry.dump_every(str(tmp_path / 'metrics.json'), 60)
+    try:
+        text = urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics').read().decode()
+    finally:
+        registry.stop()
+
+    assert 'requests_total 3.0' in text
+    assert 'depth{stage="writer"} 2.0' in text
+    assert 'rtf_bucket{le="1.0"} 2' in text and 'rtf_bucket{le="+Inf"} 3' in text
+
+    dump = json.loads((tmp_path / 'metrics.json').read_text())
+    assert dump['requests_total'] == 3
+    assert dump['rtf']['count'] == 3
+
+
+def test_tts_records_real_time_factor_and_frontend_chars(make_tts):
+    tts = make_tts(audio_cache_bytes=1024 * 1024)
+    before = metrics.snapshot()
+
+    tts.do_tts('<speak>Привет, мир.</speak>')
+    tts.do_tts('<speak>Привет, мир.</speak>')
+    after = metrics.snapshot()
+
+    assert after['tts_requests_total'] - before['tts_requests_total'] == 2
+    assert after['tts_real_time_factor']['count'] - before['tts_real_time_factor']['count'] == 1
+    assert after['tts_frontend_chars_total'] > before['tts_frontend_chars_total']
+    assert after['tts_audio_cache_hit_rate'] == 0.5
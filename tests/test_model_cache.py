@@ -0,0 +1,41 @@
+import os
+import torch
+from app import model_cache
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+
+
+def test_saved_model_loads_unpacked_and_matches(tiny_package, tiny_package_path):
+    path, model = tiny_package_path, tiny_package
+    cpu = torch.device('cpu')
+    probe = lambda m: m.apply_tts('проверка', speaker='baya')  # noqa: E731
+
+    assert model_cache.load(path, cpu) is None
+    assert model_cache.save(path, cpu, model, probe) is not None
+
+    cached = model_cache.load(path, cpu)
+    assert cached is not None and cached.q_model_unpacked
+    assert torch.equal(cached.apply_tts('привет мир', speaker='baya'), model.apply_tts('привет мир', speaker='baya'))
+    # the wrapper code of the package, not the typing copy
+    assert type(cached).__module__.startswith('<torch_package_')
+    assert not isinstance(cached, TTSModelMultiAcc_v3)
+
+
+def test_changed_source_invalidates_the_cache(tmp_path, tiny_package, tiny_package_path):
+    path = tiny_package_path
+    cpu = torch.device('cpu')
+    model_cache.save(path, cpu, tiny_package, lambda m: None)
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert model_cache.load(path, cpu) is None
+    model_cache.save(path, cpu, tiny_package, lambda m: None)
+    assert len(list(tmp_path.glob('package.*.frozen.pt'))) == 1
+
+
+def test_stub_model_outside_a_package_loads_from_its_module(tiny_model, tiny_model_path):
+    cpu = torch.device('cpu')
+    model_cache.save(tiny_model_path, cpu, tiny_model, lambda m: None)
+
+    cached = model_cache.load(tiny_model_path, cpu)
+    assert type(cached) is TTSModelMultiAcc_v3
@@ -0,0 +1,36 @@
+import numpy
+import torch
+from app.pcm import PCMConverter, to_pcm16
+
+
+def test_matches_legacy_conversion_in_range():
+    audio = torch.rand(48000) * 2 - 1
+    legacy = (audio * 32767).numpy().astype(numpy.int16)
+    assert numpy.array_equal(to_pcm16(audio), legacy)
+
+
+def test_clips_instead_of_wrapping():
+    audio = torch.tensor([1.5, -1.5, 1., -1., 0.])
+    assert to_pcm16(audio).tolist() == [32767, -32768, 32767, -32767, 0]
+
+
+def test_inplace_scales_the_source():
+    audio = torch.tensor([0.5, -0.5])
+    to_pcm16(audio, inplace=True)
+    assert audio.tolist() == [16383.5, -16383.5]
+
+
+def test_converter_reuses_buffers():
+    converter = PCMConverter(100)
+    first = converter.convert(torch.zeros(50))
+    second = converter.convert(torch.ones(80))
+    assert numpy.shares_memory(first, second)
+    assert len(second) == 80 and second[0] == 32767
+
+    grown = converter.convert(torch.zeros(200))
+    assert len(grown) == 200
+
+
+def test_int16_passthrough():
+    pcm = torch.arange(10, dtype=torch.int16)
+    assert numpy.shares_memory(PCMConverter().convert(pcm), pcm.numpy())
@@ -0,0 +1,87 @@
+import time
+import pytest
+import torch
+from app.manager import PipelinedTTSManager
+from app.pool import TTSPool
+from app.precision import Precision
+from app.tts import Device, Speaker, TTSConfig
+from app.warmup import WarmupConfig
+from benchmarks.stubs import StubTTS
+
+SAMPLES = [f'<speak>Сообщение номер {"раз " * i}для всех.</speak>' for i in range(1, 7)]
+
+
+def _pool(replicas: int = 2) -> TTSPool:
+    tts = StubTTS(TTSConfig(Device.CPU, Speaker.baya, warmup=False), latency_per_char=0.002)
+    return TTSPool(tts, replicas, threads=1)
+
+
+def test_pool_matches_a_single_model_and_runs_replicas_in_parallel(make_tts):
+    single = make_tts()
+    pool = _pool()
+    pool.configure()
+    # managers configure the pool again
+    pool.configure()
+    assert len(pool._processes) == 2
+    try:
+        start = time.perf_counter()
+        futures = [pool.submit(sample) for sample in SAMPLES]
+        results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+
+        serial = sum(len(sample) for sample in SAMPLES) * 0.002
+        assert elapsed < serial * 0.8
+        for sample, audio in zip(SAMPLES, results):
+            assert torch.equal(audio, single.do_tts(sample))
+    finally:
+        pool.close()
+    assert not any(p.is_alive() for p in pool._processes)
+
+
+def test_pipelined_manager_writes_pool_results_in_order(make_tts, make_reader, make_writer):
+    samples = SAMPLES[::-1] + ['<speak>bad<']
+    writer = make_writer()
+    PipelinedTTSManager(_pool(), make_reader(samples), writer, queue_size=4).start()
+
+    single = make_tts()
+    assert [len(a) for a in writer.written] == [len(single.do_tts(s)) for s in samples[:-1]]
+    assert [len(a) for a in writer.written] == sorted(len(a) for a in writer.written)[::-1]
+
+
+def test_pool_runs_on_cpu_only():
+    tts = StubTTS(TTSConfig(Device.GPU, Speaker.baya, warmup=False))
+    with pytest.raises(Exception, match='cpu'):
+        TTSPool(tts, 2)
+
+
+def test_pool_spawns_replicas_once_this_process_ran_the_model():
+    tts = StubTTS(TTSConfig(Device.CPU, Speaker.baya, warmup=False, precision=Precision.INT8))
+    assert TTSPool(tts, 2)._ctx.get_start_method() == 'spawn'
+    with pytest.raises(Exception, match='fork'):
+        TTSPool(tts, 2, start_method='fork')
+
+
+def test_spawned_replicas_load_the_model_themselves(make_tts):
+    single = make_tts()
+    pool = TTSPool(StubTTS(TTSConfig(Device.CPU, Speaker.baya, warmup=False)), 1, threads=1, start_method='spawn')
+    pool.configure()
+    try:
+        assert torch.equal(pool.do_tts(SAMPLES[0]), single.do_tts(SAMPLES[0]))
+    finally:
+        pool.close()
+
+
+def test_replicas_report_ready_before_a_background_warmup():
+    warmup_config = WarmupConfig(speakers=[Speaker.baya], texts=['раз ' * 100], max_passes=10, tolerance=0.)
+    config = TTSConfig(
+        Device.CPU, Speaker.baya, warmup=True, warmup_config=warmup_config, warmup_background=True
+    )
+    pool = TTSPool(StubTTS(config, latency_per_char=0.002), 1, threads=1)
+    try:
+        start = time.perf_counter()
+        pool.configure()
+        pool.do_tts(SAMPLES[0])
+        # a warmup pass takes 0.8 s, the request waits for one at most
+        assert time.perf_counter() - start < 2.
+    finally:
+        pool.close()
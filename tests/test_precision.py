@@ -0,0 +1,38 @@
+import torch
+from app import precision
+from app.precision import Precision
+from app.typing.multi_acc_v3_package import TTSModelMultiAcc_v3
+
+
+def _probe(model: TTSModelMultiAcc_v3) -> torch.Tensor:
+    return model.apply_tts('привет мир', speaker='baya')
+
+
+def test_int8_quantizes_linear_layers(tiny_model):
+    model = tiny_model
+    reference = _probe(model)
+
+    assert precision.apply(model, Precision.INT8, torch.device('cpu'), _probe) == Precision.INT8
+    assert 'quantized::linear_dynamic' in str(model.model.inlined_graph)
+    assert model.model.set_accent
+    assert torch.allclose(_probe(model), reference, atol=0.1)
+
+
+def test_unusable_precision_falls_back_to_fp32(tiny_model):
+    model = tiny_model
+    model.unpack_q_model()
+    # like a model cache load, the weights are constants now
+    frozen = model.model = torch.jit.freeze(model.model, preserved_attrs=['set_accent'])
+    model.q_model_unpacked = True
+
+    assert precision.apply(model, Precision.INT8, torch.device('cpu'), _probe) == Precision.FP32
+    assert model.model is frozen
+    assert precision.apply(model, Precision.BF16, torch.device('cuda'), _probe) == Precision.FP32
+
+
+def test_tts_output_stays_float32(make_tts):
+    tts = make_tts(precision=Precision.BF16)
+
+    assert tts.precision == (Precision.BF16 if precision.bf16_supported() else Precision.FP32)
+    assert tts.do_tts('<speak>Привет.</speak>').dtype == torch.float32
+    assert tts.config.get_cache_namespace().endswith(':bf16')
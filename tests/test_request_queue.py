@@ -0,0 +1,52 @@
+from queue import Queue
+from app import tracing
+from app.io.request_queue import RequestQueue, ShedReason
+
+
+def _put(q: Queue, text: str | None, age: float = 0.) -> None:
+    q.put((tracing.new_request_id(), tracing.now() - int(age * 1e9), text, 1))
+
+
+def _texts(requests: RequestQueue, n: int) -> list[str]:
+    return [requests.get()[2] for _ in range(n)]
+
+
+def test_coalesces_repeated_macro_clicks():
+    source: Queue = Queue()
+    events = []
+    requests = RequestQueue(source, coalesce=True, on_shed=lambda reason, n: events.append((reason, n)))
+    for text in ['a'] * 20 + ['b', 'b', 'a']:
+        _put(source, text)
+
+    assert _texts(requests, 3) == ['a', 'b', 'a']
+    assert requests.qsize() == 0
+    assert requests.shed[ShedReason.coalesced] == 20
+    assert sum(n for reason, n in events if reason is ShedReason.coalesced) == 20
+
+
+def test_drops_stale_and_keeps_latest():
+    source: Queue = Queue()
+    requests = RequestQueue(source, max_age=1., keep_latest=2)
+    _put(source, 'old', age=5.)
+    for text in ['a', 'b', 'c']:
+        _put(source, text)
+
+    assert _texts(requests, 2) == ['b', 'c']
+    assert requests.shed[ShedReason.stale] == 1
+    assert requests.shed[ShedReason.superseded] == 1
+
+    # everything waiting went stale, the next fresh request comes out
+    _put(source, 'late', age=2.)
+    _put(source, 'd')
+    assert _texts(requests, 1) == ['d']
+    assert requests.shed[ShedReason.stale] == 2
+
+
+def test_stop_skips_waiting_requests():
+    source: Queue = Queue()
+    requests = RequestQueue(source, coalesce=True, max_age=1., keep_latest=1)
+    for text in ['a', 'b', None, None, 'c']:
+        _put(source, text, age=5. if text is None else 0.)
+
+    assert _texts(requests, 2) == [None, 'c']
+    assert requests.shed[ShedReason.coalesced] == requests.shed[ShedReason.stale] == 0
@@ -0,0 +1,53 @@
+import time
+from multiprocessing import Process, Queue
+from app.io.shm_ring import RingHandle, RingReader, SharedRingBuffer
+
+
+def _consume(handle: RingHandle, index: int, q_out: Queue) -> None:
+    reader = RingReader(handle, index)
+    received = []
+    while (record := reader.read()) is not None:
+        received.append((record.tag, bytes(record.data)))
+        reader.advance(record)
+    reader.close()
+    q_out.put((index, received))
+
+
+def test_every_reader_gets_every_record_in_order():
+    ring = SharedRingBuffer(capacity=4096, n_readers=2)
+    q_out: Queue = Queue()
+    workers = [
+        Process(target=_consume, args=(ring.handle(), i, q_out))
+        for i in range(2)
+    ]
+    for w in workers:
+        w.start()
+
+    # odd sizes force wrap markers, 3000 bytes is split in records
+    payloads = [bytes([i % 256]) * (37 * i + 5) for i in range(40)] + [b'x' * 3000]
+    for tag, p in enumerate(payloads):
+        assert ring.write(p, tag=tag, timeout=5)
+
+    # wait until both readers drained the ring, then close
+    while ring.fill_level():
+        time.sleep(0.01)
+    ring.close()
+
+    results = dict(q_out.get(timeout=5) for _ in workers)
+    for w in workers:
+        w.join()
+    ring.release()
+
+    for received in results.values():
+        assert b''.join(d for _, d in received) == b''.join(payloads)
+        assert [t for t, _ in received][:40] == list(range(40))
+
+
+def test_write_times_out_when_reader_stalls():
+    ring = SharedRingBuffer(capacity=1024, n_readers=1)
+    assert ring.write(b'a' * 400, timeout=0.1)
+    assert ring.write(b'b' * 400, timeout=0.1)
+    # needs a wrap, the reader still holds the start of the ring
+    assert not ring.write(b'c' * 400, timeout=0.1)
+    ring.close()
+    ring.release()
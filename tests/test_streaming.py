@@ -0,0 +1,42 @@
+import torch
+from app.manager import TTSManager
+from app.tts import Speaker
+
+
+def test_stream_yields_a_chunk_per_sentence(make_tts, sample):
+    tts = make_tts()
+    chunks = list(tts.do_tts_stream(sample))
+
+    assert len(chunks) == 3
+    assert torch.equal(torch.cat(chunks), tts.do_tts(sample))
+
+
+def test_stream_fills_the_audio_cache(make_tts, sample):
+    tts = make_tts(audio_cache_bytes=10 * 1024 * 1024)
+    streamed = torch.cat(list(tts.do_tts_stream(sample)))
+
+    calls = tts.model.model.calls
+    assert torch.equal(tts.do_tts(sample), streamed)
+    assert tts.model.model.calls == calls
+    assert tts.audio_cache.stats.hits == 1
+
+
+def test_first_chunk_comes_before_later_sentences_are_synthesized(make_tts, sample):
+    tts = make_tts()
+    stream = tts.do_tts_stream(sample, Speaker.baya)
+
+    first = next(stream)
+    assert tts.model.model.calls == 1
+    assert len(first) > 0
+
+    rest = list(stream)
+    assert tts.model.model.calls == 3 and len(rest) == 2
+
+
+def test_manager_writes_chunks_as_they_arrive(make_tts, make_reader, make_writer, sample):
+    tts = make_tts(streaming=True)
+    writer = make_writer()
+    TTSManager(tts, make_reader([sample, '<speak><broken</speak>']), writer).start()
+
+    assert len(writer.written) == 3
+    assert torch.equal(torch.cat(writer.written), tts.do_tts(sample))
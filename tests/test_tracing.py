@@ -0,0 +1,39 @@
+import json
+from app import tracing
+from app.manager import PipelinedTTSManager, TTSManager
+from app.tracing import Tracer, tracer
+from app.tts import Device, Speaker, TTSConfig
+from benchmarks.stubs import StubTTS
+
+
+def test_begin_end_pairs_across_threads():
+    t = Tracer()
+    t.enable()
+    rid = tracing.new_request_id()
+    t.begin('queue', rid, ts=1_000_000)
+    t.end('queue', rid, ts=3_000_000)
+    t.complete('device', 3_000_000, 7_000_000, request_id=rid)
+
+    spans = {s['stage']: s for s in t.spans()}
+    assert spans['queue']['end'] - spans['queue']['start'] == 2_000_000
+    assert t.percentiles()['device']['p50_ms'] == 4.
+
+    events = t.chrome_trace()['traceEvents']
+    assert {e['args']['request_id'] for e in events if e['ph'] == 'X'} == {rid}
+
+
+def test_managers_export_stage_timings(tmp_path, monkeypatch, make_reader, make_writer):
+    monkeypatch.setattr(tracer, 'enabled', False)
+    monkeypatch.setattr(tracer, '_events', [])
+
+    samples = ['<speak>Раз.</speak>', '<speak>Два три.</speak>']
+    for manager in (TTSManager, PipelinedTTSManager):
+        tracer._events.clear()
+        tts = StubTTS(TTSConfig(Device.CPU, Speaker.baya, warmup=False, trace_dir=str(tmp_path / manager.__name__)))
+        manager(tts, make_reader(samples), make_writer()).start()
+
+        stages = json.loads(next((tmp_path / manager.__name__).glob('stages-*.json')).read_text())
+        assert {'ssml', 'inference', 'synthesis', 'write'} <= stages.keys()
+        assert stages['synthesis']['n'] == len(samples)
+
+    assert 'synth_queue' in stages and 'write_queue' in stages
@@ -0,0 +1,9 @@
+def test_profiler_saves_sampled_forward_passes(tmp_path, make_tts):
+    tts = make_tts(profile_dir=str(tmp_path), profile_every=2)
+    for _ in range(3):
+        tts.do_tts('<speak>Раз.</speak>')
+
+    assert tts.profiler.saved == 2
+    summary = next(tmp_path.glob('*.txt')).read_text()
+    assert 'cpu threads used' in summary and 'TorchScript executor events' in summary
+    assert len(list(tmp_path.glob('*.json'))) == 2
@@ -0,0 +1,43 @@
+import json
+import torch
+from app import tuning
+from app.precision import Precision
+from app.tts import Device, Speaker, TTSConfig
+from benchmarks.stubs import StubTTS
+
+
+def test_candidates_leave_audio_cores_free(monkeypatch):
+    monkeypatch.setattr(tuning.os, 'cpu_count', lambda: 8)
+    grid = tuning.candidates(reserved_cores=2)
+
+    assert max(intra for intra, _ in grid) == 6
+    assert all(intra + inter - 1 <= 6 for intra, inter in grid)
+    assert (1, 1) in grid
+
+
+def test_tuned_threads_are_saved_and_reused(tmp_path):
+    config = TTSConfig(Device.CPU, Speaker.baya, models_path=str(tmp_path), warmup=False, tuned_threads=True)
+    best = tuning.tune(config, repeats=1, tts_class='benchmarks.stubs:StubTTS', grid=[(1, 1), (2, 1)])
+
+    with open(tmp_path / tuning.TUNING_FILE, encoding='utf-8') as f:
+        entry = json.load(f)[tuning.tuning_key(config)]
+    assert len(entry['results']) == 2
+    assert tuning.load_tuned(config) == best
+
+    threads = torch.get_num_threads()
+    try:
+        StubTTS(config).configure()
+        assert torch.get_num_threads() == best[0]
+    finally:
+        torch.set_num_threads(threads)
+
+
+def test_tuning_is_kept_per_precision(tmp_path):
+    fp32 = TTSConfig(Device.CPU, Speaker.baya, models_path=str(tmp_path), warmup=False, tuned_threads=True)
+    int8 = TTSConfig(
+        Device.CPU, Speaker.baya, models_path=str(tmp_path), warmup=False, tuned_threads=True, precision=Precision.INT8
+    )
+    tuning.tune(int8, repeats=1, tts_class='benchmarks.stubs:StubTTS', grid=[(1, 1)])
+
+    assert tuning.load_tuned(int8) == (1, 1)
+    assert tuning.load_tuned(fp32) is None
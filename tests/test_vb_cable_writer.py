@@ -0,0 +1,58 @@
+import time
+import torch
+from app import tracing
+from app.io.vb_cable_writer import VBCableWriter
+
+
+def test_interrupt_cuts_playback_within_a_buffer(monkeypatch):
+    # device processes play in real time
+    monkeypatch.setenv('FAKE_PYAUDIO_SPEED', '1')
+    writer = VBCableWriter()
+    writer.configure(8000)
+    try:
+        writer.write(torch.zeros(8000 * 5))
+        time.sleep(0.2)
+        assert writer.ring.fill_level() > 0
+
+        start = time.perf_counter()
+        writer.interrupt()
+        while writer.ring.fill_level() and time.perf_counter() - start < 2:
+            time.sleep(0.005)
+        # a buffer is 1024 frames, 0.13 s at 8 kHz
+        assert writer.ring.fill_level() == 0
+        assert time.perf_counter() - start < 0.5
+
+        # audio written after the interrupt plays
+        writer.write(torch.zeros(8000))
+        time.sleep(0.05)
+        assert 0 < writer.ring.fill_level()
+    finally:
+        writer.close()
+
+
+def test_new_utterances_are_dropped_while_the_backlog_is_full(monkeypatch):
+    monkeypatch.setenv('FAKE_PYAUDIO_SPEED', '1')
+    shed = []
+    writer = VBCableWriter(max_backlog=1.)
+    writer.on_shed = lambda reason, n: shed.append((reason, n))
+    writer.configure(8000)
+    try:
+        tracing.set_current_request_id(1)
+        writer.write(torch.zeros(8000 * 3))
+        # stream chunks of the utterance playing are kept
+        writer.write(torch.zeros(8000))
+        fill = writer.ring.fill_level()
+
+        tracing.set_current_request_id(2)
+        writer.write(torch.zeros(8000))
+        assert shed == [('backlog', 1)]
+        assert writer.ring.fill_level() <= fill
+
+        # the audio cut by an interrupt doesn't count
+        writer.interrupt()
+        tracing.set_current_request_id(3)
+        writer.write(torch.zeros(8000))
+        assert len(shed) == 1
+    finally:
+        tracing.set_current_request_id(None)
+        writer.close()
@@ -0,0 +1,48 @@
+import time
+from app.tts import Device, Speaker, TTSConfig
+from app.warmup import WarmupConfig, build_corpus, run_warmup
+from benchmarks.stubs import StubTTS
+
+
+def test_corpus_covers_speakers_lengths_and_prosody():
+    corpus = build_corpus(WarmupConfig())
+    speakers = {item.speaker for item in corpus}
+
+    assert Speaker.random not in speakers and len(speakers) == len(Speaker) - 1
+    assert len(corpus) == 5 * 3 + 4
+    assert any('prosody' in item.sample for item in corpus)
+    assert any('<break' in item.sample for item in corpus)
+
+
+def test_warmup_stops_once_latency_is_stable():
+    seen: dict[str, int] = {}
+
+    def synthesize(sample: str, speaker: Speaker) -> None:
+        seen[sample] = seen.get(sample, 0) + 1
+        # first call of every input pays for specialization
+        time.sleep(0.004 if seen[sample] == 1 else 0.001)
+
+    config = WarmupConfig(speakers=[Speaker.baya], lengths=[1, 40], prosodies=['fast'], max_passes=5, tolerance=0.5)
+    report = run_warmup(synthesize, config)
+
+    assert report.stable
+    assert len(report.passes) == 3
+
+
+def test_background_warmup_gives_way_to_requests():
+    config = TTSConfig(
+        Device.CPU, Speaker.baya,
+        warmup_config=WarmupConfig(max_passes=50, tolerance=0.),
+        warmup_background=True,
+    )
+    tts = StubTTS(config, latency_per_char=0.0002)
+    tts.configure()
+    assert tts._warmup_thread.is_alive()
+
+    start = time.perf_counter()
+    tts.do_tts('<speak>Привет.</speak>')
+    # a warmup item of 200 chars takes 40 ms
+    assert time.perf_counter() - start < 0.1
+
+    tts.close()
+    assert not tts._warmup_thread.is_alive()